@@ -1,111 +1,205 @@
+import argparse
+import contextlib
+import functools
+
 import pandas as pd
 from pathlib import Path
 
+from fips_assign import imap_ordered, process_pool
+from intermediate_store import ChunkedWriter, write_intermediate
+from run_report import RunReport, Step
+from schemas import as_id, iter_csv, read_csv
+
 # --- paths ---
 ROOT = Path(__file__).resolve().parents[1]   # project_root/
 DATA_RAW = ROOT / "data_raw"
 DATA_INT = ROOT / "data_intermediate"
-
-DATA_INT.mkdir(parents=True, exist_ok=True)
-
-# -------------------------------------------------------------
-# 1. Load plant location file
-# -------------------------------------------------------------
-loc_path = DATA_RAW / "EIA_power_plant_location.csv"
-loc = pd.read_csv(loc_path)
-
-# Keep needed variables
-loc_subset = loc[[
-    "Plant_Code",
-    "Utility_ID",
-    "Plant_Name",
-    "Utility_Name",
-    "County",
-    "State",
-    "Longitude",
-    "Latitude"
-]].copy()
-
-# STANDARDIZE TYPES FOR MERGING
-loc_subset["Plant_Code"] = (
-    pd.to_numeric(loc_subset["Plant_Code"], errors="coerce")
-      .astype("Int64")
-      .astype(str)
-      .str.strip()
-)
-loc_subset["Utility_ID"] = (
-    pd.to_numeric(loc_subset["Utility_ID"], errors="coerce")
-      .astype("Int64")
-      .astype(str)
-      .str.strip()
-)
-
-loc_subset["County"] = loc_subset["County"].astype(str).str.strip()
-loc_subset["State"]  = loc_subset["State"].astype(str).str.strip()
-
-print("Loaded plant location file.")
-print("Unique plants in location file:", loc_subset["Plant_Code"].nunique())
-
-# -------------------------------------------------------------
-# 2. Process EIA 860 (capacity)
-# -------------------------------------------------------------
-e860_path = DATA_RAW / "EIA_860.csv"
-e860 = pd.read_csv(e860_path)
-
-# Make sure IDs are string, using numeric coercion to align with Plant_Code
-e860["facilid"] = (
-    pd.to_numeric(e860["facilid"], errors="coerce")
-      .astype("Int64")
-      .astype(str)
-      .str.strip()
-)
-e860["utilid"]  = e860["utilid"].astype(str).str.strip()
-
-print("Unique plants in EIA 860:", e860["facilid"].nunique())
-
-# Merge ONLY on plant ID
-e860_loc = e860.merge(
-    loc_subset,
-    how="left",
-    left_on="facilid",
-    right_on="Plant_Code",
-    suffixes=("", "_loc")
-)
-
-missing_860 = e860_loc["County"].isna().mean()
-print(f"EIA 860: missing location fraction = {missing_860:.3f}")
-
-e860_loc_out = DATA_INT / "EIA_860_with_loc.csv"
-e860_loc.to_csv(e860_loc_out, index=False)
-print("Saved:", e860_loc_out)
-
-# -------------------------------------------------------------
-# 3. Process EIA 923 (generation)
-# -------------------------------------------------------------
-e923_path = DATA_RAW / "EIA_923.csv"
-e923 = pd.read_csv(e923_path)
-
-e923["facilid"] = (
-    pd.to_numeric(e923["facilid"], errors="coerce")
-      .astype("Int64")
-      .astype(str)
-      .str.strip()
-)
-e923["utilid"]  = e923["utilid"].astype(str).str.strip()
-
-print("Unique plants in EIA 923:", e923["facilid"].nunique())
-
-e923_loc = e923.merge(
-    loc_subset,
-    how="left",
-    left_on="facilid",
-    right_on="Plant_Code",
-    suffixes=("", "_loc")
-)
-
-missing_923 = e923_loc["County"].isna().mean()
-print(f"EIA 923: missing location fraction = {missing_923:.3f}")
-
-e923_loc_out = DATA_INT / "EIA_923_with_loc.csv"
-e923_loc.to_csv(e923_loc_out, index=False)
-print("Saved:", e923_loc_out)
+OUTPUT = ROOT / "output"
+
+# Rows of EIA_923.csv read per chunk. The 923 file is streamed through the
+# location merge so peak memory depends on this, not on the file size.
+# Set to None to load the whole file at once.
+E923_CHUNKSIZE = 500_000
+
+# Worker processes for the merge (--workers). With 1 everything runs in
+# this process: each 923 chunk is a cheap hash merge, parsed here anyway,
+# so shipping it to a worker and the result back costs more than the
+# merge (about 2x slower on one core). With more, EIA 860 and the 923
+# chunks run side by side in a process pool.
+N_WORKERS = 1
+
+
+def load_locations(loc_path: Path) -> pd.DataFrame:
+    """Plant location lookup keyed on Int32 Plant_Code."""
+    # Needed variables only, typed per schemas.py (Int32 IDs,
+    # categorical State / County)
+    loc_subset = read_csv(loc_path, "EIA_power_plant_location")
+
+    # Trim names; the categories are cleaned once instead of every row
+    for c in ["County", "State"]:
+        loc_subset[c] = (
+            loc_subset[c].astype(str).str.strip()
+            .where(loc_subset[c].notna())
+            .astype("category")
+        )
+
+    return loc_subset
+
+
+def merge_location(eia: pd.DataFrame, loc_subset: pd.DataFrame) -> pd.DataFrame:
+    """Standardize EIA plant/utility IDs and left-merge plant locations."""
+    # IDs are Int32 when read through schemas.py; coerce anything else
+    # the same way so the merge key matches Plant_Code
+    eia["facilid"] = as_id(eia["facilid"])
+    eia["utilid"]  = as_id(eia["utilid"])
+
+    # Merge ONLY on plant ID
+    return eia.merge(
+        loc_subset,
+        how="left",
+        left_on="facilid",
+        right_on="Plant_Code",
+        suffixes=("", "_loc")
+    )
+
+
+def merge_location_chunked(
+    eia_path: Path,
+    loc_subset: pd.DataFrame,
+    data_int: Path,
+    out_name: str,
+    chunksize: int,
+    pool=None,
+    workers: int = 1,
+    step: Step = None,
+) -> tuple[int, int, int]:
+    """
+    Stream `eia_path` through `merge_location` in row chunks, appending each
+    merged chunk to the intermediate `out_name`. With a process `pool`,
+    up to 2 x `workers` chunks are merged concurrently (output order kept).
+    Rows read and written are added to `step` (run_report.py) when given.
+
+    Returns (rows, rows missing a location, unique plants).
+    """
+    n_rows = 0
+    n_missing = 0
+    plants = set()
+
+    chunks = iter_csv(eia_path, "EIA_923", chunksize=chunksize)
+    if step is not None:
+        chunks = step.counted(chunks)
+    merge = functools.partial(merge_location, loc_subset=loc_subset)
+    if pool is None:
+        results = map(merge, chunks)
+    else:
+        results = imap_ordered(pool, merge, chunks, max_pending=2 * workers)
+
+    with ChunkedWriter(data_int, out_name) as writer:
+        for merged in results:
+            n_rows += len(merged)
+            n_missing += int(merged["County"].isna().sum())
+            plants.update(merged["facilid"].unique())
+
+            writer.write(merged)
+            if step is not None:
+                step.add(rows_out=len(merged))
+
+    return n_rows, n_missing, len(plants)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge plant locations onto EIA 860 / 923")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=N_WORKERS,
+        help="worker processes (default: 1, in-process)",
+    )
+    args = parser.parse_args()
+
+    DATA_INT.mkdir(parents=True, exist_ok=True)
+    report = RunReport("01_merge_location", OUTPUT)
+
+    # -------------------------------------------------------------
+    # 1. Load plant location file
+    # -------------------------------------------------------------
+    with report.step("load plant locations", "load") as s:
+        loc_subset = load_locations(DATA_RAW / "EIA_power_plant_location.csv")
+        s.rows_out = len(loc_subset)
+
+    print("Loaded plant location file.")
+    print("Unique plants in location file:", loc_subset["Plant_Code"].nunique())
+
+    with contextlib.ExitStack() as stack:
+        pool = None
+        if args.workers > 1:
+            pool = stack.enter_context(process_pool(args.workers))
+
+        # -------------------------------------------------------------
+        # 2. Process EIA 860 (capacity) -- with a pool, submitted first and
+        #    run while the 923 chunks stream through the other workers
+        # -------------------------------------------------------------
+        with report.step("load EIA_860", "load") as s:
+            e860 = read_csv(DATA_RAW / "EIA_860.csv", "EIA_860")
+            s.rows_out = n_860 = len(e860)
+        if pool is not None:
+            e860_future = pool.submit(merge_location, e860, loc_subset)
+            del e860
+
+        # -------------------------------------------------------------
+        # 3. Process EIA 923 (generation)
+        # -------------------------------------------------------------
+        e923_path = DATA_RAW / "EIA_923.csv"
+
+        if E923_CHUNKSIZE:
+            # Streaming: a bounded number of chunks in memory, counts accumulated;
+            # reading, merging and writing interleave, so they are one step
+            with report.step("merge EIA_923 location (streamed)", "merge") as s:
+                n_rows, n_missing, n_plants = merge_location_chunked(
+                    e923_path, loc_subset, DATA_INT, "EIA_923_with_loc",
+                    E923_CHUNKSIZE, pool=pool, workers=args.workers, step=s,
+                )
+                s.join(loc_subset["Plant_Code"], unmatched=n_missing)
+        else:
+            with report.step("load EIA_923", "load") as s:
+                e923 = read_csv(e923_path, "EIA_923")
+                s.rows_out = len(e923)
+            with report.step("merge EIA_923 location", "merge", rows_in=len(e923)) as s:
+                if pool is None:
+                    e923_loc = merge_location(e923, loc_subset)
+                else:
+                    e923_loc = pool.submit(merge_location, e923, loc_subset).result()
+                del e923
+                n_rows, n_plants = len(e923_loc), e923_loc["facilid"].nunique()
+                n_missing = int(e923_loc["County"].isna().sum())
+                s.join(loc_subset["Plant_Code"], rows_out=n_rows, unmatched=n_missing)
+            with report.step("write EIA_923_with_loc", "write", rows_in=n_rows):
+                write_intermediate(e923_loc, DATA_INT, "EIA_923_with_loc")
+            del e923_loc
+
+        # With a pool this ran alongside the 923 merge: the time is what
+        # is left after it
+        with report.step("merge EIA_860 location", "merge", rows_in=n_860) as s:
+            e860_loc = merge_location(e860, loc_subset) if pool is None else e860_future.result()
+            s.join(loc_subset["Plant_Code"], rows_out=len(e860_loc),
+                   unmatched=int(e860_loc["County"].isna().sum()))
+
+    print("Unique plants in EIA 860:", e860_loc["facilid"].nunique())
+
+    missing_860 = e860_loc["County"].isna().mean()
+    print(f"EIA 860: missing location fraction = {missing_860:.3f}")
+
+    with report.step("write EIA_860_with_loc", "write", rows_in=len(e860_loc)):
+        e860_loc_out = write_intermediate(e860_loc, DATA_INT, "EIA_860_with_loc")
+    print("Saved:", *e860_loc_out)
+
+    print("Unique plants in EIA 923:", n_plants)
+    missing_923 = n_missing / n_rows if n_rows else float("nan")
+    print(f"EIA 923: missing location fraction = {missing_923:.3f}")
+    print("Saved:", DATA_INT / "EIA_923_with_loc")
+
+    report.write()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+02a_build_fips_crosswalk.py
+
+Build the state and county FIPS crosswalks from the Census GOVS workbook
+and the FIPS lookup index 02b / 02c match against -- the Python stage
+replacing 02a_build_fips_crosswalk.do, so the pipeline runs without
+Stata.
+
+Parsing and caching live in fips_crosswalk.py: both outputs are rebuilt
+only when the workbook's hash changes, so a warm run only checks the hash
+and loads the pickled index. 02b / 02c (through fips_index.py) also build
+the crosswalk on first use, so running this stage first is optional.
+
+Inputs
+------
+data_raw/GOVS_to_FIPS_Codes_State_&_County_2007.xls  (needs xlrd)
+
+Outputs
+-------
+data_intermediate/fips_state_codes.csv
+data_intermediate/fips_county_codes_2007.csv
+  (+ .dta when requested via SHALE_EXPORT, see intermediate_store.py)
+data_intermediate/fips_crosswalk.json  (workbook hash)
+data_intermediate/fips_index.pkl       (see fips_index.py)
+
+Usage
+-----
+python code/02a_build_fips_crosswalk.py [--force]
+"""
+
+import argparse
+from pathlib import Path
+
+from fips_crosswalk import ensure_crosswalk
+from fips_index import load_fips_index
+from run_report import RunReport
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build FIPS crosswalks and lookup index from the GOVS workbook"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="rebuild even if the workbook is unchanged",
+    )
+    args = parser.parse_args()
+
+    # ------------------------------------------------------------------
+    # 0. Set up paths relative to this script (repo-root independent)
+    # ------------------------------------------------------------------
+    this_file = Path(__file__).resolve()
+    repo_root = this_file.parents[1]           # .. from code/ to repo root
+
+    data_int = repo_root / "data_intermediate"
+    data_int.mkdir(parents=True, exist_ok=True)
+    report = RunReport("02a_build_fips_crosswalk", repo_root / "output")
+
+    # ------------------------------------------------------------------
+    # 1. Crosswalk CSVs (skipped when the workbook hash matches)
+    # ------------------------------------------------------------------
+    with report.step("build FIPS crosswalk", "load") as s:
+        built = ensure_crosswalk(data_int, force=args.force)
+        s.note(rebuilt=built)
+    if not built:
+        print("FIPS crosswalk up to date")
+
+    # ------------------------------------------------------------------
+    # 2. Lookup index (rebuilt when the CSVs changed)
+    # ------------------------------------------------------------------
+    with report.step("load FIPS index", "load") as s:
+        index = load_fips_index(data_int)
+        s.rows_out = len(index.exact)
+    print(f"FIPS index: {len(index.exact)} counties")
+
+    report.write()
+
+
+if __name__ == "__main__":
+    main()
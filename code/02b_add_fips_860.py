@@ -3,23 +3,44 @@
 02b_add_fips.py
 
 Merge 5-digit county FIPS codes onto the intermediate EIA 860 file
-(EIA_860_with_loc.csv) by state name and county name.
+(EIA_860_with_loc) by state name and county name.
+
+The matching itself lives in fips_assign.py (shared with 02c); run
+`python code/fips_assign.py` to build 860 and 923 in parallel.
 
 Inputs
 ------
-data_intermediate/EIA_860_with_loc.csv
+data_intermediate/EIA_860_with_loc.parquet (or .csv)
 data_intermediate/fips_state_codes.csv
 data_intermediate/fips_county_codes_2007.csv
+data_raw/county_boundaries.geojson (optional coordinate fallback, see county_geo.py)
 
 Outputs
 -------
-data_intermediate/EIA_860_with_fips.csv
-data_intermediate/EIA_860_with_fips.dta
+data_intermediate/EIA_860_with_fips.parquet
+  (+ .csv / .dta when requested via SHALE_EXPORT, see intermediate_store.py)
+data_intermediate/fips_index.pkl (see fips_index.py)
 """
 
 from pathlib import Path
 import pandas as pd
 
+from fips_assign import assign_fips, report_matches
+from county_geo import load_plant_fips
+from fips_index import FipsIndex, load_fips_index, save_if_dirty
+from intermediate_store import read_intermediate, write_intermediate
+from run_report import RunReport
+
+
+def add_fips(eia: pd.DataFrame, index: FipsIndex, plant_fips: pd.Series = None) -> pd.DataFrame:
+    """Attach FIPS_state / FIPS_county / FIPS_state_county_5digit to `eia`."""
+    eia_merged, counts = assign_fips(eia, index, plant_fips)
+
+    # Quick diagnostics: match rate by tier + most frequent misses
+    report_matches("", counts, eia_merged)
+
+    return eia_merged
+
 
 def main():
     # ------------------------------------------------------------------
@@ -29,96 +50,39 @@ def main():
     repo_root = this_file.parents[1]           # .. from code/ to repo root
 
     data_int = repo_root / "data_intermediate"
-
-    eia_path = data_int / "EIA_860_with_loc.csv"
-    state_path = data_int / "fips_state_codes.csv"
-    county_path = data_int / "fips_county_codes_2007.csv"
+    report = RunReport("02b_add_fips_860", repo_root / "output")
 
     # ------------------------------------------------------------------
     # 1. Load data
     # ------------------------------------------------------------------
     # Keep codes as strings to preserve leading zeros
-    eia = pd.read_csv(eia_path, dtype={"State": str, "County": str})
-    state = pd.read_csv(state_path, dtype=str)
-    county = pd.read_csv(county_path, dtype=str)
+    with report.step("load EIA_860_with_loc", "load") as s:
+        eia = read_intermediate(
+            data_int, "EIA_860_with_loc", dtype={"State": str, "County": str}
+        )
+        s.rows_out = len(eia)
+    with report.step("load FIPS index", "load"):
+        index = load_fips_index(data_int)
+        plant_fips = load_plant_fips(data_int)
 
     # ------------------------------------------------------------------
-    # 2. Standardize state & county names (upper-case, trimmed)
+    # 2. Match EIA to county FIPS by (state, county) name
     # ------------------------------------------------------------------
-    def clean_name(s: pd.Series) -> pd.Series:
-        return s.str.upper().str.strip()
-
-    # EIA names
-    eia["state_clean"] = clean_name(eia["State"])
-    eia["county_clean"] = clean_name(eia["County"])
-
-    # State crosswalk
-    # Expect columns: govs_state_code, state_name, fips_state_code
-    state["state_clean"] = clean_name(state["state_name"])
-
-    # County crosswalk
-    # Expect columns: govs_state_code, govs_county_code, county_name,
-    #                 fips_state_code, fips_county_2002, fips_county_2007,
-    #                 fips_state_county_2007
-    # Attach state name to county table via govs/fips state code
-    county_full = county.merge(
-        state[["govs_state_code", "state_name", "fips_state_code", "state_clean"]],
-        on=["govs_state_code", "fips_state_code"],
-        how="left",
-        validate="m:1"
-    )
-
-    county_full["county_clean"] = clean_name(county_full["county_name"])
+    with report.step("assign FIPS", "merge", rows_in=len(eia)) as s:
+        eia_merged = add_fips(eia, index, plant_fips)
+        save_if_dirty(index, data_int)
+        s.rows_out = len(eia_merged)
+        s.note(fips_match=eia_merged["FIPS_match"].value_counts().to_dict())
 
     # ------------------------------------------------------------------
-    # 3. Merge EIA with county FIPS by (state_clean, county_clean)
+    # 3. Save outputs
     # ------------------------------------------------------------------
-    merge_cols = [
-        "state_clean",
-        "county_clean",
-        "fips_state_code",
-        "fips_county_2007",
-        "fips_state_county_2007",
-    ]
-
-    eia_merged = eia.merge(
-        county_full[merge_cols],
-        on=["state_clean", "county_clean"],
-        how="left",
-        indicator=True,
-    )
-
-    # Optional: quick diagnostics printed to console
-    total = len(eia_merged)
-    matched = (eia_merged["_merge"] == "both").sum()
-    print(f"Matched rows: {matched} of {total} ({matched/total:.1%})")
-
-    # You can uncomment this to inspect problem cases:
-    # unmatched = eia_merged[eia_merged["_merge"] != "both"]
-    # unmatched.to_csv(data_int / "EIA_860_fips_unmatched_debug.csv", index=False)
+    # Parquet handoff (+ optional CSV / .dta exports)
+    with report.step("write EIA_860_with_fips", "write", rows_in=len(eia_merged)):
+        written = write_intermediate(eia_merged, data_int, "EIA_860_with_fips")
 
-    # ------------------------------------------------------------------
-    # 4. Tidy up and save outputs
-    # ------------------------------------------------------------------
-    # Rename final FIPS columns to something intuitive
-    eia_merged = eia_merged.drop(columns=["_merge"])
-    eia_merged = eia_merged.rename(
-        columns={
-            "fips_state_code": "FIPS_state",
-            "fips_county_2007": "FIPS_county",
-            "fips_state_county_2007": "FIPS_state_county_5digit",
-        }
-    )
-
-    # Save CSV
-    out_csv = data_int / "EIA_860_with_fips.csv"
-    eia_merged.to_csv(out_csv, index=False)
-
-    # Also save a Stata .dta file for convenience
-    out_dta = data_int / "EIA_860_with_fips.dta"
-    eia_merged.to_stata(out_dta, write_index=False, version=118)
-
-    print(f"Saved with FIPS to:\n  {out_csv}\n  {out_dta}")
+    print("Saved with FIPS to:\n  " + "\n  ".join(map(str, written)))
+    report.write()
 
 
 if __name__ == "__main__":
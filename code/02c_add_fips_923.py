@@ -3,30 +3,59 @@
 02c_add_fips_923.py
 
 Merge 5-digit county FIPS codes onto the intermediate EIA 923 file
-(EIA_923_with_loc.csv) by state name and county name.
+(EIA_923_with_loc) by state name and county name.
+
+The matching itself lives in fips_assign.py (shared with 02b); this script
+runs the 923 form through it chunk by chunk, in this process by default
+(--workers N: Parquet parts matched in a process pool, see fips_assign.py).
+Run `python code/fips_assign.py` to build 860 and 923 together.
 
 Inputs
 ------
-data_intermediate/EIA_923_with_loc.csv
+data_intermediate/EIA_923_with_loc.parquet (or .csv)
 data_intermediate/fips_state_codes.csv
 data_intermediate/fips_county_codes_2007.csv
+data_raw/county_boundaries.geojson (optional coordinate fallback, see county_geo.py)
 
 Outputs
 -------
-data_intermediate/EIA_923_with_fips.csv
-data_intermediate/EIA_923_with_fips.dta
+data_intermediate/EIA_923_with_fips.parquet
 """
 
+import argparse
+import contextlib
 from pathlib import Path
+
 import pandas as pd
 
+from fips_assign import assign_fips, process_pool, report_matches, run_form
+from county_geo import load_plant_fips
+from fips_index import FipsIndex, load_fips_index, save_if_dirty
+from run_report import RunReport
 
-def clean_name(s: pd.Series) -> pd.Series:
-    """Uppercase + strip whitespace for name matching."""
-    return s.astype(str).str.upper().str.strip()
+
+def add_fips(
+    eia923: pd.DataFrame,
+    index: FipsIndex,
+    plant_fips: pd.Series = None,
+    verbose: bool = True,
+) -> pd.DataFrame:
+    """Attach FIPS_state / FIPS_county / FIPS_state_county_5digit to `eia923`."""
+    eia923_merged, counts = assign_fips(eia923, index, plant_fips)
+
+    # Quick diagnostics
+    if verbose:
+        report_matches("[EIA-923] ", counts, eia923_merged)
+
+    return eia923_merged
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Assign county FIPS to EIA 923")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes (default: 1, in-process)")
+    args = parser.parse_args()
+
     # ------------------------------------------------------------------
     # 0. Set up paths relative to this script (repo-root independent)
     # ------------------------------------------------------------------
@@ -34,102 +63,30 @@ def main():
     repo_root = this_file.parents[1]  # .. from code/ to repo root
 
     data_int = repo_root / "data_intermediate"
-
-    eia923_path = data_int / "EIA_923_with_loc.csv"
-    state_path = data_int / "fips_state_codes.csv"
-    county_path = data_int / "fips_county_codes_2007.csv"
-
-    # ------------------------------------------------------------------
-    # 1. Load data
-    # ------------------------------------------------------------------
-    # We only need to force State/County to string here; everything else can be inferred.
-    eia923 = pd.read_csv(
-        eia923_path,
-        dtype={"State": str, "County": str},
-    )
-
-    state = pd.read_csv(state_path, dtype=str)
-    county = pd.read_csv(county_path, dtype=str)
-
-    # ------------------------------------------------------------------
-    # 2. Standardize state & county names
-    # ------------------------------------------------------------------
-    # EIA-923 names
-    eia923["state_clean"] = clean_name(eia923["State"])
-    eia923["county_clean"] = clean_name(eia923["County"])
-
-    # State crosswalk: expect columns govs_state_code, state_name, fips_state_code
-    state["state_clean"] = clean_name(state["state_name"])
-
-    # County crosswalk: add state name + clean county name
-    county_full = county.merge(
-        state[["govs_state_code", "state_name", "fips_state_code", "state_clean"]],
-        on=["govs_state_code", "fips_state_code"],
-        how="left",
-        validate="m:1",
-    )
-    county_full["county_clean"] = clean_name(county_full["county_name"])
-
-    # ------------------------------------------------------------------
-    # 3. Merge EIA-923 with county FIPS by (state_clean, county_clean)
-    # ------------------------------------------------------------------
-    merge_cols = [
-        "state_clean",
-        "county_clean",
-        "fips_state_code",
-        "fips_county_2007",
-        "fips_state_county_2007",
-    ]
-
-    eia923_merged = eia923.merge(
-        county_full[merge_cols],
-        on=["state_clean", "county_clean"],
-        how="left",
-        indicator=True,
-    )
-
-    # Quick diagnostics
-    total = len(eia923_merged)
-    matched = (eia923_merged["_merge"] == "both").sum()
-    print(f"[EIA-923] Matched rows: {matched} of {total} ({matched/total:.1%})")
-
-    # Uncomment if you want a debug file of unmatched rows:
-    # unmatched_923 = eia923_merged[eia923_merged["_merge"] != "both"]
-    # unmatched_923.to_csv(data_int / "EIA_923_fips_unmatched_debug.csv", index=False)
+    report = RunReport("02c_add_fips_923", repo_root / "output")
 
     # ------------------------------------------------------------------
-    # 4. Clean up and save outputs
+    # 1. Load lookup index once; match 923 chunks
     # ------------------------------------------------------------------
-    eia923_merged = eia923_merged.drop(columns=["_merge"])
-
-    # Rename FIPS cols to something intuitive
-    eia923_merged = eia923_merged.rename(
-        columns={
-            "fips_state_code": "FIPS_state",
-            "fips_county_2007": "FIPS_county",
-            "fips_state_county_2007": "FIPS_state_county_5digit",
-        }
-    )
-
-    # Save CSV
-    out_csv = data_int / "EIA_923_with_fips.csv"
-    eia923_merged.to_csv(out_csv, index=False)
-
-    # Save Stata .dta
-    out_dta = data_int / "EIA_923_with_fips.dta"
-
-    # Convert all object columns to pure strings
-    obj_cols = eia923_merged.select_dtypes(include="object").columns
-    eia923_merged[obj_cols] = (
-        eia923_merged[obj_cols]
-        .fillna("")   # None/NaN → empty string
-        .astype(str)
-    )
-
-    eia923_merged.to_stata(out_dta, write_index=False, version=118)
-
-
-    print(f"[EIA-923] Saved with FIPS to:\n  {out_csv}\n  {out_dta}")
+    with report.step("load FIPS index", "load"):
+        index = load_fips_index(data_int)
+        plant_fips = load_plant_fips(data_int)
+
+    with contextlib.ExitStack() as stack:
+        pool = None
+        if args.workers > 1:
+            pool = stack.enter_context(process_pool(args.workers))
+        with report.step("assign FIPS EIA_923 (streamed)", "merge") as s:
+            counts = run_form(
+                pool, "923", data_int, index, args.workers, chunksize=500_000,
+                plant_fips=plant_fips, step=s,
+            )
+            s.note(fips_match={k: int(v) for k, v in counts.items()})
+    save_if_dirty(index, data_int)
+
+    report_matches("[EIA-923] ", counts)
+    print(f"[EIA-923] Saved with FIPS to:\n  {data_int / 'EIA_923_with_fips'}")
+    report.write()
 
 
 if __name__ == "__main__":
@@ -7,43 +7,29 @@ to the EIA 860 intermediate file with FIPS.
 
 Inputs
 ------
-data_intermediate/EIA_860_with_fips.csv
+data_intermediate/EIA_860_with_fips.parquet (or .csv)
 data_raw/Rystad/rystad_county.dta
 
 Outputs
 -------
-data_intermediate/EIA_860_with_fips_shale.csv
-data_intermediate/EIA_860_with_fips_shale.dta
+data_intermediate/EIA_860_with_fips_shale.parquet
+  (+ .csv / .dta when requested via SHALE_EXPORT, see intermediate_store.py;
+   03a_reg_shale_860.do needs the .csv)
+data_intermediate/rystad_county_play.npz
+  (sparse county x play scores for other exposure indices, see shale_exposure.py)
 """
 
 from pathlib import Path
 import pandas as pd
 
+from intermediate_store import read_intermediate, write_intermediate
+from run_report import RunReport
+from schemas import read_dta
+from shale_exposure import load_exposure
 
-def main():
-    # -------------------------------------------------------------
-    # 0. Paths relative to repo root
-    # -------------------------------------------------------------
-    this_file = Path(__file__).resolve()
-    repo_root = this_file.parents[1]  # .. from code/ to repo root
-
-    data_int = repo_root / "data_intermediate"
-    data_raw = repo_root / "data_raw" / "Rystad"
-
-    eia_path = data_int / "EIA_860_with_fips.csv"
-    rystad_path = data_raw / "rystad_county.dta"
-
-    # -------------------------------------------------------------
-    # 1. Load data
-    # -------------------------------------------------------------
-    # Keep FIPS as string to preserve leading zeros
-    eia = pd.read_csv(
-        eia_path,
-        dtype={"FIPS_state_county_5digit": str},
-    )
-
-    rystad = pd.read_stata(rystad_path, convert_categoricals=False)
 
+def county_shale(rystad: pd.DataFrame) -> pd.DataFrame:
+    """Collapse Rystad county x play scores to one row per 5-digit FIPS."""
     # -------------------------------------------------------------
     # 2. Clean FIPS & collapse Rystad to county-level index
     # -------------------------------------------------------------
@@ -53,7 +39,7 @@ def main():
     # Collapse to one row per county:
     #   shale_valScoreW_sum: total shale prospectivity (sum over plays)
     #   shale_valScoreM_max: best (max) prospectivity across plays
-    shale_by_county = (
+    return (
         rystad.groupby("fips", as_index=False)
         .agg(
             shale_valScoreW_sum=("valScoreW", "sum"),
@@ -61,6 +47,9 @@ def main():
         )
     )
 
+
+def merge_shale(eia: pd.DataFrame, shale_by_county: pd.DataFrame) -> pd.DataFrame:
+    """Left-merge county shale scores onto `eia` by 5-digit FIPS (0 if none)."""
     # -------------------------------------------------------------
     # 3. Merge onto EIA 860 by county FIPS
     # -------------------------------------------------------------
@@ -92,23 +81,66 @@ def main():
     eia_merged["shale_valScoreW_sum"] = eia_merged["shale_valScoreW_sum"].fillna(0.0)
     eia_merged["shale_valScoreM_max"] = eia_merged["shale_valScoreM_max"].fillna(0.0)
 
+    return eia_merged
+
+
+def add_shale(eia: pd.DataFrame, rystad: pd.DataFrame) -> pd.DataFrame:
+    """Collapse Rystad to county level and merge onto `eia` by 5-digit FIPS."""
+    return merge_shale(eia, county_shale(rystad))
+
+
+def main():
+    # -------------------------------------------------------------
+    # 0. Paths relative to repo root
+    # -------------------------------------------------------------
+    this_file = Path(__file__).resolve()
+    repo_root = this_file.parents[1]  # .. from code/ to repo root
+
+    data_int = repo_root / "data_intermediate"
+    data_raw = repo_root / "data_raw" / "Rystad"
+
+    rystad_path = data_raw / "rystad_county.dta"
+    report = RunReport("02d_add_shale_to_860", repo_root / "output")
+
+    # -------------------------------------------------------------
+    # 1. Load data
+    # -------------------------------------------------------------
+    # Keep FIPS as string to preserve leading zeros
+    with report.step("load EIA_860_with_fips", "load") as s:
+        eia = read_intermediate(
+            data_int,
+            "EIA_860_with_fips",
+            dtype={"FIPS_state_county_5digit": str},
+        )
+        s.rows_out = len(eia)
+
+    with report.step("load rystad_county", "load") as s:
+        rystad = read_dta(rystad_path, "rystad_county")
+        s.rows_out = len(rystad)
+
+    with report.step("collapse Rystad to county", "aggregate", rows_in=len(rystad)) as s:
+        shale_by_county = county_shale(rystad)
+        s.rows_out = len(shale_by_county)
+
+    # Full county x play scores, kept for exposure indices beyond the collapse
+    with report.step("build county x play matrix", "aggregate", rows_in=len(rystad)) as s:
+        expo = load_exposure(data_int, rystad_path)
+        s.rows_out = len(expo.fips)
+        s.note(plays=len(expo.plays), scores=int(expo.W.nnz))
+
+    with report.step("merge shale onto EIA_860", "merge", rows_in=len(eia)) as s:
+        eia_merged = merge_shale(eia, shale_by_county)
+        s.join(shale_by_county["fips"], rows_out=len(eia_merged),
+               unmatched=int((~eia_merged["fips_5"].isin(shale_by_county["fips"])).sum()))
+
     # -------------------------------------------------------------
     # 4. Save outputs
     # -------------------------------------------------------------
-    out_csv = data_int / "EIA_860_with_fips_shale.csv"
-    eia_merged.to_csv(out_csv, index=False)
-
-    # Save a Stata .dta version (make sure object cols are strings)
-    out_dta = data_int / "EIA_860_with_fips_shale.dta"
-    obj_cols = eia_merged.select_dtypes(include="object").columns
-    eia_merged[obj_cols] = (
-        eia_merged[obj_cols]
-        .fillna("")
-        .astype(str)
-    )
-    eia_merged.to_stata(out_dta, write_index=False, version=118)
+    with report.step("write EIA_860_with_fips_shale", "write", rows_in=len(eia_merged)):
+        written = write_intermediate(eia_merged, data_int, "EIA_860_with_fips_shale")
 
-    print(f"[EIA-860] Saved shale-augmented files to:\n  {out_csv}\n  {out_dta}")
+    print("[EIA-860] Saved shale-augmented files to:\n  " + "\n  ".join(map(str, written)))
+    report.write()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+02e_aggregate_gen_923.py
+
+Reduce the plant-month EIA 923 file with FIPS to county-year generation
+by fuel, in one streaming pass.
+
+Each chunk of EIA_923_with_fips is summed to (fips_5, year) partial totals
+and the partials are folded into a running total as they accumulate, so
+only a county-year-sized table is ever held in memory, never the full
+plant-month table. The result joins onto the 860 county-year panel
+(03a_reg_shale_860.py picks it up when present), which makes generation
+outcomes (gen_coal, gen_ng, gen_re, ...) regressable alongside capacity.
+
+generation source codes follow the capacity source codes:
+#1: coal; 2: oil; 3: ng; 4: wind; 5: solar;
+6: hydro; 7: biomass; 8: nuclear; 9: other fossil;
+10: other non-fossil; 11: other gas; 12: other
+
+Inputs
+------
+data_intermediate/EIA_923_with_fips.parquet (or .csv)
+
+Outputs
+-------
+data_intermediate/EIA_923_county_year_gen.parquet
+  (+ .csv / .dta when requested via SHALE_EXPORT, see intermediate_store.py)
+"""
+
+from pathlib import Path
+
+import pandas as pd
+
+from intermediate_store import intermediate_columns, iter_intermediate, write_intermediate
+from run_report import RunReport
+from schemas import FUEL_CODES
+
+
+GROUP_COLS = ["fips_5", "year"]
+
+# Fold the partial sums once they hold this many rows
+REDUCE_ROWS = 2_000_000
+
+
+class GenerationAggregator:
+    """
+    Running fips_5 x year totals of generation by fuel.
+
+        agg = GenerationAggregator()
+        for chunk in chunks:
+            agg.add(chunk)
+        gen = agg.result()
+    """
+
+    def __init__(self):
+        self.partials = []
+        self.n_partial = 0
+        self.rows_in = 0
+        self.rows_unassigned = 0
+
+    def add(self, chunk: pd.DataFrame):
+        gen_cols = {
+            f"generation source {k}": f"gen_{v}"
+            for k, v in FUEL_CODES.items()
+            if f"generation source {k}" in chunk.columns
+        }
+
+        fips = chunk["FIPS_state_county_5digit"]
+        keep = fips.notna()
+        self.rows_in += len(chunk)
+        self.rows_unassigned += int((~keep).sum())
+
+        part = pd.DataFrame({
+            "fips_5": fips[keep].astype(str).str.strip().str.zfill(5),
+            "year": chunk.loc[keep, "year"],
+        })
+        for src, dst in gen_cols.items():
+            part[dst] = chunk.loc[keep, src].astype("float64")
+
+        self.partials.append(part.groupby(GROUP_COLS, as_index=False).sum())
+        self.n_partial += len(self.partials[-1])
+        if self.n_partial > REDUCE_ROWS:
+            self._reduce()
+
+    def _reduce(self):
+        if len(self.partials) > 1:
+            merged = pd.concat(self.partials, ignore_index=True)
+            self.partials = [merged.groupby(GROUP_COLS, as_index=False).sum()]
+        self.n_partial = sum(len(p) for p in self.partials)
+
+    def result(self) -> pd.DataFrame:
+        if not self.partials:
+            return pd.DataFrame(columns=GROUP_COLS)
+        self._reduce()
+        gen = self.partials[0]
+        gen["year"] = gen["year"].astype("int64")    # county-year: plain int, as the 860 panel
+        if "gen_wind" in gen.columns and "gen_solar" in gen.columns:
+            gen["gen_re"] = gen["gen_wind"] + gen["gen_solar"]
+        return gen.sort_values(GROUP_COLS, ignore_index=True)
+
+
+def aggregate_generation(chunks) -> pd.DataFrame:
+    """fips_5 x year generation totals from an iterable of 923 chunks."""
+    agg = GenerationAggregator()
+    for chunk in chunks:
+        agg.add(chunk)
+
+    gen = agg.result()
+    print(f"[EIA-923] {agg.rows_in} rows -> {len(gen)} county-years "
+          f"({agg.rows_unassigned} rows without FIPS skipped)")
+    return gen
+
+
+def main():
+    # ------------------------------------------------------------------
+    # 0. Set up paths relative to this script (repo-root independent)
+    # ------------------------------------------------------------------
+    this_file = Path(__file__).resolve()
+    repo_root = this_file.parents[1]  # .. from code/ to repo root
+
+    data_int = repo_root / "data_intermediate"
+    eia_name = "EIA_923_with_fips"
+    report = RunReport("02e_aggregate_gen_923", repo_root / "output")
+
+    # ------------------------------------------------------------------
+    # 1. Stream only the needed columns, one chunk / part at a time
+    # ------------------------------------------------------------------
+    available = intermediate_columns(data_int, eia_name)
+    wanted = ["FIPS_state_county_5digit", "year"] + [
+        f"generation source {k}" for k in FUEL_CODES
+    ]
+    chunks = iter_intermediate(
+        data_int,
+        eia_name,
+        columns=[c for c in wanted if c in available],
+        dtype={"FIPS_state_county_5digit": str},
+        chunksize=500_000,
+    )
+
+    with report.step("aggregate EIA_923 generation (streamed)", "aggregate") as s:
+        gen = aggregate_generation(s.counted(chunks))
+        s.rows_out = len(gen)
+
+    # ------------------------------------------------------------------
+    # 2. Save county-year generation panel
+    # ------------------------------------------------------------------
+    with report.step("write EIA_923_county_year_gen", "write", rows_in=len(gen)):
+        written = write_intermediate(gen, data_int, "EIA_923_county_year_gen")
+    print("Saved county-year generation to:\n  " + "\n  ".join(map(str, written)))
+    report.write()
+
+
+if __name__ == "__main__":
+    main()
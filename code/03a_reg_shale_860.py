@@ -3,16 +3,49 @@
 03a_reg_shale_860.py
 
 County-year regressions of capacity on shale potential using
-EIA_860_with_fips_shale.csv.
+the EIA_860_with_fips_shale intermediate (only the needed columns are read).
 
-- Builds coal / gas / RE (wind+solar) capacity at county-year level
+- Builds coal / gas / RE (wind+solar) capacity at county-year level,
+  plus the capacity added / retired by plants in each county-year
+  (cap_added_<fuel>, cap_retired_<fuel>; plant-year panel in plant_panel.py)
 - Normalizes shale_valScoreW_sum via log(1 + x)
 - Runs regressions:
     cap_coal_ct, cap_ng_ct, cap_re_ct
   on shale_index * post + shale_index + post + county FE + year FE
-  with SEs clustered by county.
+  with SEs clustered by county (FE absorbed by iterative demeaning,
+  see hdfe.py; matches reghdfe in 03a_reg_shale_860.do).
 
 Prints a compact summary table of the coefficient on shale_post only.
+When data_raw/county_adjacency.dta is present, neighbor shale exposure and
+lagged neighbor capacity are added (spatial.py) and a spillover spec is
+written to output/reg_capacity_shale_spillover.csv.
+For the main outcomes, shale_post is also tested with county x state
+two-way clustered SEs, in output/reg_capacity_shale_inference.csv; with
+--bootstrap B, wild cluster bootstrap p-values from B replications
+(wild_bootstrap.py) are added to it.
+All capacity sources present in the file (plus cap_re) -- and, when
+02e_aggregate_gen_923.py has produced EIA_923_county_year_gen, the matching
+generation outcomes gen_<fuel> -- are estimated in one batched solve; the
+full tidy table goes to output/reg_capacity_shale_by_fuel.csv.
+With --event-study, shale_post is replaced by shale_index x 1[year == k]
+for every year but --base-year (default 2009), and the coefficient paths
+go to output/reg_capacity_shale_event_study.csv.
+With --permutations N, county shale scores are reassigned N times (within
+state with --within-state) for randomization-inference p-values on
+shale_post (randomization.py), in output/reg_capacity_shale_ri.csv.
+
+Per-play scores (shale_play_<play>) are attached from the county x play
+Rystad matrix (shale_exposure.py).
+
+The county-year panel is also saved as a memory-mapped .panel store
+(panel_store.py) for the spec grid and notebooks.
+
+Usage
+-----
+python code/03a_reg_shale_860.py
+python code/03a_reg_shale_860.py --bootstrap 9999
+python code/03a_reg_shale_860.py --event-study --base-year 2009
+python code/03a_reg_shale_860.py --permutations 2000 --within-state
 
 capacity source codes: 
 #1: coal; 2: oil; 3: ng; 4: wind; 5: solar; 
@@ -20,34 +53,43 @@ capacity source codes:
 10: other non-fossil; 11: other gas; 12: other
 """
 
+import argparse
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
-import statsmodels.formula.api as smf
 
+from hdfe import interact_levels, reg_hdfe_batch
+from randomization import permutation_test
+from wild_bootstrap import wild_bootstrap
+from shale_exposure import PlayExposure, load_exposure
+from spatial import CountyAdjacency, county_neighbor_mean, load_adjacency, panel_neighbor_mean
+from intermediate_store import (
+    has_intermediate,
+    intermediate_columns,
+    read_intermediate,
+    write_intermediate,
+)
+from panel_store import write_panel
+from plant_panel import county_flows, plant_year_panel
+from run_report import RunReport
+from schemas import FUEL_CODES  # capacity source N -> cap_<fuel>
 
-def main():
-    # ---------------------------------------------------------
-    # 0. Paths
-    # ---------------------------------------------------------
-    this_file = Path(__file__).resolve()
-    repo_root = this_file.parents[1]  # .. from code/ to repo root
+MAIN_OUTCOMES = ["cap_coal", "cap_ng", "cap_re"]
 
-    data_int = repo_root / "data_intermediate"
-    eia_path = data_int / "EIA_860_with_fips_shale.csv"
+REGRESSORS = ["shale_post", "shale_index", "post"]
 
-    # ---------------------------------------------------------
-    # 1. Load plant-level data
-    # ---------------------------------------------------------
-    df = pd.read_csv(
-        eia_path,
-        dtype={
-            "FIPS_state_county_5digit": str,
-            "year": int,
-        },
-    )
+# Event study: reference year of the shale_index x year path (the year
+# before the post-2010 period)
+EVENT_BASE_YEAR = 2009
+
+# Own and neighbor shale exposure (see add_spatial)
+SPILLOVER_REGRESSORS = ["shale_post", "nbr_shale_post", "nbr2_shale_post",
+                        "shale_index", "post"]
 
+
+def build_county_year(df: pd.DataFrame) -> pd.DataFrame:
+    """Plant-level 860 rows -> county-year capacities + shale regressors."""
     # ---------------------------------------------------------
     # 2. Build county-year panel & capacity by fuel
     # ---------------------------------------------------------
@@ -61,39 +103,47 @@ def main():
 
     # ---- Map capacity sources ----
     # Using your coauthor's naming:
-    # 1 = coal, 3 = natural gas, 4 = wind, 5 = solar
-    coal_col = "capacity source 1"
-    ng_col   = "capacity source 3"
-    wind_col = "capacity source 4"
-    solar_col = "capacity source 5"
+    # 1 = coal, 3 = natural gas, 4 = wind, 5 = solar (required);
+    # the remaining sources are carried along when present
+    cap_cols = {f"capacity source {k}": f"cap_{v}" for k, v in FUEL_CODES.items()}
 
-    for c in [coal_col, ng_col, wind_col, solar_col]:
+    for c in ["capacity source 1", "capacity source 3",
+              "capacity source 4", "capacity source 5"]:
         if c not in df.columns:
-            raise KeyError(f"Expected column '{c}' not found in {eia_path.name}")
+            raise KeyError(f"Expected column '{c}' not found in plant-level data")
+
+    cap_cols = {c: name for c, name in cap_cols.items() if c in df.columns}
 
     # County-year aggregation: sum capacities, take max shale score (same within county)
     group_cols = ["fips_5", "year"]
 
-    agg_dict = {
-        coal_col: "sum",
-        ng_col: "sum",
-        wind_col: "sum",
-        solar_col: "sum",
+    agg_dict = {c: "sum" for c in cap_cols}
+    agg_dict.update({
         "shale_valScoreW_sum": "max",  # constant per county
         "shale_valScoreM_max": "max",
-    }
+    })
 
     cty = df.groupby(group_cols, as_index=False).agg(agg_dict)
+    # Plain int year on the panel (the plant rows read it as nullable
+    # Int16, which statsmodels / patsy cannot use); the groupby has
+    # already dropped missing years
+    cty["year"] = cty["year"].astype("int64")
 
     # Rename capacities
-    cty = cty.rename(
-        columns={
-            coal_col: "cap_coal",
-            ng_col: "cap_ng",
-            wind_col: "cap_wind",
-            solar_col: "cap_solar",
-        }
-    )
+    cty = add_shale_regressors(cty.rename(columns=cap_cols))
+
+    # Capacity added / retired by plants (needs the plant IDs)
+    if "facilid" in df.columns:
+        cty = add_flows(cty, plant_year_panel(df))
+    return cty
+
+
+def add_shale_regressors(cty: pd.DataFrame) -> pd.DataFrame:
+    """
+    cap_re and the shale regressors (shale_raw, shale_index, post,
+    shale_post) on an aggregated county-year panel with cap_<fuel> and
+    shale_valScoreW_sum columns (also used by duckdb_backend.py).
+    """
     cty["cap_re"] = cty["cap_wind"] + cty["cap_solar"]
 
     # ---------------------------------------------------------
@@ -112,50 +162,447 @@ def main():
     # Interaction
     cty["shale_post"] = cty["shale_index"] * cty["post"]
 
+    return cty
+
+
+def add_flows(cty: pd.DataFrame, plants: pd.DataFrame) -> pd.DataFrame:
+    """
+    Join county-year capacity flows (cap_added_<fuel>, cap_retired_<fuel>,
+    see plant_panel.py) onto the panel. A retirement dated in a county-year
+    without any plant left (the county's last plant exited) adds that
+    county-year with zero stocks and the county's shale scores, so the
+    cap_retired_<fuel> columns sum to county_flows.
+    """
+    flows = county_flows(plants)
+    flows["fips_5"] = flows["fips_5"].astype(str)
+    flows["year"] = flows["year"].astype("int64")
+    cty = cty.assign(fips_5=cty["fips_5"].astype(str), year=cty["year"].astype("int64"))
+
+    flow_cols = [c for c in flows.columns if c.startswith("cap_")]
+    cty = cty.merge(flows, on=["fips_5", "year"], how="outer", validate="1:1",
+                    indicator=True, sort=True)
+    new = (cty.pop("_merge") == "right_only").to_numpy()
+    if new.any():
+        # County-level scores from the county's other years; stocks and
+        # generation are zero, and the shale regressors are rebuilt
+        county_cols = [c for c in cty.columns
+                       if c.startswith(("shale_valScore", "shale_play_"))]
+        filled = cty.groupby("fips_5")[county_cols].transform("max")
+        cty.loc[new, county_cols] = filled.loc[new]
+        stocks = [c for c in cty.columns
+                  if c.startswith(("cap_", "gen_")) and c not in flow_cols]
+        cty.loc[new, stocks] = 0.0
+        cty = add_shale_regressors(cty)
+    cty[flow_cols] = cty[flow_cols].fillna(0.0)
+    return cty
+
+
+def add_generation(cty: pd.DataFrame, gen: pd.DataFrame) -> pd.DataFrame:
+    """
+    Join EIA 923 county-year generation (gen_<fuel>, from
+    02e_aggregate_gen_923.py) onto the county-year panel. County-years
+    without 923 records get zero generation, as capacity sums do.
+    """
+    gen = gen.copy()
+    gen["fips_5"] = gen["fips_5"].astype(str)
+    gen["year"] = gen["year"].astype("int64")
+    cty = cty.assign(year=cty["year"].astype("int64"))
+
+    gen_cols = [c for c in gen.columns if c.startswith("gen_")]
+    cty = cty.merge(gen, on=["fips_5", "year"], how="left", validate="1:1")
+    cty[gen_cols] = cty[gen_cols].fillna(0.0)
+    return cty
+
+
+def add_play_exposure(cty: pd.DataFrame, expo: PlayExposure) -> pd.DataFrame:
+    """
+    One shale_play_<play> column per Rystad play (its valScoreW score),
+    read from the county x play matrix by county (shale_exposure.py); 0
+    for counties without that play. Usable as spec-grid measures.
+    """
+    for name, values in expo.by_play().items():
+        cty[name] = expo.attach(cty, values).to_numpy()
+    return cty
+
+
+def add_spatial(cty: pd.DataFrame, adj: CountyAdjacency,
+                expo: PlayExposure = None) -> pd.DataFrame:
+    """
+    Spillover regressors from county adjacency (sparse products, see
+    spatial.py):
+      nbr_shale_index / nbr2_shale_index  mean shale_index of neighbors
+                                          (1 hop) / counties within 2 hops
+      nbr_shale_post, nbr2_shale_post     the same interacted with post
+      nbr_<outcome>_lag1                  neighbors' mean capacity in t-1,
+                                          for the main outcomes
+    Means run over every adjacent county in the adjacency file, plants or
+    not. Neighbor shale_index comes from the Rystad county scores in
+    `expo` (0 outside Rystad; without `expo`, from the panel's counties);
+    a neighbor county-year without plants has zero capacity. Counties not
+    in the adjacency file (or without neighbors) get NaN.
+    """
+    if expo is not None:
+        shale = pd.Series(np.log1p(expo.total("W")), index=expo.fips, name="shale_index")
+    else:
+        shale = cty.groupby("fips_5")["shale_index"].max()
+    for k, prefix in [(1, "nbr"), (2, "nbr2")]:
+        cty[f"{prefix}_shale_index"] = county_neighbor_mean(cty, shale, adj, k=k)
+        cty[f"{prefix}_shale_post"] = cty[f"{prefix}_shale_index"] * cty["post"]
+
+    for c in MAIN_OUTCOMES:
+        cty[f"nbr_{c}_lag1"] = panel_neighbor_mean(cty, c, adj, lag=1)
+
+    return cty
+
+
+def run_regressions(cty: pd.DataFrame, regressors=REGRESSORS) -> pd.DataFrame:
+    """Batched FE regressions of every cap_* / gen_* outcome; tidy coefficient table."""
     # ---------------------------------------------------------
     # 4. Run regressions & build compact summary table
     # ---------------------------------------------------------
-    def run_reg(dep_var: str):
-        """Run OLS with county & year FE, clustered by county, return stats for shale_post."""
-        formula = (
-            f"{dep_var} ~ shale_post + shale_index + post "
-            f"+ C(year) + C(fips_5)"
-        )
+    # One batched solve for every fuel (capacity and, when joined,
+    # generation): the sample, FE demeaning and cluster structure are
+    # shared, only the outcome column changes
+    outcomes = [c for c in cty.columns if c.startswith(("cap_", "gen_"))]
+
+    res = reg_hdfe_batch(
+        cty,
+        depvars=outcomes,
+        regressors=list(regressors),
+        absorb=["year", "fips_5"],
+        cluster="fips_5",
+    )
+
+    return res
+
+
+def event_study(cty: pd.DataFrame, base_year: int = EVENT_BASE_YEAR) -> pd.DataFrame:
+    """
+    Event-study version of the main spec: shale_index x 1[year == k] for
+    every year k except `base_year`, replacing shale_post, with county and
+    year FE, SEs clustered by county, all cap_* / gen_* outcomes in one
+    batched solve.
+
+    The interactions are a sparse (rows x years) matrix passed straight to
+    the solver, not DataFrame columns. Returns the coefficient path
+    dep_var / year / coef / se / t / pval, with the base year as a 0 row.
+    """
+    outcomes = [c for c in cty.columns if c.startswith(("cap_", "gen_"))]
+
+    years = np.sort(cty["year"].unique())
+    if base_year not in years:
+        raise ValueError(f"Base year {base_year} not in panel years {years.min()}-{years.max()}")
+    year_code = np.searchsorted(years, cty["year"].to_numpy())
+    base = int(np.searchsorted(years, base_year))
+
+    path_years = np.delete(years, base)
+    names = [f"shale_x_{y}" for y in path_years]
+    D = interact_levels(cty["shale_index"].to_numpy(), year_code, len(years), omit=[base])
+
+    res = reg_hdfe_batch(
+        cty,
+        depvars=outcomes,
+        regressors=[],
+        absorb=["year", "fips_5"],
+        cluster="fips_5",
+        extra=(names, D),
+    )
+    res["year"] = res["term"].str.removeprefix("shale_x_").astype(int)
+
+    # Reference year, normalized to zero
+    ref = pd.DataFrame({"dep_var": outcomes, "year": base_year,
+                        "coef": 0.0, "se": 0.0, "t": np.nan, "pval": np.nan})
+    cols = ["dep_var", "year", "coef", "se", "t", "pval"]
+    out = pd.concat([res[cols], ref], ignore_index=True)
+    out["dep_var"] = pd.Categorical(out["dep_var"], categories=outcomes)
+    out = out.sort_values(["dep_var", "year"], ignore_index=True)
+    out["dep_var"] = out["dep_var"].astype(str)
+    out.attrs = {"base_year": base_year, "nobs": int(res["nobs"].iloc[0])}
+    return out
+
+
+def run_event_study(cty: pd.DataFrame, out_dir: Path,
+                    base_year: int = EVENT_BASE_YEAR) -> pd.DataFrame:
+    """Event study for all outcomes; prints the main paths, saves the table."""
+    path = event_study(cty, base_year)
+
+    print("\n" + "=" * 72)
+    print(f"Event study: shale_index × 1[year == k], base year {base_year}")
+    print("County & year FE, SEs clustered by county")
+    print("=" * 72)
+    print(path[path["dep_var"].isin(MAIN_OUTCOMES)]
+          .pivot(index="year", columns="dep_var", values="coef")
+          [MAIN_OUTCOMES].round(4))
+
+    out_tab = out_dir / "reg_capacity_shale_event_study.csv"
+    path.to_csv(out_tab, index=False)
+    print(f"\nSaved event-study coefficient paths to: {out_tab}")
+    return path
+
+
+def run_randomization(cty: pd.DataFrame, out_dir: Path, n_perm: int,
+                      within_state: bool = False) -> pd.DataFrame:
+    """
+    Randomization inference for shale_post on every outcome: county shale
+    scores permuted across counties (within state if asked), n_perm draws.
+    Saves output/reg_capacity_shale_ri.csv.
+    """
+    outcomes = [c for c in cty.columns if c.startswith(("cap_", "gen_"))]
+    cty = cty.assign(state_fips=cty["fips_5"].str[:2])
 
-        model = smf.ols(formula=formula, data=cty)
-        res = model.fit(cov_type="cluster", cov_kwds={"groups": cty["fips_5"]})
+    res = permutation_test(
+        cty,
+        outcomes,
+        score="shale_index",
+        post="post",
+        unit="fips_5",
+        absorb=["year", "fips_5"],
+        strata="state_fips" if within_state else None,
+        n_perm=n_perm,
+    )
 
-        b = res.params.get("shale_post", np.nan)
-        se = res.bse.get("shale_post", np.nan)
-        t = res.tvalues.get("shale_post", np.nan)
-        p = res.pvalues.get("shale_post", np.nan)
+    print("\n" + "=" * 72)
+    print(f"Randomization inference for shale_post ({n_perm} permutations"
+          f"{', within state' if within_state else ''})")
+    print("=" * 72)
+    print(res.set_index("dep_var").loc[MAIN_OUTCOMES, ["coef", "p_ri", "placebo_sd"]].round(4))
 
-        return b, se, t, p
+    out_tab = out_dir / "reg_capacity_shale_ri.csv"
+    res.to_csv(out_tab, index=False)
+    print(f"\nSaved randomization-inference table to: {out_tab}")
+    return res
 
-    results = {}
-    for dep in ["cap_coal", "cap_ng", "cap_re"]:
-        results[dep] = run_reg(dep)
 
+def print_summary(res: pd.DataFrame):
+    """Print the shale_post coefficient for the main and all outcomes."""
     # Build a small DataFrame for pretty print
-    out = pd.DataFrame.from_dict(
-        results,
-        orient="index",
-        columns=["coef_shale_post", "se", "t", "pval"],
+    out = (
+        res[res["term"] == "shale_post"]
+        .set_index("dep_var")[["coef", "se", "t", "pval"]]
+        .rename(columns={"coef": "coef_shale_post"})
     )
-    out.index.name = "dep_var"
 
     print("\n" + "=" * 72)
     print("Effect of shale_index × post (shale_post) on capacity")
     print("County & year FE, SEs clustered by county")
     print("=" * 72)
+    print(out.loc[MAIN_OUTCOMES].round(4))
+
+    print("\nAll outcomes:")
+    print(out.round(4))
+
+
+def print_spillover(res: pd.DataFrame):
+    """Print own vs neighbor shale_post coefficients for the main outcomes."""
+    out = (
+        res[res["dep_var"].isin(MAIN_OUTCOMES)]
+        .pivot(index="dep_var", columns="term", values="coef")
+        .loc[MAIN_OUTCOMES, ["shale_post", "nbr_shale_post", "nbr2_shale_post"]]
+    )
+
+    print("\n" + "=" * 72)
+    print("Own vs neighbor shale exposure × post (coefficients)")
+    print("County & year FE, SEs clustered by county")
+    print("=" * 72)
     print(out.round(4))
 
+
+def run_spillover(cty: pd.DataFrame, out_dir: Path) -> pd.DataFrame:
+    """Spillover spec on a panel with add_spatial columns; saves its table."""
+    res = run_regressions(cty, SPILLOVER_REGRESSORS)
+    print_spillover(res)
+
+    out_tab = out_dir / "reg_capacity_shale_spillover.csv"
+    res.to_csv(out_tab, index=False)
+    print(f"\nSaved spillover coefficient table to: {out_tab}")
+    return res
+
+
+def run_inference(cty: pd.DataFrame, out_dir: Path, B: int = 0) -> pd.DataFrame:
+    """
+    shale_post on the main outcomes under alternative inference:
+      county         SEs clustered by county (the main table)
+      county+state   two-way clustered by county and state
+    and, with B > 0 bootstrap replications,
+      wcr_county     wild cluster bootstrap, Rademacher weights by county
+      wcr_state      wild cluster bootstrap, Webb weights by state
+                     (few clusters), county x state SEs
+    (n_nan: bootstrap draws with a NaN t*, left out of their p-value).
+    Saves output/reg_capacity_shale_inference.csv.
+    """
+    cty = cty.assign(state_fips=cty["fips_5"].str[:2])
+    spec = dict(regressors=REGRESSORS, absorb=["year", "fips_5"])
+
+    rows = []
+    for label, cluster in [("county", "fips_5"),
+                           ("county+state", ["fips_5", "state_fips"])]:
+        res = reg_hdfe_batch(cty, MAIN_OUTCOMES, cluster=cluster, **spec)
+        res = res[res["term"] == "shale_post"].assign(
+            inference=label, n_clusters=res.attrs["n_clusters"])
+        rows.append(res[["dep_var", "inference", "coef", "se", "t", "pval", "n_clusters"]])
+
+    bootstraps = [
+        ("wcr_county", "fips_5", None, "rademacher"),
+        ("wcr_state", ["fips_5", "state_fips"], "state_fips", "webb"),
+    ]
+    for label, cluster, boot, weights in bootstraps if B > 0 else []:
+        res = wild_bootstrap(cty, MAIN_OUTCOMES, cluster=cluster, term="shale_post",
+                             bootcluster=boot, B=B, weights=weights, **spec)
+        rows.append(
+            res.rename(columns={"p_boot": "pval", "n_boot_clusters": "n_clusters"})
+            .assign(inference=label)
+            [["dep_var", "inference", "coef", "t", "pval", "n_clusters", "n_nan"]]
+        )
+        for r in res[res["n_nan"] > 0].itertuples():
+            print(f"[{label}] {r.dep_var}: {r.n_nan} of {B} draws with NaN t* "
+                  "(negative multiway variance) left out of the p-value")
+
+    out = pd.concat(rows, ignore_index=True)
+    if "n_nan" in out.columns:
+        out["n_nan"] = out["n_nan"].astype("Int64")
+
+    print("\n" + "=" * 72)
+    print("shale_post p-values by inference method"
+          + (f" (bootstrap B = {B})" if B > 0 else ""))
+    print("=" * 72)
+    print(out.pivot(index="dep_var", columns="inference", values="pval")
+          .loc[MAIN_OUTCOMES].round(4))
+
+    out_tab = out_dir / "reg_capacity_shale_inference.csv"
+    out.to_csv(out_tab, index=False)
+    print(f"\nSaved inference table to: {out_tab}")
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="County-year capacity regressions")
+    parser.add_argument(
+        "--event-study",
+        action="store_true",
+        help="also estimate shale_index x year coefficients "
+             "(output/reg_capacity_shale_event_study.csv)",
+    )
+    parser.add_argument("--base-year", type=int, default=EVENT_BASE_YEAR,
+                        help="omitted (reference) year of the event study")
+    parser.add_argument(
+        "--bootstrap",
+        type=int,
+        default=0,
+        metavar="B",
+        help="wild cluster bootstrap replications for shale_post on the main "
+             "outcomes, e.g. 9999 (0: skip)",
+    )
+    parser.add_argument(
+        "--permutations",
+        type=int,
+        default=0,
+        help="randomization-inference draws for shale_post (0: skip)",
+    )
+    parser.add_argument("--within-state", action="store_true",
+                        help="permute county shale scores only within state")
+    args = parser.parse_args()
+
+    # ---------------------------------------------------------
+    # 0. Paths
+    # ---------------------------------------------------------
+    this_file = Path(__file__).resolve()
+    repo_root = this_file.parents[1]  # .. from code/ to repo root
+
+    data_int = repo_root / "data_intermediate"
+    eia_name = "EIA_860_with_fips_shale"
+    out_dir = repo_root / "output"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    report = RunReport("03a_reg_shale_860", out_dir)
+
+    # ---------------------------------------------------------
+    # 1. Load plant-level data (column projection)
+    # ---------------------------------------------------------
+    available = intermediate_columns(data_int, eia_name)
+    wanted = [
+        "facilid",
+        "FIPS_state_county_5digit",
+        "year",
+        "shale_valScoreW_sum",
+        "shale_valScoreM_max",
+    ] + [f"capacity source {k}" for k in FUEL_CODES]
+
+    with report.step(f"load {eia_name}", "load") as s:
+        df = read_intermediate(
+            data_int,
+            eia_name,
+            columns=[c for c in wanted if c in available],
+            dtype={
+                "FIPS_state_county_5digit": str,
+                "year": int,
+            },
+        )
+        s.rows_out = len(df)
+
+    with report.step("build county-year panel", "aggregate", rows_in=len(df)) as s:
+        cty = build_county_year(df)
+        s.rows_out = len(cty)
+
+    # EIA 923 generation outcomes, when 02e has been run
+    if has_intermediate(data_int, "EIA_923_county_year_gen"):
+        with report.step("load EIA_923_county_year_gen", "load") as s:
+            gen = read_intermediate(data_int, "EIA_923_county_year_gen")
+            s.rows_out = len(gen)
+        with report.step("merge generation onto panel", "merge", rows_in=len(cty)) as s:
+            cty = add_generation(cty, gen)
+            s.join(gen[["fips_5", "year"]], rows_out=len(cty))
+        print(f"Joined EIA 923 generation ({len(gen)} county-years)")
+
+    # Per-play shale scores from the county x play matrix
+    rystad_path = repo_root / "data_raw" / "Rystad" / "rystad_county.dta"
+    expo = None
+    if rystad_path.exists():
+        with report.step("add play exposure", "merge", rows_in=len(cty)) as s:
+            expo = load_exposure(data_int, rystad_path)
+            cty = add_play_exposure(cty, expo)
+            s.note(plays=len(expo.plays))
+
+    # Spillover regressors, when the adjacency file is available
+    adj_path = repo_root / "data_raw" / "county_adjacency.dta"
+    if adj_path.exists():
+        with report.step("add spatial regressors", "merge", rows_in=len(cty)) as s:
+            cty = add_spatial(cty, load_adjacency(adj_path), expo)
+            s.rows_out = len(cty)
+
+    with report.step("regressions by fuel", "estimate", rows_in=len(cty)) as s:
+        res = run_regressions(cty)
+        s.rows_out = len(res)
+
+    print_summary(res)
+
+    out_tab = out_dir / "reg_capacity_shale_by_fuel.csv"
+    res.to_csv(out_tab, index=False)
+    print(f"\nSaved full coefficient table to: {out_tab}")
+
+    with report.step("clustered SEs + wild bootstrap", "estimate", rows_in=len(cty)) as s:
+        run_inference(cty, out_dir, B=args.bootstrap)
+        s.note(bootstrap=args.bootstrap)
+
+    if args.event_study:
+        with report.step("event study", "estimate", rows_in=len(cty)):
+            run_event_study(cty, out_dir, args.base_year)
+
+    if args.permutations:
+        with report.step("randomization inference", "estimate", rows_in=len(cty)) as s:
+            run_randomization(cty, out_dir, args.permutations, args.within_state)
+            s.note(permutations=args.permutations)
+
+    if adj_path.exists():
+        with report.step("spillover regressions", "estimate", rows_in=len(cty)):
+            run_spillover(cty, out_dir)
+
     # ---------------------------------------------------------
     # 5. Save county-year data for later plots / checks
     # ---------------------------------------------------------
-    out_cty = data_int / "EIA_860_county_year_with_shale.csv"
-    cty.to_csv(out_cty, index=False)
-    print(f"\nSaved county-year dataset to: {out_cty}")
+    with report.step("write EIA_860_county_year_with_shale", "write", rows_in=len(cty)):
+        out_cty = write_intermediate(cty, data_int, "EIA_860_county_year_with_shale")
+        out_cty.append(write_panel(cty, data_int, "EIA_860_county_year_with_shale"))
+    print("\nSaved county-year dataset to:", *out_cty)
+    report.write()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+03b_spec_grid.py
+
+Robustness sweep of the shale_post regression over a grid of
+specifications, run in parallel, with one consolidated results table.
+
+A grid is a dict of lists; every combination is one specification:
+
+    post_year   first year of the post period          (03a: 2010)
+    measure     county shale measure                   (shale_valScoreW_sum)
+    transform   log1p | level | quantile               (log1p)
+    sample      named sample filter, see SAMPLES       (all)
+    outcome     capacity / generation outcome          (cap_coal, cap_ng, cap_re)
+
+e.g. {"post_year": [2009, 2010, 2011], "measure": [...], ...}; dimensions
+left out take the 03a value. "quantile" replaces the measure with its
+quantile bin (1..SHALE_BINS) among shale counties, 0 elsewhere.
+
+Specifications on the same sample share everything except the shale
+regressors: the estimation sample, county / year FE indicators, cluster
+codes and the demeaned outcomes are built once per sample
+(hdfe.HdfeDesign) and each specification only demeans its own regressor
+columns and solves for all outcomes at once. With --workers N, samples
+are spread over a pool of spawned processes (fips_assign.process_pool),
+each worker keeping the designs it has built. When the panel is stored
+as a memory-mapped .panel (panel_store.py), workers map that file
+instead of each receiving a pickled copy of the panel.
+
+Every model: county FE + year FE, SEs clustered by county, as in 03a.
+
+Inputs
+------
+data_intermediate/EIA_860_county_year_with_shale.panel    (from 03a; or .parquet)
+
+Outputs
+-------
+output/reg_capacity_shale_spec_grid.csv
+  one row per specification: spec_id / post_year / measure / transform /
+  sample / dep_var / coef / se / t / pval / nobs / r2 / n_clusters
+  (supersedes the hand-built output/reg_capacity_shale.xls)
+
+Usage
+-----
+python code/03b_spec_grid.py
+python code/03b_spec_grid.py --workers 8 --grid my_grid.json
+"""
+
+import argparse
+import importlib
+import itertools
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from fips_assign import process_pool
+from hdfe import HdfeDesign, estimate
+from intermediate_store import read_intermediate
+from panel_store import Panel, has_panel, open_panel
+
+# Main spec and outcomes live in 03a (module name starts with a digit)
+s03a = importlib.import_module("03a_reg_shale_860")
+
+
+# Quantile bins for transform = "quantile"
+SHALE_BINS = 4
+
+# Named sample filters: county-year panel -> rows to keep
+SAMPLES = {
+    "all": lambda cty: np.ones(len(cty), dtype=bool),
+    # counties observed in every panel year
+    "balanced": lambda cty: (
+        cty.groupby("fips_5", observed=True)["year"].transform("nunique")
+        == cty["year"].nunique()
+    ).to_numpy(),
+    # states with at least one shale county
+    "shale_states": lambda cty: (
+        cty.groupby(cty["fips_5"].str[:2])["shale_raw"].transform("max") > 0
+    ).to_numpy(),
+}
+
+# Defaults for dimensions a grid leaves out (the 03a specification)
+BASE_SPEC = {
+    "post_year": 2010,
+    "measure": "shale_valScoreW_sum",
+    "transform": "log1p",
+    "sample": "all",
+    "outcome": "cap_coal",
+}
+
+DEFAULT_GRID = {
+    "post_year": [2008, 2009, 2010, 2011, 2012],
+    "measure": ["shale_valScoreW_sum", "shale_valScoreM_max"],
+    "transform": ["log1p", "level", "quantile"],
+    "sample": list(SAMPLES),
+    "outcome": s03a.MAIN_OUTCOMES,
+}
+
+# Regressor variants handed to a worker per task
+TASK_SIZE = 16
+
+
+def expand_grid(grid: dict) -> pd.DataFrame:
+    """All combinations of a grid, one row per specification (spec_id)."""
+    unknown = set(grid) - set(BASE_SPEC)
+    if unknown:
+        raise KeyError(f"Unknown grid dimensions {sorted(unknown)} "
+                       f"(expected {list(BASE_SPEC)})")
+    bad = set(grid.get("sample", [])) - set(SAMPLES)
+    if bad:
+        raise KeyError(f"Unknown samples {sorted(bad)} (expected {list(SAMPLES)})")
+
+    dims = {d: list(grid.get(d, [BASE_SPEC[d]])) for d in BASE_SPEC}
+    specs = pd.DataFrame(list(itertools.product(*dims.values())), columns=list(dims))
+    specs.insert(0, "spec_id", np.arange(len(specs)))
+    return specs
+
+
+def shale_measure(cty: pd.DataFrame, measure: str, transform: str) -> np.ndarray:
+    """County shale exposure for one (measure, transform), aligned with cty."""
+    raw = cty[measure].fillna(0.0).to_numpy(dtype=np.float64)
+    if transform == "log1p":
+        return np.log1p(raw)
+    if transform == "level":
+        return raw
+    if transform == "quantile":
+        county = pd.Series(raw, index=cty["fips_5"].to_numpy()).groupby(level=0).max()
+        shale = county[county > 0]
+        bins = pd.qcut(shale, SHALE_BINS, labels=False, duplicates="drop") + 1
+        return pd.Series(cty["fips_5"].to_numpy()).map(bins).fillna(0).to_numpy(np.float64)
+    raise ValueError(f"Unknown transform '{transform}'")
+
+
+def spec_regressors(cty: pd.DataFrame, post_year: int, measure: str,
+                    transform: str) -> np.ndarray:
+    """[shale_post, shale_index, post] columns (s03a.REGRESSORS) for one spec."""
+    shale_index = shale_measure(cty, measure, transform)
+    post = (cty["year"].to_numpy() >= post_year).astype(np.float64)
+    return np.column_stack([shale_index * post, shale_index, post])
+
+
+# ------------------------------------------------------------------
+# Workers
+# ------------------------------------------------------------------
+_PANEL = None
+_OUTCOMES = None
+_DESIGNS = {}
+
+
+def _init_worker(cty, outcomes: list[str]):
+    """`cty`: the panel, or the path of a .panel store to map."""
+    global _PANEL, _OUTCOMES
+    if isinstance(cty, (str, Path)):
+        cty = Panel(cty).frame()
+    _PANEL, _OUTCOMES = cty, outcomes
+    _DESIGNS.clear()
+
+
+def _design(sample: str) -> HdfeDesign:
+    """FE-demeaned design of one sample, built once per worker."""
+    if sample not in _DESIGNS:
+        keep = SAMPLES[sample](_PANEL)
+        _DESIGNS[sample] = HdfeDesign(
+            _PANEL.loc[keep].reset_index(drop=True),
+            depvars=_OUTCOMES,
+            regressors=[],
+            absorb=["year", "fips_5"],
+            cluster="fips_5",
+        )
+    return _DESIGNS[sample]
+
+
+def _run_variants(task: tuple) -> pd.DataFrame:
+    """Estimate a batch of regressor variants on one sample (all outcomes)."""
+    sample, variants = task
+    base = _design(sample)
+    panel = _PANEL.loc[SAMPLES[sample](_PANEL)].reset_index(drop=True)
+
+    out = []
+    for post_year, measure, transform in variants:
+        X = spec_regressors(panel, post_year, measure, transform)
+        res = estimate(base.with_regressors(s03a.REGRESSORS, X))
+        n_clusters = res.attrs["n_clusters"]
+        res = res[res["term"] == "shale_post"].drop(columns="term")
+        out.append(res.assign(post_year=post_year, measure=measure,
+                              transform=transform, sample=sample,
+                              n_clusters=n_clusters))
+    return pd.concat(out, ignore_index=True)
+
+
+def run_grid(cty, grid: dict, workers: int = 1) -> pd.DataFrame:
+    """
+    Estimate every specification of `grid`; one row per spec_id. `cty` is
+    the county-year DataFrame or an open Panel (shared by the workers).
+    """
+    specs = expand_grid(grid)
+    outcomes = list(dict.fromkeys(specs["outcome"]))
+    missing = [c for c in outcomes if c not in cty.columns]
+    if missing:
+        raise KeyError(f"Outcomes not in the panel: {missing}")
+
+    if isinstance(cty, Panel):
+        source = str(cty.path)
+    else:
+        source = cty.copy()
+        source["fips_5"] = source["fips_5"].astype(str)
+
+    # Group the work by sample so each worker reuses a sample's design
+    variant_cols = ["post_year", "measure", "transform"]
+    tasks = []
+    for sample, grp in specs.groupby("sample", sort=False):
+        variants = list(grp[variant_cols].drop_duplicates().itertuples(index=False, name=None))
+        for i in range(0, len(variants), TASK_SIZE):
+            tasks.append((sample, variants[i:i + TASK_SIZE]))
+
+    if workers > 1 and len(tasks) > 1:
+        with process_pool(workers, initializer=_init_worker,
+                          initargs=(source, outcomes)) as pool:
+            parts = list(pool.map(_run_variants, tasks))
+    else:
+        _init_worker(source, outcomes)
+        parts = [_run_variants(t) for t in tasks]
+
+    res = pd.concat(parts, ignore_index=True).rename(columns={"dep_var": "outcome"})
+    out = specs.merge(res, on=variant_cols + ["sample", "outcome"], how="left",
+                      validate="1:1")
+    return out.rename(columns={"outcome": "dep_var"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="shale_post specification grid")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="worker processes (default: 1, in-process)",
+    )
+    parser.add_argument(
+        "--grid",
+        type=Path,
+        help="JSON file {dimension: [values]} (default: DEFAULT_GRID)",
+    )
+    args = parser.parse_args()
+
+    # ---------------------------------------------------------
+    # 0. Paths
+    # ---------------------------------------------------------
+    repo_root = Path(__file__).resolve().parents[1]
+    data_int = repo_root / "data_intermediate"
+    out_dir = repo_root / "output"
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    grid = json.loads(args.grid.read_text()) if args.grid else DEFAULT_GRID
+
+    # ---------------------------------------------------------
+    # 1. County-year panel from 03a (memory-mapped when available)
+    # ---------------------------------------------------------
+    name = "EIA_860_county_year_with_shale"
+    if has_panel(data_int, name):
+        cty = open_panel(data_int, name)
+    else:
+        cty = read_intermediate(data_int, name, dtype={"fips_5": str})
+
+    # ---------------------------------------------------------
+    # 2. Run the grid & save one consolidated table
+    # ---------------------------------------------------------
+    start = time.perf_counter()
+    res = run_grid(cty, grid, workers=args.workers)
+    print(f"Estimated {len(res)} specifications in {time.perf_counter() - start:.1f}s")
+
+    print("\nshale_post across specifications (coef quantiles by outcome):")
+    print(res.groupby("dep_var")["coef"].describe()[["count", "min", "25%", "50%", "75%", "max"]]
+          .round(4))
+
+    out_tab = out_dir / "reg_capacity_shale_spec_grid.csv"
+    res.to_csv(out_tab, index=False)
+    print(f"\nSaved specification grid to: {out_tab}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+append_vintage.py
+
+Add one new EIA reporting year to the intermediates and the county-year
+panel without rerunning 01 -> 03a over the full history.
+
+Only the new year's rows are processed: they are read from
+data_raw/EIA_860_<year>.csv / EIA_923_<year>.csv when present (otherwise
+picked out of the full EIA_860.csv / EIA_923.csv while streaming it) and
+written as a year partition of each plant-level intermediate,
+<name>.parquet/part-y<year>-00000.parquet, ... (see intermediate_store.py).
+The parts of earlier years are not touched.
+
+    location    01 merge_location on the new rows
+    FIPS        plants already in EIA_860_with_fips_shale keep the FIPS
+                they were assigned (looked up by facilid, when their State
+                / County are unchanged); only the other rows go through
+                fips_assign.assign_fips
+    shale       02d merge_shale (EIA 860)
+    generation  02e GenerationAggregator over the new 923 rows; their
+                county-years replace that year in EIA_923_county_year_gen
+    panel       the year's county-year rows (03a build_county_year, plus
+                generation and play exposure when the panel has them)
+                replace that year in EIA_860_county_year_with_shale
+
+Capacity flows and spatial regressors link a year to the one before it (a
+plant reported again after a gap turns an earlier exit into a reporting
+gap), so they are recomputed over the county-year panel, from the
+(facilid, year, county, capacity) columns of the EIA 860 form.
+
+Appending a year again replaces its partitions (e.g. EIA's early release
+followed by the final data). A year that is part of the full build cannot
+be appended. The raw CSVs are not changed: fold the year into
+data_raw/EIA_860.csv / EIA_923.csv before the next full rebuild, which
+rewrites every intermediate. Regressions are not rerun; run 03a / 03b
+afterwards (they read the year partitions with the rest).
+
+Usage
+-----
+python code/append_vintage.py 2021
+python code/append_vintage.py 2021 --forms 923 --eia-923 data_raw/EIA_923_2021.csv
+"""
+
+import argparse
+import contextlib
+import importlib
+import itertools
+from pathlib import Path
+
+import pandas as pd
+
+from county_geo import load_plant_fips
+from fips_assign import FIPS_COLS, assign_fips, report_matches
+from fips_index import FipsIndex, load_fips_index, save_if_dirty
+from intermediate_store import (
+    ChunkedWriter,
+    has_intermediate,
+    intermediate_columns,
+    partition_parts,
+    read_intermediate,
+    write_intermediate,
+)
+from panel_store import write_panel
+from plant_panel import FLOW_FUELS, plant_year_panel
+from run_report import RunReport
+from schemas import FUEL_CODES, iter_csv, read_dta
+from shale_exposure import load_exposure
+from spatial import load_adjacency
+
+s01 = importlib.import_module("01_merge_location")
+s02d = importlib.import_module("02d_add_shale_to_860")
+s02e = importlib.import_module("02e_aggregate_gen_923")
+s03a = importlib.import_module("03a_reg_shale_860")
+
+
+ROOT = Path(__file__).resolve().parents[1]
+DATA_RAW = ROOT / "data_raw"
+DATA_INT = ROOT / "data_intermediate"
+OUTPUT = ROOT / "output"
+
+LOC_PATH = DATA_RAW / "EIA_power_plant_location.csv"
+RYSTAD_PATH = DATA_RAW / "Rystad" / "rystad_county.dta"
+ADJ_PATH = DATA_RAW / "county_adjacency.dta"
+
+LOC_860, FIPS_860, SHALE_860 = "EIA_860_with_loc", "EIA_860_with_fips", "EIA_860_with_fips_shale"
+LOC_923, FIPS_923 = "EIA_923_with_loc", "EIA_923_with_fips"
+GEN = "EIA_923_county_year_gen"
+CTY = "EIA_860_county_year_with_shale"
+
+FIPS_OUT = ["state_clean", "county_clean", *FIPS_COLS.values(), "FIPS_match"]
+
+# Panel columns recomputed over all years after an append
+FLOW_PREFIXES = ("cap_added_", "cap_retired_")
+SPATIAL_PREFIXES = ("nbr_", "nbr2_")
+
+
+def vintage_partition(year: int) -> str:
+    return f"y{year}"
+
+
+def raw_path(form: str, year: int) -> Path:
+    """data_raw/EIA_<form>_<year>.csv if present, else the full EIA_<form>.csv."""
+    path = DATA_RAW / f"EIA_{form}_{year}.csv"
+    return path if path.exists() else DATA_RAW / f"EIA_{form}.csv"
+
+
+def vintage_rows(path: Path, name: str, year: int, chunksize: int):
+    """Yield the rows of raw CSV `path` reported for `year`, in chunks."""
+    for chunk in iter_csv(path, name, chunksize):
+        chunk = chunk[chunk["year"] == year]
+        if len(chunk):
+            yield chunk.reset_index(drop=True)
+
+
+def check_new_year(data_int: Path, name: str, year: int):
+    """Raise if `year` is in the parts of `name` written by the full build."""
+    appended = set(partition_parts(data_int, name, vintage_partition(year)))
+    for part in partition_parts(data_int, name):
+        if part not in appended and (pd.read_parquet(part, columns=["year"])["year"] == year).any():
+            raise ValueError(
+                f"{year} is already in {name} from the full build; add it to the raw "
+                "CSVs and rerun the pipeline to replace it"
+            )
+
+
+def write_partition(df: pd.DataFrame, data_int: Path, name: str, year: int):
+    with ChunkedWriter(data_int, name, vintage_partition(year)) as w:
+        w.write(df)
+
+
+# ------------------------------------------------------------------
+# FIPS for known plants
+# ------------------------------------------------------------------
+def known_plants(data_int: Path) -> pd.DataFrame:
+    """facilid -> State / County and the FIPS columns assigned to them, from EIA 860."""
+    cols = ["facilid", "State", "County", *FIPS_OUT]
+    return read_intermediate(data_int, SHALE_860, columns=cols).drop_duplicates("facilid")
+
+
+def assign_known(
+    eia: pd.DataFrame,
+    known: pd.DataFrame,
+    index: FipsIndex,
+    plant_fips: pd.Series = None,
+) -> tuple[pd.DataFrame, int]:
+    """
+    assign_fips for `eia`, except that rows of plants in `known` whose
+    State / County are unchanged take the plant's FIPS columns as they
+    are. Returns the frame and the number of rows looked up.
+    """
+    eia = eia.reset_index(drop=True)
+    if known is None or known.empty:
+        return assign_fips(eia, index, plant_fips)[0], 0
+
+    m = eia[["facilid", "State", "County"]].merge(
+        known, on="facilid", how="left", suffixes=("", "_known"), validate="m:1"
+    )
+    hit = m["FIPS_match"].notna().to_numpy()
+    for c in ["State", "County"]:
+        hit = hit & (m[c].astype(str).to_numpy() == m[f"{c}_known"].astype(str).to_numpy())
+
+    if hit.all():
+        for c in FIPS_OUT:
+            eia[c] = m[c].to_numpy()
+        return eia, len(eia)
+
+    assigned, _ = assign_fips(eia.loc[~hit].copy(), index, plant_fips)
+    for c in FIPS_OUT:
+        values = m[c].to_numpy(dtype=object, copy=True)
+        values[~hit] = assigned[c].astype(object).to_numpy()
+        eia[c] = values
+    return eia, int(hit.sum())
+
+
+# ------------------------------------------------------------------
+# Forms
+# ------------------------------------------------------------------
+def append_860(year: int, path: Path, data_int: Path, loc_subset: pd.DataFrame,
+               index: FipsIndex, plant_fips, known, report: RunReport) -> pd.DataFrame:
+    """New EIA 860 rows -> location -> FIPS -> shale, each written as a year partition."""
+    names = [n for n in [LOC_860, FIPS_860] if has_intermediate(data_int, n)] + [SHALE_860]
+    for name in names:
+        check_new_year(data_int, name, year)
+
+    with report.step(f"load EIA_860 {year}", "load") as s:
+        rows = list(vintage_rows(path, "EIA_860", year, chunksize=500_000))
+        if not rows:
+            raise ValueError(f"No EIA 860 rows for {year} in {path}")
+        e860 = pd.concat(rows, ignore_index=True)
+        s.rows_out = len(e860)
+
+    with report.step("merge EIA_860 location", "merge", rows_in=len(e860)) as s:
+        e860_loc = s01.merge_location(e860, loc_subset)
+        s.join(loc_subset["Plant_Code"], rows_out=len(e860_loc),
+               unmatched=int(e860_loc["County"].isna().sum()))
+
+    with report.step("assign FIPS EIA_860", "merge", rows_in=len(e860_loc)) as s:
+        e860_fips, n_known = assign_known(e860_loc.copy(), known, index, plant_fips)
+        s.rows_out = len(e860_fips)
+        s.note(known_plant_rows=n_known,
+               fips_match=e860_fips["FIPS_match"].value_counts().to_dict())
+    report_matches(f"[EIA-860 {year}] ", e860_fips["FIPS_match"].value_counts())
+    print(f"[EIA-860 {year}] FIPS looked up for {n_known} of {len(e860_fips)} rows "
+          "(known plants)")
+
+    with report.step("merge shale onto EIA_860", "merge", rows_in=len(e860_fips)) as s:
+        shale_by_county = s02d.county_shale(read_dta(RYSTAD_PATH, "rystad_county"))
+        e860_shale = s02d.merge_shale(e860_fips.copy(), shale_by_county)
+        s.rows_out = len(e860_shale)
+
+    frames = {LOC_860: e860_loc, FIPS_860: e860_fips, SHALE_860: e860_shale}
+    for name in names:
+        with report.step(f"write {name} {year}", "write", rows_in=len(frames[name])):
+            write_partition(frames[name], data_int, name, year)
+    return e860_shale
+
+
+def append_923(year: int, path: Path, data_int: Path, loc_subset: pd.DataFrame,
+               index: FipsIndex, plant_fips, known, chunksize: int,
+               report: RunReport) -> pd.DataFrame:
+    """
+    New EIA 923 rows -> location -> FIPS (year partitions of the existing
+    923 intermediates) -> county-year generation, streamed in chunks.
+    """
+    names = [n for n in [LOC_923, FIPS_923] if has_intermediate(data_int, n)]
+    for name in names:
+        check_new_year(data_int, name, year)
+
+    # Read the first chunk before opening the writers, which replace the
+    # year's existing partitions: a wrong or empty input must not wipe them
+    chunks = report.iterate(
+        vintage_rows(path, "EIA_923", year, chunksize), f"923 read EIA_923 {year}"
+    )
+    first = next(chunks, None)
+    if first is None:
+        raise ValueError(f"No EIA 923 rows for {year} in {path}")
+
+    n_rows = n_known = 0
+    counts = pd.Series(dtype="int64")
+    aggregator = s02e.GenerationAggregator()
+    with contextlib.ExitStack() as stack:
+        writers = {
+            name: stack.enter_context(ChunkedWriter(data_int, name, vintage_partition(year)))
+            for name in names
+        }
+        for chunk in itertools.chain([first], chunks):
+            with report.step("923 merge location", "merge", rows_in=len(chunk)) as s:
+                chunk = s01.merge_location(chunk, loc_subset)
+                s.add(rows_out=len(chunk))
+            if LOC_923 in writers:
+                writers[LOC_923].write(chunk)
+
+            with report.step("923 assign FIPS", "merge", rows_in=len(chunk)) as s:
+                chunk, n = assign_known(chunk, known, index, plant_fips)
+                s.add(rows_out=len(chunk))
+            n_rows += len(chunk)
+            n_known += n
+            counts = counts.add(chunk["FIPS_match"].value_counts(), fill_value=0)
+            if FIPS_923 in writers:
+                writers[FIPS_923].write(chunk)
+
+            with report.step("923 aggregate generation", "aggregate", rows_in=len(chunk)):
+                aggregator.add(chunk)
+
+    report.steps["923 assign FIPS"].note(known_plant_rows=n_known)
+    report_matches(f"[EIA-923 {year}] ", counts)
+    print(f"[EIA-923 {year}] FIPS looked up for {n_known} of {n_rows} rows (known plants)")
+
+    gen_year = aggregator.result()
+    if not has_intermediate(data_int, GEN):
+        print(f"[EIA-923 {year}] {GEN} not found (run 02e first); generation not stored")
+        return gen_year
+
+    with report.step(f"update {GEN}", "write", rows_in=len(gen_year)) as s:
+        gen = read_intermediate(data_int, GEN)
+        gen = pd.concat([gen[gen["year"] != year], gen_year], ignore_index=True)
+        gen = gen.sort_values(s02e.GROUP_COLS, ignore_index=True)
+        write_intermediate(gen, data_int, GEN)
+        s.rows_out = len(gen)
+    return gen_year
+
+
+# ------------------------------------------------------------------
+# County-year panel
+# ------------------------------------------------------------------
+def _fips_5(df: pd.DataFrame) -> pd.DataFrame:
+    df["fips_5"] = df["FIPS_state_county_5digit"].astype(str).str.strip().str.zfill(5)
+    return df
+
+
+def update_panel(year: int, data_int: Path, report: RunReport) -> pd.DataFrame | None:
+    """
+    Replace `year` in the county-year panel with the rows built from its
+    EIA 860 partition; recompute capacity flows and spatial regressors.
+    """
+    parts = partition_parts(data_int, SHALE_860, vintage_partition(year))
+    if not has_intermediate(data_int, CTY) or not parts:
+        print(f"[panel] {CTY} or the {year} EIA 860 partition not found; panel not updated")
+        return None
+
+    with report.step(f"load {CTY}", "load") as s:
+        cty = read_intermediate(data_int, CTY)
+        s.rows_out = len(cty)
+    columns = list(cty.columns)
+
+    with report.step(f"build {year} county-year rows", "aggregate") as s:
+        available = intermediate_columns(data_int, SHALE_860)
+        wanted = ["FIPS_state_county_5digit", "year", "shale_valScoreW_sum",
+                  "shale_valScoreM_max"] + [f"capacity source {k}" for k in FUEL_CODES]
+        df = pd.concat(
+            [pd.read_parquet(p, columns=[c for c in wanted if c in available]) for p in parts],
+            ignore_index=True,
+        )
+        new = s03a.build_county_year(df)
+        if any(c.startswith("gen_") for c in columns) and has_intermediate(data_int, GEN):
+            gen = read_intermediate(data_int, GEN)
+            new = s03a.add_generation(new, gen[gen["year"] == year])
+        if any(c.startswith("shale_play_") for c in columns) and RYSTAD_PATH.exists():
+            new = s03a.add_play_exposure(new, load_exposure(data_int, RYSTAD_PATH))
+        s.add(rows_in=len(df), rows_out=len(new))
+
+    recomputed = [c for c in columns if c.startswith(FLOW_PREFIXES + SPATIAL_PREFIXES)]
+    cty = pd.concat([cty[cty["year"] != year].drop(columns=recomputed), new], ignore_index=True)
+    cty = cty.sort_values(["fips_5", "year"], ignore_index=True)
+
+    if any(c.startswith(FLOW_PREFIXES) for c in columns):
+        with report.step("recompute capacity flows", "aggregate", rows_in=len(cty)):
+            flow_cols = [c for cols in FLOW_FUELS.values() for c in cols]
+            plants = read_intermediate(
+                data_int, SHALE_860,
+                columns=["facilid", "FIPS_state_county_5digit", "year", *flow_cols],
+            )
+            cty = s03a.add_flows(cty, plant_year_panel(_fips_5(plants)))
+    if any(c.startswith(SPATIAL_PREFIXES) for c in columns) and ADJ_PATH.exists():
+        with report.step("recompute spatial regressors", "merge", rows_in=len(cty)):
+            expo = load_exposure(data_int, RYSTAD_PATH) if RYSTAD_PATH.exists() else None
+            cty = s03a.add_spatial(cty, load_adjacency(ADJ_PATH), expo)
+
+    cty = cty[[c for c in columns if c in cty.columns]
+              + [c for c in cty.columns if c not in columns]]
+    with report.step(f"write {CTY}", "write", rows_in=len(cty)):
+        written = write_intermediate(cty, data_int, CTY)
+        written.append(write_panel(cty, data_int, CTY))
+    print(f"[panel] {year}: {len(new)} county-years; saved to:\n  "
+          + "\n  ".join(map(str, written)))
+    return cty
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Append one EIA reporting year to the intermediates and the panel"
+    )
+    parser.add_argument("year", type=int, help="reporting year to add, e.g. 2021")
+    parser.add_argument("--forms", nargs="+", choices=["860", "923"], default=["860", "923"])
+    parser.add_argument("--eia-860", type=Path, default=None,
+                        help="EIA 860 CSV with the year's rows "
+                             "(default: data_raw/EIA_860_<year>.csv, else EIA_860.csv)")
+    parser.add_argument("--eia-923", type=Path, default=None,
+                        help="EIA 923 CSV with the year's rows "
+                             "(default: data_raw/EIA_923_<year>.csv, else EIA_923.csv)")
+    parser.add_argument("--chunksize", type=int, default=500_000,
+                        help="EIA 923 rows read per chunk (default: 500000)")
+    args = parser.parse_args()
+
+    if not has_intermediate(DATA_INT, SHALE_860):
+        raise FileNotFoundError(
+            f"{SHALE_860} not found in {DATA_INT}: run the pipeline up to 02d first "
+            f"(or run_pipeline.py --persist {SHALE_860} ...)"
+        )
+    report = RunReport("append_vintage", OUTPUT)
+
+    with report.step("load locations, FIPS index, known plants", "load") as s:
+        loc_subset = s01.load_locations(LOC_PATH)
+        index = load_fips_index(DATA_INT)
+        plant_fips = load_plant_fips(DATA_INT)
+        known = known_plants(DATA_INT)
+        s.rows_out = len(known)
+
+    # 923 first: the panel rows of the year pick up its generation
+    if "923" in args.forms:
+        print(f"\n[923] append {args.year}")
+        append_923(args.year, args.eia_923 or raw_path("923", args.year), DATA_INT,
+                   loc_subset, index, plant_fips, known, args.chunksize, report)
+    if "860" in args.forms:
+        print(f"\n[860] append {args.year}")
+        append_860(args.year, args.eia_860 or raw_path("860", args.year), DATA_INT,
+                   loc_subset, index, plant_fips, known, report)
+    save_if_dirty(index, DATA_INT)
+
+    update_panel(args.year, DATA_INT, report)
+    report.write()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+benchmark.py
+
+Time and memory-profile each pipeline stage on synthetic inputs
+(synth_data.py) and compare with a stored baseline.
+
+For every scale, the synthetic tree is generated once under --work
+(<work>/scale_<s>/, reused while the generator version and seed match),
+the current code/ is copied next to it, derived intermediates are
+cleared, and the stages run one after another as separate processes:
+
+    01_merge_location -> 02b_add_fips_860 -> 02c_add_fips_923
+    -> 02d_add_shale_to_860 -> 02e_aggregate_gen_923 -> 03a_reg_shale_860
+
+Each stage is measured from the outside: wall time, CPU time and peak
+resident memory (os.wait4 rusage, covering its worker processes), plus
+throughput in input rows per second from the generator's manifest.
+
+Results go to output/benchmark_results.json. With a baseline
+(code/benchmark_baseline.json, written by --save-baseline), any stage
+slower or larger than baseline x (1 + --tolerance) is reported as a
+regression and the exit status is 1 (differences under a second are
+ignored; --repeat N keeps the fastest of N cold runs).
+
+Usage
+-----
+python code/benchmark.py --scales 1
+python code/benchmark.py --scales 1 10 100 --work /scratch/shale_bench
+python code/benchmark.py --scales 1 --save-baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import synth_data
+
+
+CODE_DIR = Path(__file__).resolve().parent
+ROOT = CODE_DIR.parent
+BASELINE_PATH = CODE_DIR / "benchmark_baseline.json"
+RESULTS_PATH = ROOT / "output" / "benchmark_results.json"
+
+# (stage, script, raw inputs whose rows it processes)
+STAGES = [
+    ("01_merge_location", "01_merge_location.py", ["EIA_860", "EIA_923"]),
+    ("02b_add_fips_860", "02b_add_fips_860.py", ["EIA_860"]),
+    ("02c_add_fips_923", "02c_add_fips_923.py", ["EIA_923"]),
+    ("02d_add_shale_to_860", "02d_add_shale_to_860.py", ["EIA_860"]),
+    ("02e_aggregate_gen_923", "02e_aggregate_gen_923.py", ["EIA_923"]),
+    ("03a_reg_shale_860", "03a_reg_shale_860.py", ["EIA_860"]),
+]
+
+# Generated inputs kept between runs; everything else in
+# data_intermediate/ is derived and cleared before a run
+KEEP_INTERMEDIATE = {"fips_state_codes.csv", "fips_county_codes_2007.csv"}
+
+# Differences below this many seconds are never reported (timer noise on
+# short stages)
+MIN_SLACK_SECONDS = 1.0
+
+# ru_maxrss is in KiB on Linux, bytes on macOS
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def prepare(work: Path, scale: float, seed: int) -> tuple[Path, dict]:
+    """Synthetic tree for `scale` (generated if missing) with fresh code/."""
+    root = work / f"scale_{scale:g}"
+    manifest_path = root / "manifest.json"
+
+    manifest = None
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text())
+        if (manifest.get("generator_version") != synth_data.GENERATOR_VERSION
+                or manifest.get("seed") != seed):
+            manifest = None
+    if manifest is None:
+        shutil.rmtree(root, ignore_errors=True)
+        print(f"[bench] generating scale {scale:g} under {root}")
+        # In a child process: a forked stage inherits this process's peak
+        # RSS, so the harness itself has to stay small
+        subprocess.run(
+            [sys.executable, str(CODE_DIR / "synth_data.py"), "--root", str(root),
+             "--scale", str(scale), "--seed", str(seed)],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        manifest = json.loads(manifest_path.read_text())
+
+    # Current code, and a cold start: no derived intermediates or caches
+    shutil.rmtree(root / "code", ignore_errors=True)
+    shutil.copytree(CODE_DIR, root / "code",
+                    ignore=shutil.ignore_patterns("__pycache__", "*.json"))
+    for p in (root / "data_intermediate").iterdir():
+        if p.name not in KEEP_INTERMEDIATE:
+            shutil.rmtree(p) if p.is_dir() else p.unlink()
+    shutil.rmtree(root / "output", ignore_errors=True)
+    (root / "output").mkdir()
+    return root, manifest
+
+
+def run_stage(root: Path, script: str, log_path: Path) -> dict:
+    """Run one stage script; wall / CPU time and peak RSS of its process tree."""
+    start = time.perf_counter()
+    with open(log_path, "w") as log:
+        proc = subprocess.Popen(
+            [sys.executable, str(root / "code" / script)],
+            cwd=root, stdout=log, stderr=subprocess.STDOUT,
+        )
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    return {
+        "seconds": round(time.perf_counter() - start, 3),
+        "cpu_seconds": round(usage.ru_utime + usage.ru_stime, 3),
+        "peak_rss_mb": round(usage.ru_maxrss * _RSS_UNIT / 2**20, 1),
+        "returncode": proc.returncode,
+    }
+
+
+def benchmark(scales: list[float], work: Path, seed: int = 0, repeat: int = 1) -> list[dict]:
+    """Measure every stage at every scale; best of `repeat` cold runs."""
+    runs = []
+    for scale in scales:
+        best = {}
+        for _ in range(repeat):
+            root, manifest = prepare(work, scale, seed)
+            for stage, script, _inputs in STAGES:
+                res = run_stage(root, script, root / "output" / f"{stage}.log")
+                if res["returncode"] != 0 or stage not in best \
+                        or res["seconds"] < best[stage]["seconds"]:
+                    best[stage] = res
+                if res["returncode"] != 0:
+                    break
+
+        for stage, _script, inputs in STAGES:
+            if stage not in best:
+                break
+            res = best[stage]
+            rows_in = sum(manifest["rows"][name] for name in inputs)
+            res.update({
+                "scale": scale,
+                "stage": stage,
+                "rows_in": rows_in,
+                "rows_per_s": round(rows_in / max(res["seconds"], 1e-9)),
+            })
+            runs.append(res)
+            print(f"[bench] x{scale:<5g} {stage:<24} {res['seconds']:>8.2f}s "
+                  f"{res['peak_rss_mb']:>8.0f} MB {res['rows_per_s']:>11,} rows/s")
+            if res["returncode"] != 0:
+                print(f"[bench] {stage} failed; see {root / 'output' / (stage + '.log')}")
+                break
+    return runs
+
+
+def compare(runs: list[dict], baseline: dict, tolerance: float) -> list[str]:
+    """Stages slower / larger than the baseline by more than `tolerance`."""
+    base = {(r["scale"], r["stage"]): r for r in baseline["runs"]}
+    problems = []
+    for r in runs:
+        b = base.get((r["scale"], r["stage"]))
+        if b is None:
+            continue
+        if r["returncode"] != 0:
+            problems.append(f"x{r['scale']:g} {r['stage']}: failed")
+            continue
+        for metric, slack in [("seconds", MIN_SLACK_SECONDS), ("peak_rss_mb", 0.0)]:
+            ratio = r[metric] / max(b[metric], 1e-9)
+            if ratio > 1 + tolerance and r[metric] - b[metric] > slack:
+                problems.append(
+                    f"x{r['scale']:g} {r['stage']}: {metric} {r[metric]} vs "
+                    f"baseline {b[metric]} ({ratio:.2f}x)"
+                )
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline stages on synthetic data")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--work", type=Path, default=ROOT / "data_intermediate" / ".bench",
+                        help="where synthetic trees are generated and run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="cold runs per scale; the fastest is kept")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown / memory growth vs baseline (default 0.25)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store this run as the new baseline")
+    args = parser.parse_args()
+
+    runs = benchmark(args.scales, args.work, args.seed, args.repeat)
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "runs": runs,
+    }
+
+    RESULTS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    RESULTS_PATH.write_text(json.dumps(report, indent=1))
+    print(f"\nSaved benchmark results to: {RESULTS_PATH}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=1))
+        print(f"Saved baseline to: {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print("No baseline to compare against (run with --save-baseline)")
+        return
+
+    problems = compare(runs, json.loads(args.baseline.read_text()), args.tolerance)
+    if problems:
+        print(f"\nRegressions vs baseline (tolerance {args.tolerance:.0%}):")
+        print("\n".join("  " + p for p in problems))
+        sys.exit(1)
+    print(f"\nNo regressions vs baseline (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
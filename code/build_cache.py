@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+build_cache.py
+
+Content-addressed cache for pipeline stage outputs, used by run_pipeline.py.
+
+Each stage gets a key built from
+    - the SHA-256 of every input file (data and the stage's code files),
+    - its parameters (JSON), and
+    - the keys of the stages it depends on,
+so editing the Rystad file only invalidates the shale merge and what comes
+after it, while the EIA-923 location/FIPS stages stay cached.
+
+Outputs live under data_intermediate/.cache/<stage>/<key>/<name>.parquet.
+Entries are evicted least-recently-used first once the cache grows past
+its disk budget. File digests are remembered per (path, size, mtime) in
+.cache/digests.json so unchanged raw files are not rehashed on every run.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+from intermediate_store import read_intermediate, write_intermediate
+
+
+# Bump to invalidate every cached entry (e.g. after changing the layout)
+CACHE_VERSION = 1
+
+
+def _dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+class BuildCache:
+    """
+    cache = BuildCache(data_int / ".cache", budget_bytes=5 * 2**30)
+    key = cache.key("860_fips", inputs=[...], code=[...], params={}, upstream=[k])
+    frames = cache.get("860_fips", key)          # None on a miss
+    cache.put("860_fips", key, {"EIA_860_with_fips": df})
+    """
+
+    def __init__(self, root: Path, budget_bytes: int):
+        self.root = Path(root)
+        self.budget_bytes = budget_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        self._digest_path = self.root / "digests.json"
+        if self._digest_path.exists():
+            self._digests = json.loads(self._digest_path.read_text())
+        else:
+            self._digests = {}
+
+    # ------------------------------------------------------------------
+    # Fingerprints
+    # ------------------------------------------------------------------
+    def file_digest(self, path: Path) -> str:
+        """SHA-256 of a file, memoized on (size, mtime)."""
+        path = Path(path).resolve()
+        st = path.stat()
+        stamp = [st.st_size, st.st_mtime_ns]
+
+        memo = self._digests.get(str(path))
+        if memo and memo["stamp"] == stamp:
+            return memo["sha256"]
+
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+
+        self._digests[str(path)] = {"stamp": stamp, "sha256": digest}
+        self._digest_path.write_text(json.dumps(self._digests, indent=1))
+        return digest
+
+    def key(
+        self,
+        stage: str,
+        inputs=(),
+        code=(),
+        params=None,
+        upstream=(),
+    ) -> str:
+        """Cache key for `stage` given its input files, code, params and upstream keys."""
+        payload = {
+            "version": CACHE_VERSION,
+            "stage": stage,
+            "inputs": {Path(p).name: self.file_digest(p) for p in inputs},
+            "code": {Path(p).name: self.file_digest(p) for p in code},
+            "params": params or {},
+            "upstream": list(upstream),
+        }
+        blob = json.dumps(payload, sort_keys=True, default=str).encode()
+        return hashlib.sha256(blob).hexdigest()[:20]
+
+    # ------------------------------------------------------------------
+    # Entries
+    # ------------------------------------------------------------------
+    def entry_dir(self, stage: str, key: str) -> Path:
+        return self.root / stage / key
+
+    def has(self, stage: str, key: str) -> bool:
+        return (self.entry_dir(stage, key) / ".complete").exists()
+
+    def touch(self, stage: str, key: str):
+        """Mark an entry as recently used (LRU order is by mtime)."""
+        os.utime(self.entry_dir(stage, key))
+
+    def get(self, stage: str, key: str, names=None) -> dict | None:
+        """Cached frames for (stage, key), or None on a miss."""
+        if not self.has(stage, key):
+            return None
+
+        entry = self.entry_dir(stage, key)
+        self.touch(stage, key)
+
+        stored = json.loads((entry / ".complete").read_text())["names"]
+        return {
+            name: read_intermediate(entry, name)
+            for name in stored
+            if names is None or name in names
+        }
+
+    def put(self, stage: str, key: str, frames: dict) -> Path:
+        """Store frames under (stage, key), then enforce the disk budget."""
+        entry = self.begin(stage, key)
+        for name, df in frames.items():
+            write_intermediate(df, entry, name, export=())
+        return self.commit(stage, key, list(frames))
+
+    def begin(self, stage: str, key: str) -> Path:
+        """Start an entry that the caller fills directly (e.g. chunked writes)."""
+        entry = self.entry_dir(stage, key)
+        if entry.exists():
+            shutil.rmtree(entry)
+        entry.mkdir(parents=True)
+        return entry
+
+    def commit(self, stage: str, key: str, names: list) -> Path:
+        """Mark an entry started with `begin` as complete."""
+        entry = self.entry_dir(stage, key)
+        (entry / ".complete").write_text(
+            json.dumps({"names": names, "created": time.time()})
+        )
+        self.evict(keep=entry)
+        return entry
+
+    def copy_out(self, stage: str, key: str, name: str, dest_dir: Path) -> Path:
+        """Copy a cached output (file or chunked directory) into `dest_dir`."""
+        src = self.entry_dir(stage, key) / f"{name}.parquet"
+        if not src.exists():
+            src = src.with_suffix(".csv")
+        dest = Path(dest_dir) / src.name
+
+        if dest.is_dir():
+            shutil.rmtree(dest)
+        elif dest.exists():
+            dest.unlink()
+        if src.is_dir():
+            shutil.copytree(src, dest)
+        else:
+            shutil.copy2(src, dest)
+        return dest
+
+    # ------------------------------------------------------------------
+    # Eviction
+    # ------------------------------------------------------------------
+    def entries(self) -> list[tuple[float, int, Path]]:
+        """(last used, size in bytes, path) for every complete entry."""
+        out = []
+        for marker in self.root.glob("*/*/.complete"):
+            entry = marker.parent
+            out.append((entry.stat().st_mtime, _dir_size(entry), entry))
+        return out
+
+    def evict(self, keep: Path = None):
+        """Drop least-recently-used entries until the cache fits its budget."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, entry in entries:
+            if total <= self.budget_bytes:
+                break
+            if keep is not None and entry == keep:
+                continue
+            shutil.rmtree(entry)
+            total -= size
+            print(f"[cache] evicted {entry.parent.name}/{entry.name} ({size / 2**20:.1f} MB)")
+
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+county_geo.py
+
+Point-in-county FIPS assignment from plant coordinates.
+
+County polygons are read from a local GeoJSON boundary file (e.g. the
+Census cartographic boundary file converted with
+`ogr2ogr -f GeoJSON county_boundaries.geojson cb_2018_us_county_500k.shp`)
+and bucketed into a regular lon/lat grid by bounding box. Each plant only
+tests the counties registered in its grid cell (after a bounding-box
+check), using an even-odd ray-casting test vectorized over the county's
+edges -- pure numpy, no GIS dependency. Holes and multi-part counties are
+handled by the even-odd rule over all rings of a county.
+
+Locations are resolved once per unique Plant_Code and cached in
+data_intermediate/plant_fips_geo.pkl; later runs only locate plants that
+are new or whose coordinates changed, and the cache is rebuilt when the
+boundary file changes.
+
+fips_assign.py uses the result as the authoritative fallback for rows
+whose (State, County) names did not match (FIPS_match == "geo").
+
+Inputs
+------
+data_raw/EIA_power_plant_location.csv
+data_raw/county_boundaries.geojson   (optional; skipped when missing)
+
+Outputs
+-------
+data_intermediate/plant_fips_geo.pkl
+
+Usage
+-----
+python code/county_geo.py      # refresh the plant cache and print coverage
+"""
+
+import hashlib
+import json
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from schemas import read_csv
+
+
+CACHE_VERSION = 2
+
+# Grid cell size in degrees; a county bbox typically spans a few cells
+GRID_CELL = 0.25
+
+# Bound on points x edges per ray-casting block (memory)
+BLOCK_ELEMS = 4_000_000
+
+ROOT = Path(__file__).resolve().parents[1]
+LOC_PATH = ROOT / "data_raw" / "EIA_power_plant_location.csv"
+BOUNDARY_PATH = ROOT / "data_raw" / "county_boundaries.geojson"
+
+
+def _feature_fips(props: dict) -> str:
+    """5-digit county FIPS from common boundary-file property names."""
+    if "GEOID" in props:
+        return str(props["GEOID"]).zfill(5)
+    if "STATEFP" in props and "COUNTYFP" in props:
+        return str(props["STATEFP"]).zfill(2) + str(props["COUNTYFP"]).zfill(3)
+    for name in ["fips", "FIPS", "fips_5"]:
+        if name in props:
+            return str(props[name]).zfill(5)
+    raise KeyError(f"No county FIPS property among {sorted(props)}")
+
+
+def _rings(geometry: dict):
+    if geometry["type"] == "Polygon":
+        yield from geometry["coordinates"]
+    elif geometry["type"] == "MultiPolygon":
+        for polygon in geometry["coordinates"]:
+            yield from polygon
+
+
+class CountyLocator:
+    """Grid-bucketed county polygons with a vectorized point-in-polygon test."""
+
+    def __init__(self, fips: np.ndarray, edges: list, bbox: np.ndarray):
+        self.fips = fips      # county i -> 5-digit FIPS
+        self.edges = edges    # county i -> (m, 4) array of x0, y0, x1, y1
+        self.bbox = bbox      # (n_counties, 4): xmin, ymin, xmax, ymax
+
+        # Grid bucket: (cell key, county) pairs from each county's bbox
+        lo = np.floor(bbox[:, :2] / GRID_CELL).astype(np.int64)
+        hi = np.floor(bbox[:, 2:] / GRID_CELL).astype(np.int64)
+        keys, owners = [], []
+        for i, ((x0, y0), (x1, y1)) in enumerate(zip(lo, hi)):
+            gx, gy = np.meshgrid(np.arange(x0, x1 + 1), np.arange(y0, y1 + 1))
+            keys.append(self._cell_key(gx.ravel(), gy.ravel()))
+            owners.append(np.full(gx.size, i))
+        self.cells = pd.DataFrame({
+            "cell": np.concatenate(keys),
+            "county": np.concatenate(owners),
+        })
+
+    @staticmethod
+    def _cell_key(gx: np.ndarray, gy: np.ndarray) -> np.ndarray:
+        return gx * 100_000 + gy
+
+    @classmethod
+    def from_geojson(cls, path: Path):
+        with open(path) as f:
+            features = json.load(f)["features"]
+
+        fips, edges, bbox = [], [], []
+        for feat in features:
+            if not feat.get("geometry"):
+                continue
+            segs = []
+            for ring in _rings(feat["geometry"]):
+                xy = np.asarray(ring, dtype=float)[:, :2]
+                segs.append(np.hstack([xy, np.roll(xy, -1, axis=0)]))
+            if not segs:
+                continue
+            segs = np.vstack(segs)
+            fips.append(_feature_fips(feat.get("properties") or {}))
+            edges.append(segs)
+            bbox.append([segs[:, 0].min(), segs[:, 1].min(),
+                         segs[:, 0].max(), segs[:, 1].max()])
+
+        return cls(np.array(fips, dtype=object), edges, np.array(bbox))
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _inside(px: np.ndarray, py: np.ndarray, edges: np.ndarray) -> np.ndarray:
+        """Even-odd ray casting of points against one county's edges."""
+        x0, y0, x1, y1 = (edges[:, k] for k in range(4))
+        out = np.zeros(len(px), dtype=bool)
+        step = max(1, BLOCK_ELEMS // max(len(edges), 1))
+        for s in range(0, len(px), step):
+            X = px[s:s + step, None]
+            Y = py[s:s + step, None]
+            spans = (y0 > Y) != (y1 > Y)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                x_cross = x0 + (Y - y0) * (x1 - x0) / (y1 - y0)
+            out[s:s + step] = ((spans & (X < x_cross)).sum(axis=1) % 2) == 1
+        return out
+
+    def locate(self, lon, lat) -> np.ndarray:
+        """5-digit FIPS of the county containing each point (None if none)."""
+        px = np.asarray(lon, dtype=float)
+        py = np.asarray(lat, dtype=float)
+        result = np.full(len(px), None, dtype=object)
+
+        ok = np.flatnonzero(np.isfinite(px) & np.isfinite(py))
+        cell = self._cell_key(
+            np.floor(px[ok] / GRID_CELL).astype(np.int64),
+            np.floor(py[ok] / GRID_CELL).astype(np.int64),
+        )
+        pairs = pd.DataFrame({"point": ok, "cell": cell}).merge(self.cells, on="cell")
+
+        # Bounding-box prefilter before the exact test
+        b = self.bbox[pairs["county"].to_numpy()]
+        x = px[pairs["point"].to_numpy()]
+        y = py[pairs["point"].to_numpy()]
+        pairs = pairs[(x >= b[:, 0]) & (x <= b[:, 2]) & (y >= b[:, 1]) & (y <= b[:, 3])]
+
+        for county, grp in pairs.groupby("county", sort=False):
+            pts = grp["point"].to_numpy()
+            pts = pts[result[pts] == None]  # noqa: E711 (object array)
+            if len(pts) == 0:
+                continue
+            hit = self._inside(px[pts], py[pts], self.edges[county])
+            result[pts[hit]] = self.fips[county]
+
+        return result
+
+
+# ------------------------------------------------------------------
+# Per-plant cache
+# ------------------------------------------------------------------
+def _file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _plant_coords(loc_path: Path) -> pd.DataFrame:
+    """Unique plants with coordinates (Int32 Plant_Code, as in 01)."""
+    loc = read_csv(
+        loc_path, "EIA_power_plant_location",
+        columns=["Plant_Code", "Longitude", "Latitude"],
+    )
+    loc = loc.dropna(subset=["Plant_Code"]).drop_duplicates("Plant_Code")
+    return loc.reset_index(drop=True)
+
+
+def load_plant_fips(
+    data_int: Path,
+    loc_path: Path = LOC_PATH,
+    boundary_path: Path = BOUNDARY_PATH,
+) -> pd.Series | None:
+    """
+    Plant_Code -> 5-digit county FIPS from coordinates (None when the
+    boundary file is not available).
+    """
+    boundary_path = Path(boundary_path)
+    if not boundary_path.exists():
+        print(f"[geo] {boundary_path.name} not found; coordinate fallback disabled")
+        return None
+
+    cache_path = Path(data_int) / "plant_fips_geo.pkl"
+    digest = _file_digest(boundary_path)
+    plants = _plant_coords(loc_path)
+
+    cached = None
+    if cache_path.exists():
+        with open(cache_path, "rb") as f:
+            version, cached_digest, cached = pickle.load(f)
+        if version != CACHE_VERSION or cached_digest != digest:
+            cached = None
+
+    # Reuse cached plants whose coordinates are unchanged
+    if cached is not None:
+        plants = plants.merge(
+            cached[["Plant_Code", "Longitude", "Latitude", "fips_geo"]],
+            on=["Plant_Code", "Longitude", "Latitude"],
+            how="left",
+            indicator=True,
+        )
+        todo = plants.pop("_merge") == "left_only"
+    else:
+        plants["fips_geo"] = None
+        todo = pd.Series(True, index=plants.index)
+
+    if todo.any():
+        locator = CountyLocator.from_geojson(boundary_path)
+        sub = plants.loc[todo]
+        plants.loc[todo, "fips_geo"] = locator.locate(sub["Longitude"], sub["Latitude"])
+        with open(cache_path, "wb") as f:
+            pickle.dump((CACHE_VERSION, digest, plants), f, protocol=pickle.HIGHEST_PROTOCOL)
+        print(f"[geo] located {int(todo.sum())} plants; cache: {cache_path}")
+
+    return plants.set_index("Plant_Code")["fips_geo"].dropna()
+
+
+def main():
+    data_int = ROOT / "data_intermediate"
+    data_int.mkdir(parents=True, exist_ok=True)
+
+    plant_fips = load_plant_fips(data_int)
+    if plant_fips is None:
+        return
+
+    n_plants = len(_plant_coords(LOC_PATH))
+    print(f"[geo] plants inside a county: {len(plant_fips)} of {n_plants} "
+          f"({len(plant_fips) / max(n_plants, 1):.1%})")
+
+
+if __name__ == "__main__":
+    main()
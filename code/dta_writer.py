@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+dta_writer.py
+
+Streaming Stata 118 (.dta) writer for the large intermediates.
+
+DataFrame.to_stata needs the whole frame, and the old export first made a
+stringified copy of it (fillna("").astype(str) over every object and
+categorical column), so numeric IDs were stored as wide str columns and
+the 923 export held several copies of the table. Here
+
+  - each column's Stata type is fixed up front (dta_columns): numerics
+    from their dtype, or from the declared schema in schemas.py for
+    object columns (facilid / utilid -> long, year -> int, month -> byte,
+    capacity / generation -> float); strings as strN of the longest
+    value's UTF-8 width, or strL beyond 2045 bytes,
+  - rows are then encoded block by block into a packed NumPy record
+    array and appended to the file (DtaWriter.write); categoricals are
+    encoded once per block from their categories,
+
+so memory stays at one block whatever the table size. The observation
+count and section offsets are patched into the header on close, and
+strL contents are spooled to a temporary file and appended after the
+data section.
+
+Column names are made valid Stata names the way to_stata does it
+("capacity source 1" -> capacity_source_1); the original name becomes
+the variable label.
+
+Usage
+-----
+from dta_writer import export_dta, export_dta_blocks
+
+export_dta(df, data_int / "EIA_860_with_fips_shale.dta")
+export_dta_blocks(lambda: iter_intermediate(data_int, "EIA_923_with_fips"),
+                  data_int / "EIA_923_with_fips.dta")
+"""
+
+import re
+import struct
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from schemas import dtype_for
+
+
+# Rows encoded per write
+BLOCK_ROWS = 250_000
+
+# Longest strN; longer strings are stored as strL
+STR_MAX = 2045
+
+# Stata type codes (118) and their on-disk NumPy layout
+TYPE_CODES = {"byte": 65530, "int": 65529, "long": 65528, "float": 65527,
+              "double": 65526, "strL": 32768}
+NP_TYPES = {"byte": "i1", "int": "<i2", "long": "<i4", "float": "<f4",
+            "double": "<f8", "strL": "<u8"}
+
+# Valid range and the system missing value "." of the integer types
+INT_RANGE = {"byte": (-127, 100), "int": (-32767, 32740),
+             "long": (-2147483647, 2147483620)}
+INT_MISSING = {"byte": 101, "int": 32741, "long": 2147483621}
+FLOAT_MISSING = {"float": np.float32(2.0 ** 127), "double": 2.0 ** 1023}
+
+FORMATS = {"byte": "%8.0g", "int": "%8.0g", "long": "%12.0g",
+           "float": "%9.0g", "double": "%10.0g", "strL": "%9s"}
+
+# Declared (schemas.py) or pandas dtype -> Stata type
+NUMERIC_TYPES = {
+    "int8": "byte", "Int8": "byte", "bool": "byte", "boolean": "byte",
+    "int16": "int", "Int16": "int", "uint8": "int",
+    "int32": "long", "Int32": "long", "uint16": "long",
+    "float32": "float", "Float32": "float",
+}
+
+_MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+           "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+# ------------------------------------------------------------------
+# Column types
+# ------------------------------------------------------------------
+def _is_text(dtype) -> bool:
+    return dtype == object or pd.api.types.is_string_dtype(dtype)
+
+
+def _numeric_type(dtype) -> str | None:
+    """Stata type of a numeric dtype name (None: not numeric)."""
+    name = str(dtype)
+    if name in NUMERIC_TYPES:
+        return NUMERIC_TYPES[name]
+    if pd.api.types.is_numeric_dtype(pd.api.types.pandas_dtype(dtype)):
+        # int64 / uint32+ / float64: exact in double up to 2**53
+        return "double"
+    return None
+
+
+def _str_width(values) -> int:
+    """Longest UTF-8 width among `values` (missing counts as empty)."""
+    widths = [len(str(v).encode("utf-8")) for v in values if not _missing(v)]
+    return max(widths, default=0)
+
+
+def _missing(v) -> bool:
+    return v is None or v is pd.NA or (isinstance(v, float) and np.isnan(v))
+
+
+def _block_types(block: pd.DataFrame) -> dict:
+    """{column: Stata type or string width} for one block."""
+    out = {}
+    for c in block.columns:
+        s = block[c]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            # Width of the categories in use only
+            used = s.cat.categories[np.unique(s.cat.codes[s.cat.codes >= 0])]
+            out[c] = _str_width(used)
+        elif _is_text(s.dtype):
+            declared = dtype_for(c)
+            stata = _numeric_type(declared) if declared not in (None, "str", "category") else None
+            out[c] = stata if stata is not None else _str_width(s.to_numpy(dtype=object))
+        else:
+            stata = _numeric_type(s.dtype)
+            if stata is None:
+                raise TypeError(f"Column '{c}' ({s.dtype}) has no Stata type")
+            out[c] = stata
+    return out
+
+
+def dta_columns(blocks) -> dict:
+    """
+    {column: Stata type} ("byte" ... "double", "str<N>", "strL") over all
+    `blocks` (one pass; only string widths need more than the dtypes).
+    """
+    types = None
+    for block in blocks:
+        bt = _block_types(block)
+        if types is None:
+            types = bt
+            continue
+        for c, t in bt.items():
+            if isinstance(t, int) and isinstance(types[c], int):
+                types[c] = max(types[c], t)
+            elif t != types[c]:
+                types[c] = "double"   # e.g. float32 in one part, float64 in another
+    if types is None:
+        raise ValueError("No data to export")
+
+    return {c: (t if isinstance(t, str)
+                else "strL" if t > STR_MAX else f"str{max(t, 1)}")
+            for c, t in types.items()}
+
+
+def stata_names(columns) -> list[str]:
+    """Valid, unique Stata names (as DataFrame.to_stata renames them)."""
+    out = []
+    for c in columns:
+        name = re.sub(r"[^A-Za-z0-9_]", "_", str(c))
+        if not name or name[0].isdigit():
+            name = "_" + name
+        base = name = name[:32]
+        i = 0
+        while name in out:
+            name = f"_{i}{base}"[:32]
+            i += 1
+        out.append(name)
+    return out
+
+
+def _fixed(text: str, size: int) -> bytes:
+    """`text` as a null-padded field of `size` bytes (cut at a character)."""
+    raw = text.encode("utf-8")
+    while len(raw) >= size:
+        text = text[:-1]
+        raw = text.encode("utf-8")
+    return raw.ljust(size, b"\0")
+
+
+# ------------------------------------------------------------------
+# Writer
+# ------------------------------------------------------------------
+class DtaWriter:
+    """
+    Append DataFrame blocks to a Stata 118 file with the column types
+    fixed at construction (see dta_columns).
+
+        with DtaWriter(path, dta_columns(blocks())) as w:
+            for block in blocks():
+                w.write(block)
+    """
+
+    def __init__(self, path: Path, columns: dict, label: str = ""):
+        self.path = Path(path)
+        self.columns = list(columns)
+        self.types = [columns[c] for c in self.columns]
+        self.names = stata_names(self.columns)
+        self.label = label
+        self.n_obs = 0
+        self.strl_cols = [i for i, t in enumerate(self.types) if t == "strL"]
+        self.record = np.dtype({
+            "names": [f"v{i}" for i in range(len(self.types))],
+            "formats": [f"S{t[3:]}" if t.startswith("str") and t != "strL"
+                        else NP_TYPES[t] for t in self.types],
+        })
+
+    def __enter__(self):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        self._tmp = tmp
+        self._f = open(tmp, "wb")
+        self._strls = tempfile.TemporaryFile() if self.strl_cols else None
+        self._offsets = {"stata_data": 0}
+        self._write_header()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self._f.close()
+            self._tmp.unlink(missing_ok=True)
+        return False
+
+    # ---- header -----------------------------------------------------
+    def _tag(self, name: str):
+        self._offsets[name] = self._f.tell()
+        self._f.write(f"<{name}>".encode())
+
+    def _write_header(self):
+        f = self._f
+        f.write(b"<stata_dta><header><release>118</release>"
+                b"<byteorder>LSF</byteorder>")
+        f.write(b"<K>" + struct.pack("<H", len(self.types)) + b"</K>")
+        self._n_pos = f.tell() + 3
+        f.write(b"<N>" + struct.pack("<Q", 0) + b"</N>")
+        label = self.label.encode("utf-8")[:80]
+        f.write(b"<label>" + struct.pack("<H", len(label)) + label + b"</label>")
+        t = time.localtime()
+        stamp = f"{t.tm_mday:02d} {_MONTHS[t.tm_mon - 1]} {t.tm_year} {t.tm_hour:02d}:{t.tm_min:02d}"
+        f.write(b"<timestamp>" + struct.pack("<B", len(stamp)) + stamp.encode()
+                + b"</timestamp></header>")
+
+        self._tag("map")
+        self._map_pos = f.tell()
+        f.write(b"\0" * 8 * 14 + b"</map>")
+
+        self._tag("variable_types")
+        for t in self.types:
+            code = TYPE_CODES[t] if t in TYPE_CODES else int(t[3:])
+            f.write(struct.pack("<H", code))
+        f.write(b"</variable_types>")
+
+        self._tag("varnames")
+        f.write(b"".join(_fixed(n, 129) for n in self.names) + b"</varnames>")
+
+        self._tag("sortlist")
+        f.write(b"\0\0" * (len(self.types) + 1) + b"</sortlist>")
+
+        self._tag("formats")
+        for t in self.types:
+            fmt = FORMATS.get(t) or f"%{max(int(t[3:]), 9)}s"
+            f.write(_fixed(fmt, 57))
+        f.write(b"</formats>")
+
+        self._tag("value_label_names")
+        f.write(b"\0" * 129 * len(self.types) + b"</value_label_names>")
+
+        self._tag("variable_labels")
+        for c, n in zip(self.columns, self.names):
+            f.write(_fixed(str(c) if str(c) != n else "", 321))
+        f.write(b"</variable_labels>")
+
+        self._tag("characteristics")
+        f.write(b"</characteristics>")
+        self._tag("data")
+
+    # ---- data -------------------------------------------------------
+    def write(self, block: pd.DataFrame):
+        """Encode and append one block (columns as given at construction)."""
+        rec = np.empty(len(block), dtype=self.record)
+        for i, (c, t) in enumerate(zip(self.columns, self.types)):
+            rec[f"v{i}"] = self._encode(block[c], c, t, i)
+        self._f.write(rec.tobytes())
+        self.n_obs += len(block)
+
+    def _encode(self, s: pd.Series, column: str, stata: str, i: int) -> np.ndarray:
+        if stata == "strL":
+            return self._strl(s, i)
+        if stata.startswith("str"):
+            return _encode_str(s, f"S{stata[3:]}")
+
+        if _is_text(s.dtype):
+            # Declared numeric, read as text: coerce like schemas.coerce
+            s = pd.to_numeric(s.astype(str).str.replace(",", ""), errors="coerce")
+        values = s.to_numpy(dtype="float64", na_value=np.nan)
+        missing = np.isnan(values)
+
+        if stata in FLOAT_MISSING:
+            out = values.astype(NP_TYPES[stata])
+            out[missing] = FLOAT_MISSING[stata]
+            return out
+
+        lo, hi = INT_RANGE[stata]
+        present = values[~missing]
+        if present.size and (present.min() < lo or present.max() > hi):
+            raise ValueError(
+                f"Column '{column}' has values outside the Stata {stata} range "
+                f"[{lo}, {hi}]; declare a wider type in schemas.py"
+            )
+        out = np.where(missing, INT_MISSING[stata], values)
+        return out.astype(NP_TYPES[stata])
+
+    def _strl(self, s: pd.Series, i: int) -> np.ndarray:
+        """(v, o) references into the strls section, contents spooled."""
+        v = i + 1
+        refs = np.zeros(len(s), dtype="<u8")
+        for j, val in enumerate(s.to_numpy(dtype=object)):
+            if _missing(val) or val == "":
+                continue                      # (0, 0): empty string
+            o = self.n_obs + j + 1
+            raw = str(val).encode("utf-8") + b"\0"
+            self._strls.write(b"GSO" + struct.pack("<IQBI", v, o, 130, len(raw)) + raw)
+            refs[j] = v | (o << 16)
+        return refs
+
+    # ---- trailer ----------------------------------------------------
+    def close(self):
+        f = self._f
+        f.write(b"</data>")
+        self._tag("strls")
+        if self._strls is not None:
+            self._strls.seek(0)
+            while chunk := self._strls.read(16 << 20):
+                f.write(chunk)
+            self._strls.close()
+        f.write(b"</strls>")
+        self._tag("value_labels")
+        f.write(b"</value_labels>")
+        self._offsets["/stata_data"] = f.tell()
+        f.write(b"</stata_dta>")
+        self._offsets["end"] = f.tell()
+
+        order = ["stata_data", "map", "variable_types", "varnames", "sortlist",
+                 "formats", "value_label_names", "variable_labels",
+                 "characteristics", "data", "strls", "value_labels",
+                 "/stata_data", "end"]
+        f.seek(self._n_pos)
+        f.write(struct.pack("<Q", self.n_obs))
+        f.seek(self._map_pos)
+        f.write(struct.pack("<14Q", *(self._offsets[k] for k in order)))
+        f.close()
+        self._tmp.replace(self.path)
+
+
+def _encode_str(s: pd.Series, np_type: str) -> np.ndarray:
+    """Fixed-width bytes of a string or categorical column (missing -> "")."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        cats = np.array([str(c).encode("utf-8") for c in s.cat.categories] or [b""],
+                        dtype=np_type)
+        codes = s.cat.codes.to_numpy()
+        out = np.zeros(len(s), dtype=np_type)
+        present = codes >= 0
+        out[present] = cats[codes[present]]
+        return out
+    return np.array(
+        [b"" if _missing(v) else str(v).encode("utf-8") for v in s.to_numpy(dtype=object)],
+        dtype=np_type,
+    )
+
+
+# ------------------------------------------------------------------
+# Exports
+# ------------------------------------------------------------------
+def _slices(df: pd.DataFrame, rows: int = BLOCK_ROWS):
+    # An empty frame still gives one (empty) block for its column types
+    for start in range(0, max(len(df), 1), rows):
+        yield df.iloc[start:start + rows]
+
+
+def export_dta_blocks(make_blocks, path: Path, label: str = "") -> Path:
+    """
+    Write the blocks yielded by `make_blocks()` as one .dta file: one
+    pass for the column types, one to write (so make_blocks is called
+    twice, e.g. to re-read Parquet parts).
+    """
+    columns = dta_columns(make_blocks())
+    with DtaWriter(path, columns, label=label) as w:
+        for block in make_blocks():
+            for piece in _slices(block):
+                w.write(piece)
+    return Path(path)
+
+
+def export_dta(df: pd.DataFrame, path: Path, label: str = "") -> Path:
+    """Write `df` as a Stata 118 file, BLOCK_ROWS rows at a time."""
+    return export_dta_blocks(lambda: _slices(df), path, label)
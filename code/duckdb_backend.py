@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+duckdb_backend.py
+
+Optional DuckDB backend for the plant -> location -> FIPS -> shale ->
+county-year chain (run_pipeline.py --backend duckdb).
+
+The raw EIA CSVs are scanned by DuckDB, and the location, FIPS and shale
+joins and the county-year aggregation are one SQL query per form. DuckDB
+plans it lazily (only the needed columns are parsed, filters are pushed
+into the scan), runs it on all cores and spills its hash tables to
+`temp_dir` once `memory_limit` is reached, so the EIA-923 chain runs in
+bounded memory whatever the file size: no plant-level table is ever held
+in Python.
+
+Name matching stays in Python. A plant's FIPS depends only on its
+location row (State, County, Plant_Code), so fips_assign.assign_fips
+resolves the location file once (the same index, alias / fuzzy tiers
+and coordinate fallback as the pandas path) and the query joins the
+result on Plant_Code. Rystad is collapsed by 02d's county_shale. Outputs
+match the pandas path's (capacity and generation sums up to summation
+order).
+
+Plant-level intermediates (EIA_*_with_loc / _with_fips /
+_with_fips_shale) are written straight from the query with COPY, as one
+Parquet file each; SHALE_EXPORT copies are not produced for them.
+
+DuckDB is optional: HAVE_DUCKDB is False when it is not installed
+(pip install duckdb), and the pandas path is the default.
+
+Usage
+-----
+from duckdb_backend import HAVE_DUCKDB, SqlChain, location_fips, unmatched_fips
+
+chain = SqlChain(location_fips(loc_subset, index, plant_fips), county_shale(rystad),
+                 unmatched_fips(index), temp_dir=data_int / ".duckdb_tmp")
+cty = add_shale_regressors(chain.county_year_860(data_raw / "EIA_860.csv"))
+plants = plant_year_panel(chain.plant_years_860(data_raw / "EIA_860.csv"))
+gen = chain.county_year_gen(data_raw / "EIA_923.csv")
+chain.copy_plant_level(data_raw / "EIA_923.csv", "EIA_923", "fips",
+                       data_int / "EIA_923_with_fips.parquet")
+"""
+
+import importlib.util
+import os
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+from fips_assign import FIPS_COLS, assign_fips
+from fips_index import FipsIndex
+from schemas import FUEL_CODES, resolve
+
+
+HAVE_DUCKDB = importlib.util.find_spec("duckdb") is not None
+
+# Working memory before DuckDB spills to disk (a laptop-sized default)
+MEMORY_LIMIT = "4GB"
+
+SQL_TYPES = {
+    "Int32": "INTEGER", "Int16": "SMALLINT", "Int8": "TINYINT",
+    "float32": "FLOAT", "float64": "DOUBLE",
+}
+
+# Columns assign_fips adds, in its order
+FIPS_OUT = ["state_clean", "county_clean", *FIPS_COLS.values(), "FIPS_match"]
+SHALE_OUT = ["fips_5", "shale_valScoreW_sum", "shale_valScoreM_max"]
+
+# Plant-level levels of the chain -> the columns they add to the EIA rows
+LEVELS = ["loc", "fips", "shale"]
+
+
+def connect(threads: int = None, memory_limit: str = MEMORY_LIMIT,
+            temp_dir: Path = None):
+    """In-memory DuckDB connection with bounded memory and spill-to-disk."""
+    import duckdb
+
+    con = duckdb.connect()
+    con.execute(f"SET threads = {int(threads or os.cpu_count() or 1)}")
+    con.execute(f"SET memory_limit = '{memory_limit}'")
+    # Row order of the aggregates is set by ORDER BY; not keeping scan
+    # order lets COPY and the joins stream with less memory
+    con.execute("SET preserve_insertion_order = false")
+    if temp_dir is not None:
+        Path(temp_dir).mkdir(parents=True, exist_ok=True)
+        con.execute(f"SET temp_directory = {_literal(temp_dir)}")
+    return con
+
+
+def _literal(value) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+# ------------------------------------------------------------------
+# Lookup tables (small, built in Python)
+# ------------------------------------------------------------------
+def location_fips(loc_subset: pd.DataFrame, index: FipsIndex,
+                  plant_fips: pd.Series = None) -> pd.DataFrame:
+    """
+    Location file with FIPS assigned (assign_fips) and the 5-digit fips_5
+    key the shale merge uses; one row per location row.
+    """
+    loc, _ = assign_fips(loc_subset.copy(), index, plant_fips)
+    loc["fips_5"] = (
+        loc["FIPS_state_county_5digit"].astype(str).str.strip().str.zfill(5)
+    )
+    return loc
+
+
+def unmatched_fips(index: FipsIndex) -> dict:
+    """FIPS columns assign_fips gives a row without a location (no State / County)."""
+    empty = pd.DataFrame({"State": [None], "County": [None], "Plant_Code": [pd.NA]})
+    row, _ = assign_fips(empty, index)
+    return {c: row[c].iloc[0] for c in FIPS_OUT if pd.notna(row[c].iloc[0])}
+
+
+# ------------------------------------------------------------------
+# Query
+# ------------------------------------------------------------------
+def scan_sql(path: Path, name: str, lenient: bool = False) -> tuple[str, list]:
+    """
+    SELECT over raw CSV `path` with the declared columns and types of
+    `name` (see schemas.py). The typed scan fails on a value that does not
+    parse; the `lenient` one reads text and casts it the way
+    schemas.coerce does (thousands separators dropped, unparseable numbers
+    missing). Returns (sql, columns).
+    """
+    usecols, dtype = resolve(name, list(pd.read_csv(path, nrows=0).columns))
+    types = {c: SQL_TYPES[t] for c, t in dtype.items() if t in SQL_TYPES}
+    if not lenient:
+        spec = ", ".join(f"{_literal(c)}: {_literal(t)}" for c, t in types.items())
+        sql = (f"SELECT {', '.join(map(_ident, usecols))} "
+               f"FROM read_csv({_literal(path)}, header = true, types = {{{spec}}})")
+        return sql, usecols
+
+    exprs = []
+    for c in usecols:
+        col = _ident(c)
+        exprs.append(f"TRY_CAST(replace({col}, ',', '') AS {types[c]}) AS {col}"
+                     if c in types else col)
+    sql = (f"SELECT {', '.join(exprs)} "
+           f"FROM read_csv({_literal(path)}, header = true, all_varchar = true)")
+    return sql, usecols
+
+
+class SqlChain:
+    """
+    DuckDB connection with the location / FIPS table (location_fips) and
+    the county shale table (02d's county_shale) registered, building the
+    chain's queries over raw EIA files.
+
+        chain = SqlChain(loc_fips, shale_by_county, unmatched_fips(index))
+        cty = chain.county_year_860(data_raw / "EIA_860.csv")
+    """
+
+    def __init__(self, loc_fips: pd.DataFrame, shale_by_county: pd.DataFrame = None,
+                 unmatched: dict = None, threads: int = None,
+                 memory_limit: str = MEMORY_LIMIT, temp_dir: Path = None):
+        self.con = connect(threads, memory_limit, temp_dir)
+        self.unmatched = unmatched or {}
+
+        # Categories as plain strings: DuckDB joins them as VARCHAR
+        loc = loc_fips.copy()
+        for c in loc.columns:
+            if isinstance(loc[c].dtype, pd.CategoricalDtype):
+                loc[c] = loc[c].astype("str")
+        self.loc_columns = [c for c in loc.columns if c not in FIPS_OUT + ["fips_5"]]
+        self.con.register("loc_fips", loc)
+
+        if shale_by_county is None:
+            shale_by_county = pd.DataFrame({
+                "fips": pd.Series(dtype="str"),
+                "shale_valScoreW_sum": pd.Series(dtype="float64"),
+                "shale_valScoreM_max": pd.Series(dtype="float64"),
+            })
+        self.con.register("shale_by_county", shale_by_county)
+
+    def _execute(self, make_sql):
+        """
+        Run make_sql(lenient) over the typed scan; when a value does not
+        parse, rerun it over the lenient one (as schemas.read_csv falls
+        back from pyarrow).
+        """
+        import duckdb
+
+        try:
+            return self.con.execute(make_sql(False))
+        except (duckdb.ConversionException, duckdb.InvalidInputException):
+            return self.con.execute(make_sql(True))
+
+    def plant_sql(self, path: Path, name: str, level: str = "shale",
+                  lenient: bool = False) -> tuple[str, list]:
+        """
+        Plant-level rows of raw form `path` with location ("loc"), plus
+        FIPS ("fips"), plus fips_5 and county shale scores ("shale"): the
+        columns and values of EIA_*_with_loc / _with_fips /
+        _with_fips_shale. Returns (sql, columns).
+        """
+        scan, eia_cols = scan_sql(path, name, lenient)
+        levels = LEVELS[: LEVELS.index(level) + 1]
+
+        select = [f"e.{_ident(c)}" for c in eia_cols]
+        select += [f"p.{_ident(c)}" for c in self.loc_columns]
+        columns = eia_cols + self.loc_columns
+        if "fips" in levels:
+            # Rows without a location resolve like an empty (State, County) pair
+            for c in FIPS_OUT:
+                expr = f"p.{_ident(c)}"
+                if c in self.unmatched:
+                    expr = f"COALESCE({expr}, {_literal(self.unmatched[c])})"
+                select.append(f"{expr} AS {_ident(c)}")
+            columns += FIPS_OUT
+        if "shale" in levels:
+            select += [
+                "p.fips_5",
+                "COALESCE(p.shale_valScoreW_sum, 0.0) AS shale_valScoreW_sum",
+                "COALESCE(p.shale_valScoreM_max, 0.0) AS shale_valScoreM_max",
+            ]
+            columns += SHALE_OUT
+
+        # Shale is per county, so it is joined onto the (small) location
+        # table before the plant rows; the result is the same as after
+        plants = (
+            "SELECT l.*, s.shale_valScoreW_sum, s.shale_valScoreM_max "
+            "FROM loc_fips l LEFT JOIN shale_by_county s ON l.fips_5 = s.fips"
+        )
+        sql = (f"WITH e AS ({scan}), p AS ({plants}) "
+               f"SELECT {', '.join(select)} FROM e LEFT JOIN p ON e.facilid = p.Plant_Code")
+        return sql, columns
+
+    def county_year_860(self, path: Path) -> pd.DataFrame:
+        """
+        Raw EIA 860 -> county-year capacities by fuel (cap_<fuel>) and
+        county shale scores, as 03a's build_county_year aggregates them
+        (its add_shale_regressors completes the panel).
+        """
+        _, columns = self.plant_sql(path, "EIA_860", "shale")
+        fuels = _fuel_columns(columns, "capacity")
+        for fuel in ["coal", "ng", "wind", "solar"]:
+            if fuel not in fuels.values():
+                raise KeyError(f"Expected capacity column for '{fuel}' not found in {path}")
+
+        # Sums stay float32 like the pandas groupby; rows without FIPS or
+        # year drop out, as NaN group keys do there
+        sums = [f"COALESCE(SUM({_ident(c)}), 0)::FLOAT AS cap_{v}" for c, v in fuels.items()]
+
+        def make_sql(lenient):
+            plants, _ = self.plant_sql(path, "EIA_860", "shale", lenient)
+            return (
+                f"WITH plants AS ({plants}) "
+                f"SELECT fips_5, year, {', '.join(sums)}, "
+                "MAX(shale_valScoreW_sum) AS shale_valScoreW_sum, "
+                "MAX(shale_valScoreM_max) AS shale_valScoreM_max "
+                "FROM plants WHERE fips_5 IS NOT NULL AND year IS NOT NULL "
+                "GROUP BY fips_5, year ORDER BY fips_5, year"
+            )
+
+        return _typed(self._execute(make_sql).df())
+
+    def plant_years_860(self, path: Path) -> pd.DataFrame:
+        """
+        Plant-level EIA 860 rows (facilid, year, fips_5, capacity by
+        source) for plant_panel.plant_year_panel, over the rows the
+        county-year panel keeps.
+        """
+        _, columns = self.plant_sql(path, "EIA_860", "shale")
+        caps = [c for c in columns if c.startswith("capacity source ")]
+
+        def make_sql(lenient):
+            plants, _ = self.plant_sql(path, "EIA_860", "shale", lenient)
+            return (
+                f"WITH plants AS ({plants}) "
+                f"SELECT facilid, year, fips_5, {', '.join(map(_ident, caps))} "
+                "FROM plants WHERE fips_5 IS NOT NULL AND year IS NOT NULL"
+            )
+
+        return _typed(self._execute(make_sql).df(), year="Int16")
+
+    def county_year_gen(self, path: Path) -> pd.DataFrame:
+        """Raw EIA 923 -> county-year generation by fuel (02e's output)."""
+        _, columns = self.plant_sql(path, "EIA_923", "shale")
+        fuels = _fuel_columns(columns, "generation")
+
+        # float32 values summed in float64, as GenerationAggregator does
+        sums = [f"COALESCE(SUM({_ident(c)}::DOUBLE), 0) AS gen_{v}" for c, v in fuels.items()]
+
+        def make_sql(lenient):
+            plants, _ = self.plant_sql(path, "EIA_923", "shale", lenient)
+            return (
+                f"WITH plants AS ({plants}) "
+                f"SELECT fips_5, year, {', '.join(sums)} "
+                "FROM plants WHERE fips_5 IS NOT NULL AND year IS NOT NULL "
+                "GROUP BY fips_5, year ORDER BY fips_5, year"
+            )
+
+        gen = _typed(self._execute(make_sql).df())
+        if "gen_wind" in gen.columns and "gen_solar" in gen.columns:
+            gen["gen_re"] = gen["gen_wind"] + gen["gen_solar"]
+        return gen
+
+    def copy_plant_level(self, path: Path, name: str, level: str, out: Path) -> int:
+        """Write the plant-level rows of `level` to Parquet file `out`; returns rows."""
+        out = Path(out)
+        if out.is_dir():
+            shutil.rmtree(out)
+        tmp = out.with_name(out.name + ".tmp")
+
+        def make_sql(lenient):
+            sql, _ = self.plant_sql(path, name, level, lenient)
+            return f"COPY ({sql}) TO {_literal(tmp)} (FORMAT parquet)"
+
+        self._execute(make_sql)
+        tmp.replace(out)
+        return self.con.execute(
+            f"SELECT COUNT(*) FROM read_parquet({_literal(out)})"
+        ).fetchone()[0]
+
+
+def _fuel_columns(columns: list, prefix: str) -> dict:
+    return {f"{prefix} source {k}": v for k, v in FUEL_CODES.items()
+            if f"{prefix} source {k}" in columns}
+
+
+def _typed(df: pd.DataFrame, year: str = "int64") -> pd.DataFrame:
+    """
+    Key dtypes as the pandas path has them: str fips_5, int64 year on
+    county-year tables (nullable Int16 on plant rows).
+    """
+    df["fips_5"] = df["fips_5"].astype("str")
+    df["year"] = df["year"].astype(year)
+    return df
+
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+fips_assign.py
+
+Shared FIPS-assignment engine for the EIA forms (replaces the duplicated
+logic in 02b_add_fips_860.py and 02c_add_fips_923.py, which now call it).
+
+The state/county lookup index (fips_index.py) is loaded once. By default
+every form is resolved in this process, chunk by chunk: a lookup per
+unique (State, County) pair is cheap, and shipping 500k-row chunks to a
+worker and back costs more than it (about 1.4x slower on one core). With
+--workers N the forms run side by side in a process pool; an EIA-923
+input stored as Parquet parts is then split by part, each worker reading
+its part and writing the matching output part itself, so only match
+counts travel between processes. Names are matched
+once per unique (State, County) pair, with alias and fuzzy fallbacks; the
+diagnostics report how many rows each tier matched and the most frequent
+pairs left unmatched. Rows whose names still do not match are placed by
+plant coordinates when a county boundary file is available (county_geo.py).
+
+Inputs
+------
+data_intermediate/EIA_860_with_loc.parquet (or .csv)
+data_intermediate/EIA_923_with_loc.parquet (or .csv)
+data_intermediate/fips_state_codes.csv
+data_intermediate/fips_county_codes_2007.csv
+data_raw/county_boundaries.geojson             (optional, see county_geo.py)
+
+Outputs
+-------
+data_intermediate/EIA_860_with_fips.parquet
+data_intermediate/EIA_923_with_fips.parquet   (one part per input chunk)
+data_intermediate/fips_index.pkl               (lookup index, rebuilt when stale)
+
+Usage
+-----
+python code/fips_assign.py                    # both forms, in-process
+python code/fips_assign.py --forms 923 --workers 8
+"""
+
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from county_geo import load_plant_fips
+from fips_index import FipsIndex, load_fips_index, save_if_dirty
+from intermediate_store import (
+    ChunkedWriter,
+    iter_intermediate,
+    partition_parts,
+    read_intermediate,
+    to_compact,
+    write_intermediate,
+)
+from run_report import RunReport
+
+
+# form -> (input intermediate, output intermediate, read in chunks?)
+FORMS = {
+    "860": ("EIA_860_with_loc", "EIA_860_with_fips", False),
+    "923": ("EIA_923_with_loc", "EIA_923_with_fips", True),
+}
+
+FIPS_COLS = {
+    "fips_state_code": "FIPS_state",
+    "fips_county_2007": "FIPS_county",
+    "fips_state_county_2007": "FIPS_state_county_5digit",
+}
+
+
+def assign_fips(
+    eia: pd.DataFrame,
+    index: FipsIndex,
+    plant_fips: pd.Series = None,
+) -> tuple[pd.DataFrame, pd.Series]:
+    """
+    Attach FIPS_state / FIPS_county / FIPS_state_county_5digit (plus the
+    cleaned names and FIPS_match tier) to `eia` by state and county name.
+
+    Rows whose names do not match fall back to `plant_fips` (Plant_Code ->
+    5-digit FIPS from coordinates, see county_geo.py) when given.
+
+    Returns the frame and the row counts per match tier.
+    """
+    resolved = index.resolve(eia["State"], eia["County"])
+
+    eia = eia.reset_index(drop=True)
+    eia["state_clean"] = resolved["state_clean"]
+    eia["county_clean"] = resolved["county_clean"]
+    for src, dst in FIPS_COLS.items():
+        eia[dst] = resolved[src]
+    eia["FIPS_match"] = resolved["fips_match"]
+
+    if plant_fips is not None and "Plant_Code" in eia.columns:
+        miss = eia["FIPS_match"] == "none"
+        geo = eia.loc[miss, "Plant_Code"].map(plant_fips).dropna()
+        eia.loc[geo.index, "FIPS_state_county_5digit"] = geo
+        eia.loc[geo.index, "FIPS_state"] = geo.str[:2]
+        eia.loc[geo.index, "FIPS_county"] = geo.str[2:]
+        eia.loc[geo.index, "FIPS_match"] = "geo"
+
+    return eia, eia["FIPS_match"].value_counts()
+
+
+def report_matches(label: str, counts: pd.Series, eia: pd.DataFrame = None):
+    """Print match rate by tier (and the top unmatched pairs, if given rows)."""
+    total = int(counts.sum())
+    matched = total - int(counts.get("none", 0))
+    print(f"{label}Matched rows: {matched} of {total} ({matched / max(total, 1):.1%})")
+    for tier in ["exact", "alias", "fuzzy", "geo", "none"]:
+        print(f"{label}  {tier:>5}: {int(counts.get(tier, 0))}")
+
+    if eia is not None and counts.get("none", 0):
+        unmatched = (
+            eia.loc[eia["FIPS_match"] == "none", ["State", "County"]]
+            .value_counts(dropna=False)
+            .head(10)
+        )
+        print(f"{label}Most frequent unmatched (State, County):")
+        print(unmatched.to_string())
+
+
+def process_pool(workers: int, initializer=None, initargs=()) -> ProcessPoolExecutor:
+    """
+    Process pool whose workers are spawned, not forked: they read and
+    write Parquet, and a child forked while the parent's Arrow thread pool
+    is busy can deadlock.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+        initializer=initializer, initargs=initargs,
+    )
+
+
+def imap_ordered(pool, func, items, max_pending: int):
+    """
+    Like pool.map, but keeps at most `max_pending` tasks in flight so a
+    chunked input is never fully materialized. Yields results in order.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(func, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class _AssignTask:
+    """
+    Picklable callable carrying the index (and the plant -> FIPS fallback)
+    to the workers. Fuzzy matches resolved in a worker are sent back so the
+    parent can persist them.
+    """
+
+    def __init__(self, index: FipsIndex, plant_fips: pd.Series = None):
+        self.index = index
+        self.plant_fips = plant_fips
+
+    def __call__(self, eia: pd.DataFrame):
+        known = set(self.index.fuzzy)
+        merged, counts = assign_fips(eia, self.index, self.plant_fips)
+        new_fuzzy = {k: v for k, v in self.index.fuzzy.items() if k not in known}
+        return merged, counts, new_fuzzy
+
+
+class _PartTask(_AssignTask):
+    """
+    _AssignTask over one Parquet part: the worker reads the input part and
+    writes the output part of the same name into `out_dir`, returning only
+    the match counts and the fuzzy matches it learned.
+    """
+
+    def __init__(self, index: FipsIndex, plant_fips: pd.Series, out_dir: Path):
+        super().__init__(index, plant_fips)
+        self.out_dir = Path(out_dir)
+
+    def __call__(self, part: Path):
+        eia = pd.read_parquet(part)
+        merged, counts, new_fuzzy = super().__call__(eia)
+        to_compact(merged).to_parquet(self.out_dir / part.name, index=False)
+        return len(eia), counts, new_fuzzy
+
+
+def _learn(index: FipsIndex, new_fuzzy: dict):
+    if new_fuzzy:
+        index.fuzzy.update(new_fuzzy)
+        index.dirty = True
+
+
+def run_form(pool, form: str, data_int: Path, index: FipsIndex,
+             workers: int, chunksize: int, plant_fips: pd.Series = None,
+             step=None) -> pd.Series:
+    """
+    Assign FIPS for one EIA form; returns row counts per match tier. With
+    `pool` None everything runs in this process. Rows read and written are
+    added to `step` (run_report.py) when given.
+    """
+    in_name, out_name, chunked = FORMS[form]
+    task = _AssignTask(index, plant_fips)
+
+    if not chunked:
+        eia = read_intermediate(data_int, in_name, dtype={"State": str, "County": str})
+        if pool is None:
+            merged, counts = assign_fips(eia, index, plant_fips)
+        else:
+            merged, counts, new_fuzzy = pool.submit(task, eia).result()
+            _learn(index, new_fuzzy)
+        write_intermediate(merged, data_int, out_name)
+        if step is not None:
+            step.add(rows_in=len(eia), rows_out=len(merged))
+        return counts
+
+    counts = pd.Series(dtype="int64")
+    parts = partition_parts(data_int, in_name)
+    if pool is not None and len(parts) > 1:
+        with ChunkedWriter(data_int, out_name) as writer:
+            part_task = _PartTask(index, plant_fips, writer.paths[0])
+            for n_in, n, new_fuzzy in imap_ordered(pool, part_task, parts,
+                                                   max_pending=2 * workers):
+                counts = counts.add(n, fill_value=0)
+                _learn(index, new_fuzzy)
+                if step is not None:
+                    step.add(rows_in=n_in, rows_out=n_in)
+        return counts
+
+    chunks = iter_intermediate(
+        data_int, in_name, dtype={"State": str, "County": str}, chunksize=chunksize
+    )
+    if step is not None:
+        chunks = step.counted(chunks)
+    with ChunkedWriter(data_int, out_name) as writer:
+        if pool is None:
+            results = ((m, n, {}) for m, n in (assign_fips(c, index, plant_fips) for c in chunks))
+        else:
+            results = imap_ordered(pool, task, chunks, max_pending=2 * workers)
+        for merged, n, new_fuzzy in results:
+            writer.write(merged)
+            counts = counts.add(n, fill_value=0)
+            _learn(index, new_fuzzy)
+            if step is not None:
+                step.add(rows_out=len(merged))
+
+    return counts
+
+
+def main():
+    repo_root = Path(__file__).resolve().parents[1]
+    data_int = repo_root / "data_intermediate"
+
+    parser = argparse.ArgumentParser(description="Assign county FIPS to EIA forms")
+    parser.add_argument("--forms", nargs="+", choices=list(FORMS), default=list(FORMS))
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes (default: 1, in-process)")
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=500_000,
+        help="rows per chunk when the input is a CSV (default: 500000)",
+    )
+    args = parser.parse_args()
+
+    report = RunReport("fips_assign", repo_root / "output")
+
+    # Lookup index loaded (or built) once, shared by every form and chunk
+    with report.step("load FIPS index", "load"):
+        index = load_fips_index(data_int)
+        plant_fips = load_plant_fips(data_int)
+
+    def run(form):
+        with report.step(f"assign FIPS EIA_{form}", "merge") as s:
+            counts = run_form(pool, form, data_int, index, args.workers,
+                              args.chunksize, plant_fips, step=s)
+            s.note(fips_match={k: int(v) for k, v in counts.items()})
+        return counts
+
+    if args.workers <= 1:
+        pool = None
+        for form in args.forms:
+            report_matches(f"[EIA-{form}] ", run(form))
+            print(f"[EIA-{form}] Saved: {data_int / FORMS[form][1]}")
+    else:
+        with process_pool(args.workers) as pool:
+            # Forms run side by side; 923 parts fan out over the same pool
+            with ThreadPoolExecutor(max_workers=len(args.forms)) as drivers:
+                futures = {form: drivers.submit(run, form) for form in args.forms}
+                for form, fut in futures.items():
+                    report_matches(f"[EIA-{form}] ", fut.result())
+                    print(f"[EIA-{form}] Saved: {data_int / FORMS[form][1]}")
+
+    save_if_dirty(index, data_int)
+    report.write()
+
+
+if __name__ == "__main__":
+    main()
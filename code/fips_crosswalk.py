@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+fips_crosswalk.py
+
+State and county FIPS crosswalks parsed from the Census GOVS workbook,
+data_raw/GOVS_to_FIPS_Codes_State_&_County_2007.xls (the Python
+replacement for 02a_build_fips_crosswalk.do).
+
+Writes the files fips_index.py builds its lookup index from:
+
+    data_intermediate/fips_state_codes.csv        govs_state_code, state_name, fips_state_code
+    data_intermediate/fips_county_codes_2007.csv  govs_id, ..., fips_county_2007,
+                                                  fips_state_county_2007
+
+Data rows are recognised by their codes (two-digit GOVS and FIPS state
+codes) rather than by position, so title lines, header rows and notes
+above the table are skipped wherever they sit; the United States total
+rows are dropped as in the .do file. Codes stay strings with their
+leading zeros, also when the sheet stores them as numbers.
+
+The CSVs are rebuilt only when the workbook changes: the workbook's
+sha256 is kept in data_intermediate/fips_crosswalk.json, and
+ensure_crosswalk returns immediately when it matches. Without the
+workbook (e.g. an un-pulled Git LFS pointer, or synthetic inputs from
+synth_data.py) existing CSVs are used as they are.
+
+Reading .xls needs the xlrd package (pip install xlrd).
+
+Usage
+-----
+from fips_crosswalk import ensure_crosswalk
+
+ensure_crosswalk(data_int)     # no-op when the CSVs match the workbook
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+import pandas as pd
+
+from intermediate_store import EXPORT_FORMATS, export_stata
+
+
+CROSSWALK_VERSION = 1
+
+XLS_NAME = "GOVS_to_FIPS_Codes_State_&_County_2007.xls"
+
+# Sheet columns B.. (A is blank), in order
+STATE_COLS = ["govs_state_code", "state_name", "fips_state_code"]
+COUNTY_COLS = [
+    "govs_id", "govs_state_code", "govs_county_code", "county_name",
+    "fips_state_code", "fips_county_2002", "fips_county_2007",
+]
+
+# Zero-padded width of each code column
+CODE_WIDTH = {
+    "govs_id": 5,
+    "govs_state_code": 2,
+    "fips_state_code": 2,
+    "govs_county_code": 3,
+    "fips_county_2002": 3,
+    "fips_county_2007": 3,
+}
+
+
+def xls_path(data_int: Path) -> Path:
+    return Path(data_int).parent / "data_raw" / XLS_NAME
+
+
+def _stamp_path(data_int: Path) -> Path:
+    return Path(data_int) / "fips_crosswalk.json"
+
+
+def _outputs(data_int: Path) -> tuple[Path, Path]:
+    data_int = Path(data_int)
+    return data_int / "fips_state_codes.csv", data_int / "fips_county_codes_2007.csv"
+
+
+def _is_lfs_pointer(path: Path) -> bool:
+    with open(path, "rb") as f:
+        return f.read(40).startswith(b"version https://git-lfs")
+
+
+# ------------------------------------------------------------------
+# Parse
+# ------------------------------------------------------------------
+def _text(s: pd.Series) -> pd.Series:
+    """Cell text, trimmed; numeric cells without a trailing '.0'."""
+    s = s.astype(object)
+    s = s.where(s.notna(), "").astype(str).str.strip()
+    return s.str.replace(r"^(\d+)\.0$", r"\1", regex=True)
+
+
+def _code(s: pd.Series, width: int) -> pd.Series:
+    """Zero-pad digit codes to `width` (numbers read from the sheet lose them)."""
+    digits = s.str.fullmatch(r"\d+")
+    return s.where(~digits, s.str.zfill(width))
+
+
+def _table(raw: pd.DataFrame, columns: list) -> pd.DataFrame:
+    """Columns B.. of a sheet read with header=None, named and trimmed."""
+    df = raw.iloc[:, 1:1 + len(columns)].copy()
+    df.columns = columns
+    for c in columns:
+        df[c] = _text(df[c])
+        if c in CODE_WIDTH:
+            df[c] = _code(df[c], CODE_WIDTH[c])
+    return df
+
+
+def _data_rows(df: pd.DataFrame) -> pd.Series:
+    """Rows holding a two-digit GOVS and FIPS state code (not titles / headers)."""
+    return (
+        df["govs_state_code"].str.fullmatch(r"\d{2}")
+        & df["fips_state_code"].str.fullmatch(r"\d{2}")
+    )
+
+
+def parse_state_sheet(raw: pd.DataFrame) -> pd.DataFrame:
+    """'State Codes' sheet -> fips_state_codes (without the US total row)."""
+    df = _table(raw, STATE_COLS)
+    df = df[_data_rows(df) & (df["govs_state_code"] != "00")]
+    return df.reset_index(drop=True)
+
+
+def parse_county_sheet(raw: pd.DataFrame) -> pd.DataFrame:
+    """'County Codes' sheet -> fips_county_codes_2007 with the 5-digit 2007 FIPS."""
+    df = _table(raw, COUNTY_COLS)
+    df = df[_data_rows(df) & (df["govs_id"].str.strip("0") != "")]
+    df = df.reset_index(drop=True)
+    df["fips_state_county_2007"] = df["fips_state_code"] + df["fips_county_2007"]
+    return df
+
+
+def read_crosswalk(path: Path) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """(state, county) crosswalks from the GOVS workbook at `path`."""
+    sheets = pd.read_excel(
+        path, sheet_name=["State Codes", "County Codes"], header=None, dtype=str
+    )
+    return (
+        parse_state_sheet(sheets["State Codes"]),
+        parse_county_sheet(sheets["County Codes"]),
+    )
+
+
+# ------------------------------------------------------------------
+# Build / cache
+# ------------------------------------------------------------------
+def _digest(path: Path) -> str:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def _stamp(data_int: Path) -> dict:
+    path = _stamp_path(data_int)
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def build_crosswalk(data_int: Path, xls: Path = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Parse the workbook and write the two crosswalk CSVs (+ SHALE_EXPORT .dta)."""
+    xls = Path(xls) if xls is not None else xls_path(data_int)
+    state, county = read_crosswalk(xls)
+    if state.empty or county.empty:
+        raise ValueError(f"No crosswalk rows found in {xls}; check its 'State Codes' / "
+                         "'County Codes' sheets")
+
+    state_path, county_path = _outputs(data_int)
+    state.to_csv(state_path, index=False)
+    county.to_csv(county_path, index=False)
+    if "dta" in EXPORT_FORMATS:
+        export_stata(state, state_path.with_suffix(".dta"))
+        export_stata(county, county_path.with_suffix(".dta"))
+
+    _stamp_path(data_int).write_text(json.dumps(
+        {"version": CROSSWALK_VERSION, "xls": xls.name, "sha256": _digest(xls)}, indent=2
+    ))
+    print(f"Built FIPS crosswalk from {xls.name}: "
+          f"{len(state)} states, {len(county)} counties")
+    return state, county
+
+
+def ensure_crosswalk(data_int: Path, xls: Path = None, force: bool = False) -> bool:
+    """
+    Make sure the crosswalk CSVs exist and match the workbook; returns
+    True if they were (re)built.
+    """
+    xls = Path(xls) if xls is not None else xls_path(data_int)
+    have_csv = all(p.exists() for p in _outputs(data_int))
+
+    if not xls.exists() or _is_lfs_pointer(xls):
+        if have_csv:
+            return False
+        raise FileNotFoundError(
+            f"No FIPS crosswalk in {data_int} and {xls} is missing or a Git LFS "
+            "pointer (run `git lfs pull`)"
+        )
+
+    stamp = _stamp(data_int)
+    if (not force and have_csv and stamp.get("version") == CROSSWALK_VERSION
+            and stamp.get("sha256") == _digest(xls)):
+        return False
+
+    build_crosswalk(data_int, xls)
+    return True
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+fips_index.py
+
+Precomputed (state, county) name -> FIPS lookup index used by
+fips_assign.py.
+
+The index is built once from fips_state_codes.csv and
+fips_county_codes_2007.csv (themselves built from the GOVS workbook by
+fips_crosswalk.py when missing or stale) and pickled to
+data_intermediate/fips_index.pkl (rebuilt automatically when either
+crosswalk changes). Lookups work on the
+unique (State, County) pairs of a dataset -- factorize, resolve each pair
+once, then broadcast the codes back to the rows -- instead of cleaning and
+merging every row.
+
+Each pair is resolved in three tiers:
+    exact   upper-cased / trimmed names, as the original string merge did
+    alias   canonical keys: accents dropped, ST./STE. -> SAINT/SAINTE,
+            COUNTY/PARISH/BOROUGH/CENSUS AREA suffixes removed, spaces and
+            punctuation removed (DE KALB == DEKALB, O'BRIEN == OBRIEN), and
+            USPS state abbreviations mapped to state names
+    fuzzy   close match (difflib) on the canonical county key within the
+            same state, for the remaining misses only; resolved pairs are
+            remembered in the pickle so later runs reuse them
+"""
+
+import difflib
+import hashlib
+import pickle
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from fips_crosswalk import ensure_crosswalk
+from schemas import read_csv
+
+
+INDEX_VERSION = 1
+
+# Minimum difflib ratio for a fuzzy county match
+FUZZY_CUTOFF = 0.88
+
+USPS_STATES = {
+    "AL": "ALABAMA", "AK": "ALASKA", "AZ": "ARIZONA", "AR": "ARKANSAS",
+    "CA": "CALIFORNIA", "CO": "COLORADO", "CT": "CONNECTICUT", "DE": "DELAWARE",
+    "DC": "DISTRICT OF COLUMBIA", "FL": "FLORIDA", "GA": "GEORGIA", "HI": "HAWAII",
+    "ID": "IDAHO", "IL": "ILLINOIS", "IN": "INDIANA", "IA": "IOWA",
+    "KS": "KANSAS", "KY": "KENTUCKY", "LA": "LOUISIANA", "ME": "MAINE",
+    "MD": "MARYLAND", "MA": "MASSACHUSETTS", "MI": "MICHIGAN", "MN": "MINNESOTA",
+    "MS": "MISSISSIPPI", "MO": "MISSOURI", "MT": "MONTANA", "NE": "NEBRASKA",
+    "NV": "NEVADA", "NH": "NEW HAMPSHIRE", "NJ": "NEW JERSEY", "NM": "NEW MEXICO",
+    "NY": "NEW YORK", "NC": "NORTH CAROLINA", "ND": "NORTH DAKOTA", "OH": "OHIO",
+    "OK": "OKLAHOMA", "OR": "OREGON", "PA": "PENNSYLVANIA", "RI": "RHODE ISLAND",
+    "SC": "SOUTH CAROLINA", "SD": "SOUTH DAKOTA", "TN": "TENNESSEE", "TX": "TEXAS",
+    "UT": "UTAH", "VT": "VERMONT", "VA": "VIRGINIA", "WA": "WASHINGTON",
+    "WV": "WEST VIRGINIA", "WI": "WISCONSIN", "WY": "WYOMING",
+}
+
+_COUNTY_SUFFIX = r"\s+(COUNTY|PARISH|BOROUGH|CENSUS AREA|MUNICIPALITY)$"
+
+# (fips_state_code, fips_county_2007, fips_state_county_2007)
+_NO_MATCH = (None, None, None)
+
+
+def clean_name(s: pd.Series) -> pd.Series:
+    """Uppercase + strip whitespace for name matching."""
+    return s.astype(str).str.upper().str.strip()
+
+
+def _strip_accents(s: pd.Series) -> pd.Series:
+    return s.map(
+        lambda x: unicodedata.normalize("NFKD", x).encode("ascii", "ignore").decode()
+    )
+
+
+def canonical_state(s: pd.Series) -> pd.Series:
+    s = clean_name(s)
+    s = s.where(~s.isin(list(USPS_STATES)), s.map(USPS_STATES))
+    return _strip_accents(s).str.replace(r"[^A-Z0-9]", "", regex=True)
+
+
+def canonical_county(s: pd.Series) -> pd.Series:
+    s = _strip_accents(clean_name(s))
+    s = s.str.replace(r"\s+", " ", regex=True)
+    s = s.str.replace(r"^STE\.?\s*", "SAINTE ", regex=True)
+    s = s.str.replace(r"^ST\.?\s*", "SAINT ", regex=True)
+    s = s.str.replace(_COUNTY_SUFFIX, "", regex=True)
+    return s.str.replace(r"[^A-Z0-9]", "", regex=True)
+
+
+class FipsIndex:
+    """Hashed (state, county) -> FIPS lookup with alias and fuzzy tiers."""
+
+    def __init__(self, exact: dict, alias: dict, source_digest: str):
+        self.exact = exact            # (state_clean, county_clean) -> fips
+        self.alias = alias            # (state_key, county_key) -> fips
+        self.fuzzy = {}               # (state_key, county_key) -> fips | _NO_MATCH
+        self.source_digest = source_digest
+        self.dirty = False
+
+        self._counties_by_state = {}
+        for st, ct in alias:
+            self._counties_by_state.setdefault(st, []).append(ct)
+
+    # ------------------------------------------------------------------
+    # Build / persist
+    # ------------------------------------------------------------------
+    @classmethod
+    def build(cls, state: pd.DataFrame, county: pd.DataFrame, source_digest: str = ""):
+        # Attach state names to the county table via govs/fips state code
+        county_full = county.merge(
+            state[["govs_state_code", "state_name", "fips_state_code"]],
+            on=["govs_state_code", "fips_state_code"],
+            how="left",
+            validate="m:1",
+        )
+        fips = list(zip(
+            county_full["fips_state_code"],
+            county_full["fips_county_2007"],
+            county_full["fips_state_county_2007"],
+        ))
+
+        exact_keys = zip(clean_name(county_full["state_name"]),
+                         clean_name(county_full["county_name"]))
+        exact = dict(zip(exact_keys, fips))
+
+        # Canonical keys; drop any that collide (ambiguous aliases)
+        alias_keys = list(zip(canonical_state(county_full["state_name"]),
+                              canonical_county(county_full["county_name"])))
+        counts = pd.Series(alias_keys).value_counts()
+        alias = {
+            k: v for k, v in zip(alias_keys, fips)
+            if counts[k] == 1
+        }
+
+        return cls(exact, alias, source_digest)
+
+    def save(self, path: Path):
+        with open(path, "wb") as f:
+            pickle.dump((INDEX_VERSION, self), f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.dirty = False
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+    def _fuzzy_lookup(self, state_key: str, county_key: str):
+        key = (state_key, county_key)
+        if key not in self.fuzzy:
+            candidates = self._counties_by_state.get(state_key, [])
+            best = difflib.get_close_matches(county_key, candidates, n=1, cutoff=FUZZY_CUTOFF)
+            self.fuzzy[key] = self.alias[(state_key, best[0])] if best else _NO_MATCH
+            self.dirty = True
+        return self.fuzzy[key]
+
+    def resolve(self, states: pd.Series, counties: pd.Series) -> pd.DataFrame:
+        """
+        Resolve (state, county) name pairs, one result per unique pair.
+
+        Returns a frame aligned with the input with columns
+        state_clean, county_clean, fips_state_code, fips_county_2007,
+        fips_state_county_2007 and fips_match (exact / alias / fuzzy / none).
+        """
+        def as_text(s: pd.Series) -> np.ndarray:
+            s = s.astype(object)
+            return s.where(s.notna(), "").astype(str).to_numpy(dtype=object)
+
+        pairs = pd.DataFrame({"s": as_text(states), "c": as_text(counties)})
+        codes, uniq = pd.MultiIndex.from_frame(pairs).factorize()
+        u_state = pd.Series(uniq.get_level_values(0))
+        u_county = pd.Series(uniq.get_level_values(1))
+
+        state_clean = clean_name(u_state)
+        county_clean = clean_name(u_county)
+        state_key = canonical_state(u_state)
+        county_key = canonical_county(u_county)
+
+        result = []
+        how = []
+        for sc, cc, sk, ck in zip(state_clean, county_clean, state_key, county_key):
+            hit = self.exact.get((sc, cc))
+            if hit is not None:
+                result.append(hit)
+                how.append("exact")
+                continue
+            hit = self.alias.get((sk, ck))
+            if hit is not None:
+                result.append(hit)
+                how.append("alias")
+                continue
+            hit = self._fuzzy_lookup(sk, ck)
+            result.append(hit)
+            how.append("fuzzy" if hit[0] is not None else "none")
+
+        fips = np.array(result, dtype=object).reshape(-1, 3)
+        unique = pd.DataFrame({
+            "state_clean": state_clean,
+            "county_clean": county_clean,
+            "fips_state_code": fips[:, 0],
+            "fips_county_2007": fips[:, 1],
+            "fips_state_county_2007": fips[:, 2],
+            "fips_match": how,
+        })
+        return unique.take(codes).reset_index(drop=True)
+
+
+def _crosswalk_digest(paths) -> str:
+    h = hashlib.sha256()
+    for p in paths:
+        h.update(Path(p).read_bytes())
+    return h.hexdigest()
+
+
+def load_fips_index(data_int: Path) -> FipsIndex:
+    """Load data_intermediate/fips_index.pkl, rebuilding it if stale."""
+    data_int = Path(data_int)
+    state_path = data_int / "fips_state_codes.csv"
+    county_path = data_int / "fips_county_codes_2007.csv"
+    index_path = data_int / "fips_index.pkl"
+
+    ensure_crosswalk(data_int)
+    digest = _crosswalk_digest([state_path, county_path])
+
+    if index_path.exists():
+        with open(index_path, "rb") as f:
+            version, index = pickle.load(f)
+        if version == INDEX_VERSION and index.source_digest == digest:
+            return index
+
+    state = read_csv(state_path, "fips_state_codes")
+    county = read_csv(county_path, "fips_county_codes_2007")
+    index = FipsIndex.build(state, county, digest)
+    index.save(index_path)
+    print(f"Built FIPS index: {index_path}")
+    return index
+
+
+def save_if_dirty(index: FipsIndex, data_int: Path):
+    """Persist newly resolved fuzzy matches so later runs reuse them."""
+    if index.dirty:
+        index.save(Path(data_int) / "fips_index.pkl")
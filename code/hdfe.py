@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+hdfe.py
+
+OLS with high-dimensional fixed effects, used by the county-year
+regressions in 03a_reg_shale_860.py.
+
+Instead of building a dense design matrix with one dummy per county and
+year (what `C(year) + C(fips_5)` does in statsmodels), the fixed effects
+are absorbed by iterative demeaning (alternating projections, the same
+approach as Stata's reghdfe). Each fixed effect is stored as an integer
+code vector plus a sparse (n_obs x n_levels) indicator, so memory grows
+with the panel, not with panel x counties.
+
+Conventions follow reghdfe defaults so results line up with
+output/reg_capacity_shale.txt:
+    - singleton groups are dropped (iteratively)
+    - regressors collinear with the fixed effects are omitted (NaN)
+    - cluster-robust VCE with small-sample factor
+          G/(G-1) * (N-1)/(N-K),
+      where K excludes fixed effects nested within the cluster variable
+    - p-values from a t distribution with G-1 degrees of freedom
+"""
+
+import copy
+import itertools
+
+import numpy as np
+import pandas as pd
+from scipy import sparse, stats
+
+
+def factorize(values) -> tuple[np.ndarray, int]:
+    """Integer codes 0..n_levels-1 for a 1-D array-like (NaN -> -1)."""
+    codes, uniques = pd.factorize(pd.Series(values), sort=True)
+    return codes.astype(np.int64), len(uniques)
+
+
+def group_indicator(codes: np.ndarray, n_levels: int) -> sparse.csr_matrix:
+    """Sparse (n_obs x n_levels) 0/1 matrix with one nonzero per row."""
+    n = len(codes)
+    return sparse.csr_matrix(
+        (np.ones(n), (np.arange(n), codes)),
+        shape=(n, n_levels),
+    )
+
+
+def interact_levels(
+    x: np.ndarray,
+    codes: np.ndarray,
+    n_levels: int,
+    omit=(),
+) -> sparse.csr_matrix:
+    """
+    Sparse (n_obs x n_levels - len(omit)) matrix of x * 1[code == level]:
+    one nonzero per row, in the column of the row's level (rows at an
+    omitted level or with code -1 are empty). E.g. shale_index by year.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    cols = np.full(n_levels, -1)
+    levels = np.setdiff1d(np.arange(n_levels), np.asarray(omit, dtype=np.int64))
+    cols[levels] = np.arange(len(levels))
+
+    col = np.where(codes >= 0, cols[np.maximum(codes, 0)], -1)
+    rows = np.flatnonzero(col >= 0)
+    return sparse.csr_matrix(
+        (x[rows], (rows, col[rows])),
+        shape=(len(x), len(levels)),
+    )
+
+
+def singleton_mask(fe_codes: list[np.ndarray]) -> np.ndarray:
+    """
+    Boolean mask of observations to keep after iteratively dropping
+    singleton groups (groups with a single observation) in any FE.
+    """
+    n = len(fe_codes[0])
+    keep = np.ones(n, dtype=bool)
+
+    while True:
+        changed = False
+        for codes in fe_codes:
+            counts = np.bincount(codes[keep], minlength=codes.max() + 1)
+            drop = keep & (counts[codes] <= 1)
+            if drop.any():
+                keep &= ~drop
+                changed = True
+        if not changed:
+            return keep
+
+
+def is_nested(inner: np.ndarray, outer: np.ndarray) -> bool:
+    """True if every level of `inner` maps to exactly one level of `outer`."""
+    pairs = pd.DataFrame({"inner": inner, "outer": outer}).drop_duplicates()
+    return len(pairs) == pairs["inner"].nunique()
+
+
+def fe_groups(fe_codes: list[np.ndarray]) -> list[tuple]:
+    """(codes, transposed indicator, group sizes) per FE, as demean uses them."""
+    groups = []
+    for codes in fe_codes:
+        n_levels = int(codes.max()) + 1
+        D = group_indicator(codes, n_levels)
+        counts = np.asarray(D.sum(axis=0)).ravel()
+        groups.append((codes, D.T.tocsr(), counts))
+    return groups
+
+
+def demean(
+    M: np.ndarray,
+    fe_codes: list[np.ndarray],
+    tol: float = 1e-8,
+    maxiter: int = 10_000,
+    groups: list[tuple] = None,
+) -> np.ndarray:
+    """
+    Partial all fixed effects out of the columns of M.
+
+    Alternating projections: repeatedly subtract group means for each
+    fixed effect in turn until the largest update falls below `tol`
+    (relative to the scale of M). Returns a new float64 array.
+    `groups` (from fe_groups) skips rebuilding the FE indicators.
+    """
+    M = np.array(M, dtype=np.float64, copy=True)
+    if M.ndim == 1:
+        M = M[:, None]
+
+    if groups is None:
+        groups = fe_groups(fe_codes)
+
+    scale = max(np.abs(M).max(), 1.0)
+
+    # With a single FE one pass is exact
+    n_iter = 1 if len(groups) == 1 else maxiter
+
+    for _ in range(n_iter):
+        max_update = 0.0
+        for codes, Dt, counts in groups:
+            means = (Dt @ M) / counts[:, None]
+            M -= means[codes]
+            max_update = max(max_update, np.abs(means).max())
+        if max_update <= tol * scale:
+            break
+    else:
+        if len(groups) > 1:
+            print(f"[hdfe] demeaning did not converge in {maxiter} iterations")
+
+    return M
+
+
+def absorbed_dof(fe_codes: list[np.ndarray], cluster_codes=None) -> int:
+    """
+    Degrees of freedom used up by the fixed effects, reghdfe style:
+    the first FE counts all its levels, later ones lose one redundant
+    level, and FEs nested within a cluster variable count zero.
+    `cluster_codes` is one code vector or a list of them (multiway).
+    """
+    if cluster_codes is None:
+        cluster_codes = []
+    elif isinstance(cluster_codes, np.ndarray):
+        cluster_codes = [cluster_codes]
+
+    df_a = 0
+    first = True
+    for codes in fe_codes:
+        n_levels = int(codes.max()) + 1
+        if any(is_nested(codes, cl) for cl in cluster_codes):
+            first = False
+            continue
+        df_a += n_levels if first else n_levels - 1
+        first = False
+    return df_a
+
+
+def cluster_meat(Xk: np.ndarray, E: np.ndarray, cl_codes: list[np.ndarray]) -> np.ndarray:
+    """
+    Sum over clusters of score outer products, (m x k x k) for the m
+    columns of E. With several cluster variables, the multiway
+    (Cameron-Gelbach-Miller) combination: add the meat of every
+    intersection of an odd number of them, subtract the even ones.
+    """
+    n, k = Xk.shape
+    m = E.shape[1]
+    scores = (Xk[:, :, None] * E[:, None, :]).reshape(n, k * m)
+
+    meat = np.zeros((m, k, k))
+    for r in range(1, len(cl_codes) + 1):
+        for dims in itertools.combinations(cl_codes, r):
+            if r == 1:
+                codes = dims[0]
+            else:
+                codes = pd.MultiIndex.from_arrays(dims).factorize()[0]
+            n_g = int(codes.max()) + 1
+            S = (group_indicator(codes, n_g).T @ scores).reshape(n_g, k, m)
+            sign = 1.0 if r % 2 else -1.0
+            meat += sign * np.einsum("gkm,glm->mkl", S, S)
+    return meat
+
+
+def _finite_rows(M) -> np.ndarray:
+    """Rows of a dense or CSR matrix without NaN / inf."""
+    if not sparse.issparse(M):
+        return np.isfinite(M).all(axis=1)
+    bad = np.repeat(np.arange(M.shape[0]), np.diff(M.indptr))[~np.isfinite(M.data)]
+    ok = np.ones(M.shape[0], dtype=bool)
+    ok[bad] = False
+    return ok
+
+
+class HdfeDesign:
+    """
+    Estimation sample of an HDFE regression with the fixed effects
+    partialled out: demeaned outcomes Y_t (n x m) and the regressors that
+    survive the FE, X_t (n x k), plus group / cluster codes. Shared by
+    reg_hdfe_batch and the wild bootstrap (wild_bootstrap.py).
+
+    `extra` = (names, matrix) appends regressors that are not columns of
+    `data`: a dense or sparse matrix with one row per row of `data`
+    (e.g. interact_levels output), so wide interaction sets never become
+    DataFrame columns.
+
+    with_regressors() swaps in a different set of regressors on the same
+    sample, reusing the demeaned outcomes, FE indicators and cluster
+    codes (specification grids, see 03b_spec_grid.py).
+    """
+
+    def __init__(
+        self,
+        data: pd.DataFrame,
+        depvars: list[str],
+        regressors: list[str],
+        absorb: list[str],
+        cluster,
+        drop_singletons: bool = True,
+        tol: float = 1e-8,
+        maxiter: int = 10_000,
+        extra: tuple = None,
+    ):
+        self.depvars = list(depvars)
+        self.clusters = [cluster] if isinstance(cluster, str) else list(cluster)
+        extra_names, extra_X = extra if extra is not None else ([], None)
+        self.regressors = list(regressors) + list(extra_names)
+
+        # ---------------------------------------------------------
+        # 1. Estimation sample & group codes
+        # ---------------------------------------------------------
+        cols = self.depvars + list(regressors) + list(absorb) + self.clusters
+        frame = data[list(dict.fromkeys(cols))]
+        ok = frame.notna().all(axis=1).to_numpy()
+        if extra_X is not None:
+            extra_X = extra_X.tocsr() if sparse.issparse(extra_X) else np.asarray(extra_X)
+            ok = ok & _finite_rows(extra_X)
+        rows = np.flatnonzero(ok)
+        sample = frame.iloc[rows]
+        self.tol, self.maxiter = tol, maxiter
+
+        fe_codes = [factorize(sample[c])[0] for c in absorb]
+        if drop_singletons:
+            keep = singleton_mask(fe_codes)
+            sample = sample.loc[keep]
+            rows = rows[keep]
+            fe_codes = [factorize(sample[c])[0] for c in absorb]
+
+        self.sample = sample
+        self.rows = rows          # positions of the sample in `data`
+        self.fe_codes = fe_codes
+        self._groups = fe_groups(fe_codes)
+        cl = [factorize(sample[c]) for c in self.clusters]
+        self.cl_codes = [codes for codes, _ in cl]
+        self.n_clusters = [n_g for _, n_g in cl]
+
+        self.Y = sample[self.depvars].to_numpy(dtype=np.float64)
+        X = sample[list(regressors)].to_numpy(dtype=np.float64)
+        if extra_X is not None:
+            E = extra_X[rows]
+            X = np.column_stack([X, E.toarray() if sparse.issparse(E) else E])
+        self.n, m = self.Y.shape
+
+        # ---------------------------------------------------------
+        # 2. Absorb fixed effects from Y and X together
+        # ---------------------------------------------------------
+        Z = demean(np.column_stack([self.Y, X]), fe_codes, tol=tol, maxiter=maxiter,
+                   groups=self._groups)
+        self.Y_t = Z[:, :m]
+        self.df_a = absorbed_dof(fe_codes, self.cl_codes)
+        self._set_regressors(self.regressors, X, Z[:, m:])
+
+    def _set_regressors(self, names: list[str], X: np.ndarray, X_t: np.ndarray):
+        self.regressors = list(names)
+
+        # Omit regressors that the fixed effects explain (e.g. `post` is
+        # absorbed by year FE, `shale_index` by county FE)
+        X_c = X - X.mean(axis=0)
+        ss_raw = (X_c ** 2).sum(axis=0)
+        ss_dm = (X_t ** 2).sum(axis=0)
+        self.kept = ss_dm > 1e-9 * np.maximum(ss_raw, 1e-300)
+
+        self.X_t = X_t[:, self.kept]
+        self.k = self.X_t.shape[1]
+        self.XtX_inv = np.linalg.pinv(self.X_t.T @ self.X_t)
+
+    def with_regressors(self, names: list[str], X: np.ndarray) -> "HdfeDesign":
+        """
+        Copy of the design with regressors `names`, given as a dense
+        (len(data) x p) matrix aligned with the rows of `data`. Only X is
+        demeaned; the values must be finite on the estimation sample.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[:, None]
+        X = X[self.rows]
+        if not np.isfinite(X).all():
+            raise ValueError("Regressors have missing values in the estimation sample")
+
+        new = copy.copy(self)
+        new._set_regressors(names, X, self.partial_out(X))
+        return new
+
+    def partial_out(self, M: np.ndarray) -> np.ndarray:
+        """Demean columns of M (rows = estimation sample) with the design's FE."""
+        return demean(M, self.fe_codes, tol=self.tol, maxiter=self.maxiter,
+                      groups=self._groups)
+
+    @property
+    def kept_terms(self) -> list[str]:
+        return [r for r, keep in zip(self.regressors, self.kept) if keep]
+
+    def small_sample(self) -> float:
+        """reghdfe factor G/(G-1) * (N-1)/(N-K), G = fewest clusters."""
+        G = min(self.n_clusters)
+        return (G / (G - 1)) * ((self.n - 1) / (self.n - self.k - self.df_a))
+
+
+def reg_hdfe_batch(
+    data: pd.DataFrame,
+    depvars: list[str],
+    regressors: list[str],
+    absorb: list[str],
+    cluster,
+    drop_singletons: bool = True,
+    tol: float = 1e-8,
+    maxiter: int = 10_000,
+    extra: tuple = None,
+) -> pd.DataFrame:
+    """
+    Same model as `reg_hdfe`, estimated for several outcomes at once.
+
+    The sample, group codes, cluster indicator and the demeaned
+    regressors (and their cross-product inverse) are built once; all
+    outcomes are demeaned in the same pass and solved together, so the
+    cost of adding an outcome is one extra column, not one extra fit.
+    Rows with a missing value in any outcome are dropped for all of them.
+
+    `cluster` is one column or a list of columns (multiway clustering,
+    e.g. ["fips_5", "state_fips"]; p-values then use the fewest clusters).
+    `extra` = (names, matrix) adds regressors held outside `data`, see
+    HdfeDesign.
+
+    Returns a tidy DataFrame with one row per (dep_var, term):
+    dep_var / term / coef / se / t / pval / nobs / r2.
+    """
+    d = HdfeDesign(data, depvars, regressors, absorb, cluster,
+                   drop_singletons=drop_singletons, tol=tol, maxiter=maxiter,
+                   extra=extra)
+    return estimate(d)
+
+
+def estimate(d: HdfeDesign) -> pd.DataFrame:
+    """Coefficients and cluster-robust SEs for every outcome of a design."""
+    depvars, regressors = d.depvars, d.regressors
+    n, m, k = d.n, len(depvars), d.k
+    Xk, XtX_inv = d.X_t, d.XtX_inv
+
+    # ---------------------------------------------------------
+    # 3. Coefficients & cluster-robust VCE for all outcomes
+    # ---------------------------------------------------------
+    B = XtX_inv @ (Xk.T @ d.Y_t)                  # (k x m)
+    E = d.Y_t - Xk @ B                            # (n x m)
+
+    # Cluster scores for every (regressor, outcome) pair in one product
+    meat = cluster_meat(Xk, E, d.cl_codes)        # (m x k x k)
+
+    n_clusters = min(d.n_clusters)
+    vcov = d.small_sample() * XtX_inv[None] @ meat @ XtX_inv[None]
+
+    se = np.sqrt(np.diagonal(vcov, axis1=1, axis2=2)).T   # (k x m)
+    t = B / se
+    pval = 2 * stats.t.sf(np.abs(t), df=n_clusters - 1)
+
+    Y = d.Y
+    tss = ((Y - Y.mean(axis=0)) ** 2).sum(axis=0)
+    rss = (E ** 2).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r2 = np.where(tss > 0, 1.0 - rss / tss, np.nan)
+
+    # ---------------------------------------------------------
+    # 4. Tidy output (omitted regressors -> NaN)
+    # ---------------------------------------------------------
+    full = {}
+    for name, arr in [("coef", B), ("se", se), ("t", t), ("pval", pval)]:
+        block = np.full((len(regressors), m), np.nan)
+        block[d.kept] = arr
+        full[name] = block.T.ravel()
+
+    out = pd.DataFrame({
+        "dep_var": np.repeat(depvars, len(regressors)),
+        "term": np.tile(regressors, m),
+        **full,
+        "nobs": n,
+        "r2": np.repeat(r2, len(regressors)),
+    })
+    out.attrs = {"n_clusters": n_clusters, "df_a": d.df_a}
+    return out
+
+
+def reg_hdfe(
+    data: pd.DataFrame,
+    depvar: str,
+    regressors: list[str],
+    absorb: list[str],
+    cluster: str,
+    **kwargs,
+) -> pd.DataFrame:
+    """
+    OLS of `depvar` on `regressors`, absorbing the categorical columns in
+    `absorb`, with SEs clustered by `cluster`.
+
+    Returns a DataFrame indexed by regressor with columns
+    coef / se / t / pval. Regressors collinear with the fixed effects
+    are reported as NaN. Sample size, R-squared and number of clusters
+    are stored in the frame's `.attrs`.
+    """
+    res = reg_hdfe_batch(data, [depvar], regressors, absorb, cluster, **kwargs)
+
+    out = res.set_index("term")[["coef", "se", "t", "pval"]]
+    out.attrs = {
+        "nobs": int(res["nobs"].iloc[0]),
+        "r2": float(res["r2"].iloc[0]),
+        **res.attrs,
+    }
+    return out
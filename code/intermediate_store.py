@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+intermediate_store.py
+
+Read / write helpers for the files in data_intermediate/.
+
+Stages hand data to each other through typed, columnar Parquet files
+(FIPS / state / county columns stored as categoricals), read back with
+column projection. CSV and Stata .dta copies are no longer written by
+default; they are exports, produced either
+
+  - at write time, by listing formats in the SHALE_EXPORT environment
+    variable (e.g. SHALE_EXPORT=csv,dta), or
+  - on demand from an existing intermediate, streamed part by part:
+        python code/intermediate_store.py EIA_860_with_fips_shale --csv --dta
+
+.dta files are written by dta_writer.py in row blocks, with numeric IDs
+kept numeric and strings at their minimal width.
+
+Large outputs written chunk by chunk (EIA-923) are stored as a directory
+of Parquet parts, <name>.parquet/part-00000.parquet, ... A reporting year
+added later (append_vintage.py) is written as its own partition,
+part-y2023-00000.parquet, ..., next to the existing parts.
+
+If neither pyarrow nor fastparquet is installed, everything falls back to
+plain CSV so the pipeline still runs.
+
+Usage
+-----
+from intermediate_store import read_intermediate, write_intermediate
+
+df = read_intermediate(data_int, "EIA_860_with_fips", columns=[...])
+write_intermediate(df, data_int, "EIA_860_with_fips_shale")
+"""
+
+import argparse
+import importlib.util
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from dta_writer import export_dta, export_dta_blocks
+from schemas import CATEGORY_COLS, dtypes_for
+
+
+HAVE_PARQUET = (
+    importlib.util.find_spec("pyarrow") is not None
+    or importlib.util.find_spec("fastparquet") is not None
+)
+
+# Formats written next to the primary Parquet file, e.g. "csv,dta"
+EXPORT_FORMATS = tuple(
+    f.strip().lower()
+    for f in os.environ.get("SHALE_EXPORT", "").split(",")
+    if f.strip()
+)
+
+
+# ------------------------------------------------------------------
+# Paths
+# ------------------------------------------------------------------
+def parquet_path(data_int: Path, name: str) -> Path:
+    return Path(data_int) / f"{name}.parquet"
+
+
+def csv_path(data_int: Path, name: str) -> Path:
+    return Path(data_int) / f"{name}.csv"
+
+
+def dta_path(data_int: Path, name: str) -> Path:
+    return Path(data_int) / f"{name}.dta"
+
+
+def _parts(path: Path) -> list[Path]:
+    """Parquet part files for a file or a chunked directory."""
+    if path.is_dir():
+        return sorted(path.glob("part-*.parquet"))
+    return [path]
+
+
+def partition_parts(data_int: Path, name: str, partition: str = None) -> list[Path]:
+    """
+    Parquet parts of an intermediate (empty if it has none); only those of
+    `partition` (e.g. "y2023") when given.
+    """
+    pq = parquet_path(data_int, name)
+    if not pq.exists():
+        return []
+    if partition is None:
+        return _parts(pq)
+    return sorted(pq.glob(f"part-{partition}-*.parquet")) if pq.is_dir() else []
+
+
+def _to_directory(path: Path):
+    """Turn a single-file <name>.parquet into a directory holding it as part-00000."""
+    tmp = path.with_name(path.name + ".tmp")
+    path.replace(tmp)
+    path.mkdir()
+    tmp.replace(path / "part-00000.parquet")
+
+
+# ------------------------------------------------------------------
+# Type compaction & exports
+# ------------------------------------------------------------------
+def to_compact(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    The known low-cardinality string columns as categoricals, on a shallow
+    copy (the caller's frame keeps its dtypes).
+    """
+    return df.assign(**{
+        c: df[c].astype("category")
+        for c in CATEGORY_COLS
+        if c in df.columns and not isinstance(df[c].dtype, pd.CategoricalDtype)
+    })
+
+
+def export_csv(df: pd.DataFrame, path: Path) -> Path:
+    df.to_csv(path, index=False)
+    return path
+
+
+def export_stata(df: pd.DataFrame, path: Path) -> Path:
+    """
+    Stata 118 export through dta_writer.py: typed numeric columns (IDs as
+    long), minimal-width strings, written in row blocks without a
+    stringified copy of `df`.
+    """
+    return export_dta(df, path, label=Path(path).stem)
+
+
+def _export(df: pd.DataFrame, data_int: Path, name: str, formats) -> list[Path]:
+    written = []
+    for fmt in formats:
+        if fmt == "csv":
+            written.append(export_csv(df, csv_path(data_int, name)))
+        elif fmt == "dta":
+            written.append(export_stata(df, dta_path(data_int, name)))
+        else:
+            raise ValueError(f"Unknown export format '{fmt}' (expected csv or dta)")
+    return written
+
+
+def export_intermediate(data_int: Path, name: str, formats) -> list[Path]:
+    """
+    Export an existing intermediate to `formats` ("csv", "dta") one
+    Parquet part (or CSV chunk) at a time, so chunked EIA-923 outputs are
+    never loaded whole.
+    """
+    written = []
+    for fmt in formats:
+        if fmt == "csv":
+            path = csv_path(data_int, name)
+            if not (HAVE_PARQUET and parquet_path(data_int, name).exists()):
+                written.append(path)    # the CSV is the intermediate itself
+                continue
+            for i, part in enumerate(iter_intermediate(data_int, name)):
+                part.to_csv(path, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+            written.append(path)
+        elif fmt == "dta":
+            written.append(export_dta_blocks(
+                lambda: iter_intermediate(data_int, name), dta_path(data_int, name), label=name
+            ))
+        else:
+            raise ValueError(f"Unknown export format '{fmt}' (expected csv or dta)")
+    return written
+
+
+# ------------------------------------------------------------------
+# Write
+# ------------------------------------------------------------------
+def write_intermediate(
+    df: pd.DataFrame,
+    data_int: Path,
+    name: str,
+    export=None,
+) -> list[Path]:
+    """
+    Write `df` as data_int/<name>.parquet, plus any `export` formats
+    ("csv", "dta"; defaults to SHALE_EXPORT). Returns the paths written.
+    """
+    export = EXPORT_FORMATS if export is None else tuple(export)
+
+    if not HAVE_PARQUET:
+        # CSV is then the primary handoff
+        export = tuple(f for f in export if f != "csv")
+        return [export_csv(df, csv_path(data_int, name))] + _export(
+            df, data_int, name, export
+        )
+
+    out = parquet_path(data_int, name)
+    if out.is_dir():
+        for part in _parts(out):
+            part.unlink()
+        out.rmdir()
+
+    to_compact(df).to_parquet(out, index=False)
+
+    return [out] + _export(df, data_int, name, export)
+
+
+class ChunkedWriter:
+    """
+    Append DataFrame chunks to an intermediate without holding the whole
+    table: one Parquet part per chunk (or CSV append without Parquet).
+
+        with ChunkedWriter(data_int, "EIA_923_with_loc") as w:
+            for chunk in ...:
+                w.write(chunk)
+
+    With `partition` (e.g. "y2023"), only that partition's parts are
+    replaced and the rest of the intermediate is kept; a single-file
+    intermediate becomes a directory with the file as its first part.
+    Partitions need Parquet. Leaving the block without writing a chunk
+    raises ValueError.
+    """
+
+    def __init__(self, data_int: Path, name: str, partition: str = None):
+        self.data_int = Path(data_int)
+        self.name = name
+        self.partition = partition
+        self.n_parts = 0
+        self.paths = []
+
+    def __enter__(self):
+        if HAVE_PARQUET:
+            out = parquet_path(self.data_int, self.name)
+            if out.is_file():
+                if self.partition is None:
+                    out.unlink()
+                else:
+                    _to_directory(out)
+            out.mkdir(parents=True, exist_ok=True)
+            for part in partition_parts(self.data_int, self.name, self.partition):
+                part.unlink()
+            self.paths = [out]
+        elif self.partition is not None:
+            raise RuntimeError(
+                f"Partition '{self.partition}' of {self.name}: partitions need Parquet "
+                "(pip install pyarrow)"
+            )
+        else:
+            self.paths = [csv_path(self.data_int, self.name)]
+        return self
+
+    def write(self, chunk: pd.DataFrame):
+        if HAVE_PARQUET:
+            prefix = "part-" if self.partition is None else f"part-{self.partition}-"
+            part = self.paths[0] / f"{prefix}{self.n_parts:05d}.parquet"
+            to_compact(chunk).to_parquet(part, index=False)
+        else:
+            chunk.to_csv(
+                self.paths[0],
+                mode="w" if self.n_parts == 0 else "a",
+                header=(self.n_parts == 0),
+                index=False,
+            )
+        self.n_parts += 1
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None and self.n_parts == 0:
+            # Nothing to infer a schema from: drop the empty directory
+            # rather than leave an intermediate that cannot be read
+            if HAVE_PARQUET and self.partition is None:
+                self.paths[0].rmdir()
+            raise ValueError(f"No rows written to {self.name} (no chunks)")
+        return False
+
+
+# ------------------------------------------------------------------
+# Read
+# ------------------------------------------------------------------
+def _csv_dtype(path: Path, dtype=None) -> dict:
+    """Declared dtypes for the columns of an intermediate CSV, plus `dtype`."""
+    declared = dtypes_for(pd.read_csv(path, nrows=0).columns)
+    return {**declared, **(dtype or {})}
+
+
+def has_intermediate(data_int: Path, name: str) -> bool:
+    """True if data_int/<name> exists as Parquet (file or directory) or CSV."""
+    return (
+        (HAVE_PARQUET and parquet_path(data_int, name).exists())
+        or csv_path(data_int, name).exists()
+    )
+
+
+def intermediate_columns(data_int: Path, name: str) -> list[str]:
+    """Column names of an intermediate without loading its data."""
+    pq = parquet_path(data_int, name)
+    if HAVE_PARQUET and pq.exists():
+        import pyarrow.parquet as papq
+        return list(papq.read_schema(_parts(pq)[0]).names)
+    return list(pd.read_csv(csv_path(data_int, name), nrows=0).columns)
+
+
+def read_intermediate(
+    data_int: Path,
+    name: str,
+    columns=None,
+    dtype=None,
+) -> pd.DataFrame:
+    """
+    Load data_int/<name>, projecting onto `columns` if given.
+
+    Reads the Parquet file (or chunked directory) when present and falls
+    back to <name>.csv otherwise; the CSV path uses the declared dtypes in
+    schemas.py, updated with `dtype` (Parquet already carries its types).
+    """
+    pq = parquet_path(data_int, name)
+    if HAVE_PARQUET and pq.exists():
+        parts = [pd.read_parquet(p, columns=columns) for p in _parts(pq)]
+        return parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+
+    path = csv_path(data_int, name)
+    return pd.read_csv(path, usecols=columns, dtype=_csv_dtype(path, dtype))
+
+
+def iter_intermediate(
+    data_int: Path,
+    name: str,
+    columns=None,
+    dtype=None,
+    chunksize: int = 500_000,
+):
+    """
+    Yield an intermediate in pieces of at most `chunksize` rows: Parquet
+    record batches part by part (a single large file, e.g. one written by
+    duckdb_backend.py, is still read piecewise), or CSV chunks.
+    """
+    pq = parquet_path(data_int, name)
+    if HAVE_PARQUET and pq.exists():
+        if importlib.util.find_spec("pyarrow") is None:
+            for p in _parts(pq):
+                yield pd.read_parquet(p, columns=columns)
+            return
+
+        import pyarrow as pa
+        import pyarrow.parquet as papq
+        for p in _parts(pq):
+            for batch in papq.ParquetFile(p).iter_batches(batch_size=chunksize, columns=columns):
+                yield pa.Table.from_batches([batch]).to_pandas()
+        return
+
+    path = csv_path(data_int, name)
+    yield from pd.read_csv(
+        path, usecols=columns, dtype=_csv_dtype(path, dtype), chunksize=chunksize
+    )
+
+
+# ------------------------------------------------------------------
+# On-demand export CLI
+# ------------------------------------------------------------------
+def main():
+    repo_root = Path(__file__).resolve().parents[1]
+
+    parser = argparse.ArgumentParser(
+        description="Export a data_intermediate Parquet file to CSV and/or Stata .dta"
+    )
+    parser.add_argument("name", help="intermediate name, e.g. EIA_860_with_fips_shale")
+    parser.add_argument("--csv", action="store_true", help="write <name>.csv")
+    parser.add_argument("--dta", action="store_true", help="write <name>.dta (Stata 118)")
+    parser.add_argument(
+        "--data-int",
+        type=Path,
+        default=repo_root / "data_intermediate",
+        help="intermediate directory (default: data_intermediate/)",
+    )
+    args = parser.parse_args()
+
+    formats = [f for f, on in [("csv", args.csv), ("dta", args.dta)] if on]
+    if not formats:
+        parser.error("nothing to do: pass --csv and/or --dta")
+
+    for path in export_intermediate(args.data_int, args.name, formats):
+        print(f"Exported: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+panel_store.py
+
+Memory-mapped NumPy store for the county-year panel
+(EIA_860_county_year_with_shale), so estimators and notebooks open it
+without parsing a file or re-factorizing fips_5 / year.
+
+data_intermediate/<name>.panel/ holds
+
+    meta.json       names, shapes, unit / time labels (the metadata header)
+    unit.npy        int32 county codes  (index into meta["units"])
+    time.npy        int32 year codes    (index into meta["times"])
+    outcomes.npy    float64 (n_obs x n_outcomes), column-major
+    regressors.npy  float64 (n_obs x n_regressors), column-major
+
+Arrays are opened with np.load(mmap_mode="r"): opening is a few
+milliseconds whatever the panel size, nothing is read until used, and
+every process that opens the store (e.g. the spec-grid workers in
+03b_spec_grid.py) maps the same page-cache pages instead of holding a
+private copy. Column-major matrices keep each variable contiguous, the
+layout the demeaning in hdfe.py reads.
+
+Outcomes are the cap_* / gen_* columns, regressors every other numeric
+column; all are stored as float64 (e.g. post becomes 0.0 / 1.0).
+
+Usage
+-----
+from panel_store import open_panel, write_panel
+
+write_panel(cty, data_int, "EIA_860_county_year_with_shale")
+panel = open_panel(data_int, "EIA_860_county_year_with_shale")
+panel.outcomes[:, panel.outcome_names.index("cap_coal")]   # zero-copy view
+cty = panel.frame()                                        # DataFrame over the maps
+
+python code/panel_store.py EIA_860_county_year_with_shale   # from an intermediate
+"""
+
+import argparse
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from intermediate_store import read_intermediate
+
+
+PANEL_VERSION = 1
+
+OUTCOME_PREFIXES = ("cap_", "gen_")
+
+
+def panel_path(data_int: Path, name: str) -> Path:
+    return Path(data_int) / f"{name}.panel"
+
+
+def has_panel(data_int: Path, name: str) -> bool:
+    return (panel_path(data_int, name) / "meta.json").exists()
+
+
+def _codes(values: pd.Series) -> tuple[np.ndarray, list]:
+    codes, uniques = pd.factorize(values, sort=True)
+    if (codes < 0).any():
+        raise ValueError(f"'{values.name}' has missing values")
+    return codes.astype(np.int32), uniques.tolist()
+
+
+def write_panel(
+    df: pd.DataFrame,
+    data_int: Path,
+    name: str,
+    unit: str = "fips_5",
+    time: str = "year",
+    outcomes: list[str] = None,
+) -> Path:
+    """
+    Write `df` as data_int/<name>.panel/. `outcomes` defaults to the
+    cap_* / gen_* columns; every other column except `unit` and `time`
+    must be numeric and goes into the regressor matrix.
+    """
+    if outcomes is None:
+        outcomes = [c for c in df.columns if c.startswith(OUTCOME_PREFIXES)]
+    regressors = [c for c in df.columns if c not in {unit, time, *outcomes}]
+    bad = [c for c in outcomes + regressors if not pd.api.types.is_numeric_dtype(df[c])]
+    if bad:
+        raise TypeError(f"Non-numeric panel columns: {bad}")
+
+    unit_codes, units = _codes(df[unit].astype(str))
+    time_codes, times = _codes(df[time])
+
+    # Write next to the target and swap in, so readers never see a partial store
+    out = panel_path(data_int, name)
+    tmp = out.with_name(out.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    np.save(tmp / "unit.npy", unit_codes)
+    np.save(tmp / "time.npy", time_codes)
+    for fname, cols in [("outcomes.npy", outcomes), ("regressors.npy", regressors)]:
+        M = np.asfortranarray(df[cols].to_numpy(dtype=np.float64, na_value=np.nan))
+        np.save(tmp / fname, M.reshape(len(df), len(cols)))
+
+    meta = {
+        "version": PANEL_VERSION,
+        "n_obs": len(df),
+        "unit": unit,
+        "time": time,
+        "units": units,
+        "times": times,
+        "outcomes": outcomes,
+        "regressors": regressors,
+    }
+    (tmp / "meta.json").write_text(json.dumps(meta))
+
+    shutil.rmtree(out, ignore_errors=True)
+    tmp.rename(out)
+    return out
+
+
+class Panel:
+    """Read-only, memory-mapped view of a .panel store (see open_panel)."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / "meta.json").read_text())
+        if self.meta["version"] != PANEL_VERSION:
+            raise ValueError(f"{self.path}: panel version {self.meta['version']}, "
+                             f"expected {PANEL_VERSION} (rewrite it with write_panel)")
+
+        def load(fname):
+            return np.load(self.path / fname, mmap_mode="r")
+
+        self.unit_codes = load("unit.npy")
+        self.time_codes = load("time.npy")
+        self.outcomes = load("outcomes.npy")
+        self.regressors = load("regressors.npy")
+        self.unit = self.meta["unit"]
+        self.time = self.meta["time"]
+        self.units = np.asarray(self.meta["units"])
+        self.times = np.asarray(self.meta["times"])
+        self.outcome_names = self.meta["outcomes"]
+        self.regressor_names = self.meta["regressors"]
+
+    def __len__(self) -> int:
+        return self.meta["n_obs"]
+
+    @property
+    def columns(self) -> list[str]:
+        return [self.unit, self.time] + self.outcome_names + self.regressor_names
+
+    def column(self, name: str) -> np.ndarray:
+        """One variable: a view into the map (unit / time: decoded labels)."""
+        if name in self.outcome_names:
+            return self.outcomes[:, self.outcome_names.index(name)]
+        if name in self.regressor_names:
+            return self.regressors[:, self.regressor_names.index(name)]
+        if name == self.unit:
+            return self.units[self.unit_codes]
+        if name == self.time:
+            return self.times[self.time_codes]
+        raise KeyError(f"'{name}' not in panel {self.path.name}")
+
+    def frame(self, columns: list[str] = None) -> pd.DataFrame:
+        """
+        DataFrame over the maps: numeric columns are views (no copy), the
+        unit is a categorical on the stored codes, the time its values.
+        """
+        columns = self.columns if columns is None else list(columns)
+        data = {}
+        for c in columns:
+            if c == self.unit:
+                data[c] = pd.Categorical.from_codes(
+                    np.asarray(self.unit_codes), categories=self.units
+                )
+            else:
+                data[c] = self.column(c)
+        return pd.DataFrame(data, copy=False)
+
+
+def open_panel(data_int: Path, name: str) -> Panel:
+    """Memory-map data_int/<name>.panel/."""
+    return Panel(panel_path(data_int, name))
+
+
+def main():
+    repo_root = Path(__file__).resolve().parents[1]
+
+    parser = argparse.ArgumentParser(
+        description="Write a data_intermediate panel as a memory-mapped .panel store"
+    )
+    parser.add_argument("name", nargs="?", default="EIA_860_county_year_with_shale")
+    parser.add_argument(
+        "--data-int",
+        type=Path,
+        default=repo_root / "data_intermediate",
+        help="intermediate directory (default: data_intermediate/)",
+    )
+    args = parser.parse_args()
+
+    df = read_intermediate(args.data_int, args.name, dtype={"fips_5": str})
+    path = write_panel(df, args.data_int, args.name)
+    panel = open_panel(args.data_int, args.name)
+    print(f"Wrote {len(panel)} rows, {len(panel.outcome_names)} outcomes, "
+          f"{len(panel.regressor_names)} regressors to: {path}")
+
+
+if __name__ == "__main__":
+    main()
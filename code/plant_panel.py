@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+plant_panel.py
+
+Plant-year panel over the EIA 860 vintages (EIA_860_with_fips_shale):
+capacity changes, entries and exits per plant, and their county-year
+totals as flow outcomes for 03a.
+
+The plant rows are sorted once by (facilid, year); everything after is
+array arithmetic on that order (no per-plant Python loop):
+
+    collapse   rows sharing (facilid, year) are summed (np.add.reduceat)
+    first/last a plant's first / last vintage: where facilid changes
+    delta      cap_t - cap_(previous vintage), per fuel; a plant's first
+               vintage counts its whole capacity as added (an entry),
+               except in the first sample year (left-censored: zero)
+    exit       last vintage before the last sample year; the plant's
+               capacity is retired in the following year
+
+Per fuel (coal, ng, re = wind + solar) the county-year outcomes are
+
+    cap_added_<fuel>    sum of positive deltas (new plants, expansions)
+    cap_retired_<fuel>  sum of negative deltas (exits, partial retirements)
+
+dated in the year the change is first seen. A gap between two vintages
+of a plant is treated as a reporting gap (delta against the previous
+vintage), not as an exit and re-entry.
+
+Usage
+-----
+from plant_panel import county_flows, plant_year_panel
+
+plants = plant_year_panel(e860)          # needs facilid, year, fips_5, capacity source N
+flows = county_flows(plants)             # fips_5, year, cap_added_*, cap_retired_*
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# Flow fuel -> capacity source columns summed into it
+FLOW_FUELS = {
+    "coal": ["capacity source 1"],
+    "ng": ["capacity source 3"],
+    "re": ["capacity source 4", "capacity source 5"],
+}
+
+
+def plant_year_panel(df: pd.DataFrame, unit: str = "fips_5") -> pd.DataFrame:
+    """
+    Plant-level 860 rows -> one row per (facilid, year), sorted, with
+    cap_<fuel>, d_<fuel> (change since the previous vintage) and the
+    first_year / last_year / entry / exit flags. `unit` is the county of
+    each plant-year (its value at the plant's first row that year).
+    """
+    for c in ["facilid", "year", unit]:
+        if c not in df.columns:
+            raise KeyError(f"Expected column '{c}' not found in plant-level data")
+    fuels = [f for f, cols in FLOW_FUELS.items() if all(c in df.columns for c in cols)]
+
+    keep = (df["facilid"].notna() & df["year"].notna()).to_numpy()
+    fac = df["facilid"].to_numpy(dtype="int64", na_value=0)[keep]
+    yr = df["year"].to_numpy(dtype="int64", na_value=0)[keep]
+    units = df[unit].to_numpy(dtype=object)[keep]
+    # Missing capacity counts as zero, as in the county-year sums
+    caps = np.zeros((int(keep.sum()), len(fuels)))
+    for j, f in enumerate(fuels):
+        cols = df[FLOW_FUELS[f]].to_numpy(dtype="float64", na_value=np.nan)[keep]
+        caps[:, j] = np.nansum(cols, axis=1)
+
+    # ---- sort once, collapse duplicate plant-years ----
+    order = np.lexsort((yr, fac))
+    fac, yr, units, caps = fac[order], yr[order], units[order], caps[order]
+    starts = np.flatnonzero(np.r_[True, (fac[1:] != fac[:-1]) | (yr[1:] != yr[:-1])])
+    if len(starts) < len(fac):
+        caps = np.add.reduceat(caps, starts, axis=0) if len(caps) else caps
+        fac, yr, units = fac[starts], yr[starts], units[starts]
+
+    # ---- grouped diffs ----
+    n = len(fac)
+    first = np.r_[True, fac[1:] != fac[:-1]] if n else np.zeros(0, dtype=bool)
+    last = np.r_[fac[1:] != fac[:-1], True] if n else np.zeros(0, dtype=bool)
+    y0, y1 = (yr.min(), yr.max()) if n else (0, 0)
+
+    prev = np.vstack([np.zeros((1, caps.shape[1])), caps[:-1]]) if n else caps
+    prev[first] = 0.0
+    delta = caps - prev
+    entry = first & (yr > y0)
+    delta[first & ~entry] = 0.0
+    exit_ = last & (yr < y1)
+
+    out = pd.DataFrame({"facilid": fac, "year": yr, unit: units})
+    for j, f in enumerate(fuels):
+        out[f"cap_{f}"] = caps[:, j]
+    for j, f in enumerate(fuels):
+        out[f"d_{f}"] = delta[:, j]
+    out["first_year"] = first
+    out["last_year"] = last
+    out["entry"] = entry
+    out["exit"] = exit_
+    return out
+
+
+def county_flows(plants: pd.DataFrame, unit: str = "fips_5") -> pd.DataFrame:
+    """
+    plant_year_panel output -> county-year cap_added_<fuel> /
+    cap_retired_<fuel>; an exiting plant's capacity is retired in the
+    year after its last vintage, in its last county.
+    """
+    fuels = [c[len("d_"):] for c in plants.columns if c.startswith("d_")]
+    delta = plants[[f"d_{f}" for f in fuels]].to_numpy()
+    ex = plants["exit"].to_numpy()
+    caps = plants[[f"cap_{f}" for f in fuels]].to_numpy()[ex]
+
+    # Within-panel changes at (unit, year), exits at (unit, year + 1)
+    keys = pd.DataFrame({
+        unit: np.r_[plants[unit].to_numpy(dtype=object), plants[unit].to_numpy(dtype=object)[ex]],
+        "year": np.r_[plants["year"].to_numpy(), plants["year"].to_numpy()[ex] + 1],
+    })
+    added = np.vstack([np.clip(delta, 0, None), np.zeros_like(caps)])
+    retired = np.vstack([np.clip(-delta, 0, None), caps])
+
+    flows = pd.concat([
+        keys,
+        pd.DataFrame(added, columns=[f"cap_added_{f}" for f in fuels]),
+        pd.DataFrame(retired, columns=[f"cap_retired_{f}" for f in fuels]),
+    ], axis=1)
+    return flows.groupby([unit, "year"], as_index=False, sort=True).sum()
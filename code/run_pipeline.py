@@ -0,0 +1,629 @@
+#!/usr/bin/env python3
+"""
+run_pipeline.py
+
+Run the Python stages in one process, handing DataFrames directly from
+one stage to the next instead of writing and re-reading an intermediate
+file at every step:
+
+    EIA 860:  01_merge_location -> 02b_add_fips_860 -> 02d_add_shale_to_860
+              -> 03a_reg_shale_860 (county-year panel + regressions)
+    EIA 923:  01_merge_location -> 02c_add_fips_923 -> 02e_aggregate_gen_923
+              (streamed in chunks; county-year generation joins the 860 panel)
+
+The FIPS crosswalk both chains match against is built first from the GOVS
+workbook when missing or stale (fips_crosswalk.py, 02a).
+
+Each stage's transformation is imported from its script (merge_location,
+add_fips, add_shale, aggregate_generation, build_county_year,
+add_generation, run_regressions), so the scripts
+remain the single source of the logic and can still be run on their own.
+
+Only the intermediates named in --persist are written to
+data_intermediate/ (through intermediate_store, so SHALE_EXPORT still
+controls CSV / .dta copies). The regression table is always written to
+output/reg_capacity_shale_by_fuel.csv.
+
+Stage outputs are cached in data_intermediate/.cache (see build_cache.py),
+keyed on the hashes of their input files and code plus their upstream
+stages. A stage whose key is unchanged is loaded from the cache instead of
+recomputed, and stages whose outputs are not needed are never run: after
+editing only rystad_county.dta or the regression spec in 03a, the EIA-923
+chain and the 860 location/FIPS stages are skipped.
+
+With --backend duckdb (needs the optional duckdb package), the location,
+FIPS and shale joins and the county-year aggregation of both forms run as
+DuckDB queries over the raw CSVs instead (duckdb_backend.py): multi-threaded,
+spilling to disk past --memory-limit, so the EIA-923 chain runs in bounded
+memory. The build cache is not used on that path.
+
+Usage
+-----
+python code/run_pipeline.py
+python code/run_pipeline.py --backend duckdb --memory-limit 2GB
+python code/run_pipeline.py --forms 860 --persist EIA_860_with_fips_shale
+python code/run_pipeline.py --forms 923 --persist EIA_923_with_fips
+python code/run_pipeline.py --no-cache
+"""
+
+import argparse
+import contextlib
+import functools
+import importlib.util
+from pathlib import Path
+
+import pandas as pd
+
+from build_cache import BuildCache
+from county_geo import load_plant_fips
+from duckdb_backend import HAVE_DUCKDB, MEMORY_LIMIT, SqlChain, location_fips, unmatched_fips
+from fips_assign import report_matches
+from fips_crosswalk import ensure_crosswalk
+from fips_index import load_fips_index, save_if_dirty
+from intermediate_store import ChunkedWriter, write_intermediate
+from panel_store import write_panel
+from plant_panel import plant_year_panel
+from run_report import RunReport
+from schemas import iter_csv, read_csv, read_dta
+from shale_exposure import load_exposure
+from spatial import load_adjacency
+
+
+CODE_DIR = Path(__file__).resolve().parent
+ROOT = CODE_DIR.parent
+DATA_RAW = ROOT / "data_raw"
+DATA_INT = ROOT / "data_intermediate"
+OUTPUT = ROOT / "output"
+
+INTERMEDIATES_860 = [
+    "EIA_860_with_loc",
+    "EIA_860_with_fips",
+    "EIA_860_with_fips_shale",
+    "EIA_860_county_year_with_shale",
+]
+INTERMEDIATES_923 = [
+    "EIA_923_with_loc",
+    "EIA_923_with_fips",
+    "EIA_923_county_year_gen",
+]
+DEFAULT_PERSIST = [
+    "EIA_860_county_year_with_shale",
+    "EIA_923_with_fips",
+    "EIA_923_county_year_gen",
+]
+
+LOC_PATH = DATA_RAW / "EIA_power_plant_location.csv"
+STATE_PATH = DATA_INT / "fips_state_codes.csv"
+COUNTY_PATH = DATA_INT / "fips_county_codes_2007.csv"
+RYSTAD_PATH = DATA_RAW / "Rystad" / "rystad_county.dta"
+BOUNDARY_PATH = DATA_RAW / "county_boundaries.geojson"
+ADJ_PATH = DATA_RAW / "county_adjacency.dta"
+
+
+@functools.lru_cache(maxsize=None)
+def load_stage(script: str):
+    """Import a numbered script (e.g. 02b_add_fips_860) as a module."""
+    path = CODE_DIR / f"{script}.py"
+    spec = importlib.util.spec_from_file_location(f"stage_{script}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def code_path(script: str) -> Path:
+    return CODE_DIR / f"{script}.py"
+
+
+def store_code() -> list:
+    """Modules every cached stage output is typed / written through."""
+    return [code_path("intermediate_store"), code_path("dta_writer")]
+
+
+def geo_inputs() -> list:
+    """County boundary file, when present (coordinate FIPS fallback)."""
+    return [BOUNDARY_PATH] if BOUNDARY_PATH.exists() else []
+
+
+def _maybe_persist(df: pd.DataFrame, name: str, persist: set, report: RunReport):
+    if name in persist:
+        with report.step(f"write {name}", "write", rows_in=len(df)):
+            written = write_intermediate(df, DATA_INT, name)
+        for path in written:
+            print(f"  persisted: {path}")
+
+
+class Stage:
+    """
+    One cached pipeline step producing a single DataFrame.
+
+    `build` is only called (and its upstream stages only evaluated) when
+    the output is neither memoized in this run nor found in the cache.
+    """
+
+    def __init__(self, cache, name: str, output: str, key: str, build,
+                 report: RunReport):
+        self.cache = cache
+        self.report = report
+        self.name = name
+        self.output = output
+        self.key = key
+        self.build = build
+        self._df = None
+
+    def __call__(self) -> pd.DataFrame:
+        if self._df is not None:
+            return self._df
+
+        if self.cache is not None:
+            with self.report.step(f"{self.name} cache lookup", "load") as s:
+                hit = self.cache.get(self.name, self.key)
+                if hit is not None and self.output in hit:
+                    s.rows_out = len(hit[self.output])
+            if hit is not None and self.output in hit:
+                print(f"[cache] {self.name}: hit ({self.key})")
+                self._df = hit[self.output]
+                return self._df
+
+        self._df = self.build()
+        if self.cache is not None:
+            self.cache.put(self.name, self.key, {self.output: self._df})
+        return self._df
+
+
+def stage_key(cache, name: str, **kwargs) -> str:
+    return cache.key(name, **kwargs) if cache is not None else ""
+
+
+# ------------------------------------------------------------------
+# EIA 860 chain
+# ------------------------------------------------------------------
+def run_860(load_locations, persist: set, report: RunReport, cache=None,
+            gen=None, bootstrap: int = 0) -> pd.DataFrame:
+    """
+    Raw EIA 860 -> county-year panel + regression table (with the EIA 923
+    county-year generation `gen` joined on, when given). Steps are
+    recorded in `report`.
+    """
+    s01 = load_stage("01_merge_location")
+    s02b = load_stage("02b_add_fips_860")
+    s02d = load_stage("02d_add_shale_to_860")
+    s03a = load_stage("03a_reg_shale_860")
+
+    # ---- stage builders (each pulls its upstream lazily) ----
+    def build_loc():
+        loc_subset = load_locations()
+        print("\n[860] 01 merge location")
+        with report.step("860 load EIA_860", "load") as s:
+            e860 = read_csv(DATA_RAW / "EIA_860.csv", "EIA_860")
+            s.rows_out = len(e860)
+        with report.step("860 merge location", "merge", rows_in=len(e860)) as s:
+            e860 = s01.merge_location(e860, loc_subset)
+            missing = e860["County"].isna()
+            s.join(loc_subset["Plant_Code"], rows_out=len(e860), unmatched=int(missing.sum()))
+        print(f"EIA 860: missing location fraction = {missing.mean():.3f}")
+        return e860
+
+    def build_fips():
+        e860 = loc()
+        print("\n[860] 02b add FIPS")
+        with report.step("860 assign FIPS", "merge", rows_in=len(e860)) as s:
+            index = load_fips_index(DATA_INT)
+            e860 = s02b.add_fips(e860, index, load_plant_fips(DATA_INT, LOC_PATH, BOUNDARY_PATH))
+            save_if_dirty(index, DATA_INT)
+            s.rows_out = len(e860)
+            s.note(fips_match=e860["FIPS_match"].value_counts().to_dict())
+        return e860
+
+    def build_shale():
+        e860 = fips()
+        print("\n[860] 02d add shale")
+        with report.step("860 collapse Rystad to county", "aggregate") as s:
+            rystad = read_dta(RYSTAD_PATH, "rystad_county")
+            shale_by_county = s02d.county_shale(rystad)
+            s.add(rows_in=len(rystad), rows_out=len(shale_by_county))
+        with report.step("860 merge shale", "merge", rows_in=len(e860)) as s:
+            e860 = s02d.merge_shale(e860, shale_by_county)
+            s.join(shale_by_county["fips"], rows_out=len(e860))
+        return e860
+
+    def build_cty():
+        e860 = shale()
+        print("\n[860] 03a county-year panel")
+        with report.step("860 build county-year panel", "aggregate", rows_in=len(e860)) as s:
+            cty = s03a.build_county_year(e860)
+            s.rows_out = len(cty)
+        return cty
+
+    # ---- keys: inputs + code + upstream key ----
+    k_loc = stage_key(
+        cache, "860_loc",
+        inputs=[DATA_RAW / "EIA_860.csv", LOC_PATH],
+        code=[code_path("01_merge_location"), code_path("schemas")] + store_code(),
+    )
+    k_fips = stage_key(
+        cache, "860_fips",
+        inputs=[STATE_PATH, COUNTY_PATH, LOC_PATH] + geo_inputs(),
+        code=[code_path("02b_add_fips_860"), code_path("fips_assign"),
+              code_path("fips_index"), code_path("county_geo")] + store_code(),
+        upstream=[k_loc],
+    )
+    k_shale = stage_key(
+        cache, "860_shale",
+        inputs=[RYSTAD_PATH],
+        code=[code_path("02d_add_shale_to_860"), code_path("schemas"),
+              code_path("shale_exposure"), code_path("spatial")] + store_code(),
+        upstream=[k_fips],
+    )
+    k_cty = stage_key(
+        cache, "860_cty",
+        code=[code_path("03a_reg_shale_860"), code_path("plant_panel"),
+              code_path("spatial")] + store_code(),
+        upstream=[k_shale],
+    )
+
+    loc = Stage(cache, "860_loc", "EIA_860_with_loc", k_loc, build_loc, report)
+    fips = Stage(cache, "860_fips", "EIA_860_with_fips", k_fips, build_fips, report)
+    shale = Stage(cache, "860_shale", "EIA_860_with_fips_shale", k_shale, build_shale,
+                  report)
+    cty_stage = Stage(cache, "860_cty", "EIA_860_county_year_with_shale", k_cty,
+                      build_cty, report)
+
+    # ---- run: only what the panel and the persisted artifacts need ----
+    cty = cty_stage()
+    for stage in [loc, fips, shale]:
+        if stage.output in persist:
+            _maybe_persist(stage(), stage.output, persist, report)
+    return estimate_860(cty, persist, report, gen=gen, bootstrap=bootstrap)
+
+
+def estimate_860(cty: pd.DataFrame, persist: set, report: RunReport,
+                 gen=None, bootstrap: int = 0) -> pd.DataFrame:
+    """
+    County-year panel -> generation and spatial columns, persisted panel,
+    regression tables (shared by both backends); `bootstrap` wild cluster
+    bootstrap replications in the inference table (0: analytic SEs only).
+    """
+    CTY = "EIA_860_county_year_with_shale"
+    s03a = load_stage("03a_reg_shale_860")
+
+    if gen is not None:
+        with report.step("860 merge generation", "merge", rows_in=len(cty)) as s:
+            cty = s03a.add_generation(cty, gen)
+            s.join(gen[["fips_5", "year"]], rows_out=len(cty))
+    expo = None
+    if RYSTAD_PATH.exists():
+        with report.step("860 add play exposure", "merge", rows_in=len(cty)) as s:
+            expo = load_exposure(DATA_INT, RYSTAD_PATH)
+            cty = s03a.add_play_exposure(cty.copy(), expo)
+    if ADJ_PATH.exists():
+        with report.step("860 add spatial regressors", "merge", rows_in=len(cty)) as s:
+            cty = s03a.add_spatial(cty.copy(), load_adjacency(ADJ_PATH), expo)
+            s.rows_out = len(cty)
+
+    _maybe_persist(cty, CTY, persist, report)
+    if CTY in persist:
+        with report.step(f"write {CTY}.panel", "write", rows_in=len(cty)):
+            print(f"  persisted: {write_panel(cty, DATA_INT, CTY)}")
+
+    print("\n[860] 03a regressions")
+    with report.step("860 regressions by fuel", "estimate", rows_in=len(cty)) as s:
+        res = s03a.run_regressions(cty)
+        s.rows_out = len(res)
+    s03a.print_summary(res)
+
+    OUTPUT.mkdir(parents=True, exist_ok=True)
+    out_tab = OUTPUT / "reg_capacity_shale_by_fuel.csv"
+    res.to_csv(out_tab, index=False)
+    print(f"\nSaved full coefficient table to: {out_tab}")
+
+    with report.step("860 clustered SEs + wild bootstrap", "estimate", rows_in=len(cty)) as s:
+        s03a.run_inference(cty, OUTPUT, B=bootstrap)
+        s.note(bootstrap=bootstrap)
+
+    if ADJ_PATH.exists():
+        with report.step("860 spillover regressions", "estimate", rows_in=len(cty)):
+            s03a.run_spillover(cty, OUTPUT)
+
+    return res
+
+
+# ------------------------------------------------------------------
+# EIA 923 chain
+# ------------------------------------------------------------------
+def run_923(load_locations, persist: set, chunksize: int, report: RunReport,
+            cache=None) -> pd.DataFrame:
+    """
+    Raw EIA 923 -> location -> FIPS -> county-year generation, one chunk at
+    a time. Returns the county-year generation panel. Each step (read,
+    merge, FIPS, aggregate, write) is timed over all chunks in `report`.
+    """
+    GEN = "EIA_923_county_year_gen"
+    wanted = [name for name in INTERMEDIATES_923 if name in persist]
+
+    # with_fips and the generation panel are always cached; with_loc only
+    # when asked for
+    cached_names = sorted(set(wanted) | {"EIA_923_with_fips", GEN})
+    key = stage_key(
+        cache, "923_fips",
+        inputs=[DATA_RAW / "EIA_923.csv", LOC_PATH, STATE_PATH, COUNTY_PATH]
+               + geo_inputs(),
+        code=[code_path("01_merge_location"), code_path("02c_add_fips_923"),
+              code_path("02e_aggregate_gen_923"), code_path("fips_assign"),
+              code_path("fips_index"), code_path("county_geo"),
+              code_path("schemas")] + store_code(),
+        params={"outputs": cached_names},
+    )
+
+    if cache is not None and cache.has("923_fips", key):
+        print(f"\n[cache] 923_fips: hit ({key})")
+        with report.step("923_fips cache lookup", "load") as s:
+            gen = cache.get("923_fips", key, names=[GEN])[GEN]
+            s.rows_out = len(gen)
+        for name in wanted:
+            print(f"  persisted: {cache.copy_out('923_fips', key, name, DATA_INT)}")
+        return gen
+
+    s01 = load_stage("01_merge_location")
+    s02c = load_stage("02c_add_fips_923")
+    s02e = load_stage("02e_aggregate_gen_923")
+    index = load_fips_index(DATA_INT)
+    plant_fips = load_plant_fips(DATA_INT, LOC_PATH, BOUNDARY_PATH)
+    loc_subset = load_locations()
+
+    # Write straight into the cache entry (then copy out), or into
+    # data_intermediate/ when caching is off
+    if cache is not None:
+        out_dir = cache.begin("923_fips", key)
+        names = cached_names
+    else:
+        out_dir = DATA_INT
+        names = wanted
+
+    print("\n[923] 01 merge location + 02c add FIPS + 02e aggregate (streamed)")
+    n_rows = 0
+    n_missing = 0
+    counts = pd.Series(dtype="int64")
+    aggregator = s02e.GenerationAggregator()
+    with contextlib.ExitStack() as stack:
+        writers = {
+            name: stack.enter_context(ChunkedWriter(out_dir, name))
+            for name in names
+            if name != GEN
+        }
+
+        chunks = report.iterate(
+            iter_csv(DATA_RAW / "EIA_923.csv", "EIA_923", chunksize), "923 read EIA_923"
+        )
+        for chunk in chunks:
+            with report.step("923 merge location", "merge", rows_in=len(chunk)) as s:
+                chunk = s01.merge_location(chunk, loc_subset)
+                s.add(rows_out=len(chunk))
+            n_rows += len(chunk)
+            n_missing += int(chunk["County"].isna().sum())
+            if "EIA_923_with_loc" in writers:
+                with report.step("923 write EIA_923_with_loc", "write", rows_in=len(chunk)):
+                    writers["EIA_923_with_loc"].write(chunk)
+
+            with report.step("923 assign FIPS", "merge", rows_in=len(chunk)) as s:
+                chunk = s02c.add_fips(chunk, index, plant_fips, verbose=False)
+                s.add(rows_out=len(chunk))
+            counts = counts.add(chunk["FIPS_match"].value_counts(), fill_value=0)
+            if "EIA_923_with_fips" in writers:
+                with report.step("923 write EIA_923_with_fips", "write", rows_in=len(chunk)):
+                    writers["EIA_923_with_fips"].write(chunk)
+            with report.step("923 aggregate generation", "aggregate", rows_in=len(chunk)):
+                aggregator.add(chunk)
+
+    save_if_dirty(index, DATA_INT)
+    if n_rows:
+        report.steps["923 merge location"].join(loc_subset["Plant_Code"], unmatched=n_missing)
+        report.steps["923 assign FIPS"].note(fips_match={k: int(v) for k, v in counts.items()})
+        print(f"EIA 923: missing location fraction = {n_missing / n_rows:.3f}")
+        report_matches("[EIA-923] ", counts)
+
+    with report.step("923 aggregate generation", "aggregate") as s:
+        gen = aggregator.result()
+        s.rows_out = len(gen)
+    print(f"[EIA-923] county-years with generation: {len(gen)}")
+
+    if cache is not None:
+        with report.step(f"write {GEN}", "write", rows_in=len(gen)):
+            write_intermediate(gen, out_dir, GEN, export=())
+        with report.step("923 cache commit + copy out", "write"):
+            cache.commit("923_fips", key, names)
+            copied = [cache.copy_out("923_fips", key, name, DATA_INT) for name in wanted]
+        for path in copied:
+            print(f"  persisted: {path}")
+    else:
+        for w in writers.values():
+            print(f"  persisted: {w.paths[0]}")
+        if GEN in wanted:
+            _maybe_persist(gen, GEN, persist, report)
+
+    return gen
+
+
+# ------------------------------------------------------------------
+# DuckDB backend (both chains as SQL over the raw files)
+# ------------------------------------------------------------------
+# plant-level intermediate -> (form, level of the chain), see duckdb_backend.py
+SQL_PLANT_LEVEL = {
+    "EIA_860_with_loc": ("860", "loc"),
+    "EIA_860_with_fips": ("860", "fips"),
+    "EIA_860_with_fips_shale": ("860", "shale"),
+    "EIA_923_with_loc": ("923", "loc"),
+    "EIA_923_with_fips": ("923", "fips"),
+}
+
+
+def run_sql(load_locations, forms: list, persist: set, report: RunReport,
+            threads: int = None, memory_limit: str = MEMORY_LIMIT):
+    """
+    Raw EIA 860 / 923 -> county-year panel and generation through
+    duckdb_backend.py, one query per form. Returns (cty, gen), None for a
+    form not run. Plant-level intermediates in `persist` are written by
+    DuckDB from the same query.
+    """
+    GEN = "EIA_923_county_year_gen"
+    s02d = load_stage("02d_add_shale_to_860")
+    s03a = load_stage("03a_reg_shale_860")
+
+    print("\n[sql] resolve location FIPS")
+    with report.step("sql assign FIPS to locations", "merge") as s:
+        loc_subset = load_locations()
+        index = load_fips_index(DATA_INT)
+        loc_fips = location_fips(
+            loc_subset, index, load_plant_fips(DATA_INT, LOC_PATH, BOUNDARY_PATH)
+        )
+        unmatched = unmatched_fips(index)
+        save_if_dirty(index, DATA_INT)
+        s.add(rows_in=len(loc_subset), rows_out=len(loc_fips))
+        s.note(fips_match=loc_fips["FIPS_match"].value_counts().to_dict())
+
+    shale_by_county = None
+    if "860" in forms:
+        with report.step("860 collapse Rystad to county", "aggregate") as s:
+            rystad = read_dta(RYSTAD_PATH, "rystad_county")
+            shale_by_county = s02d.county_shale(rystad)
+            s.add(rows_in=len(rystad), rows_out=len(shale_by_county))
+
+    chain = SqlChain(loc_fips, shale_by_county, unmatched, threads=threads,
+                     memory_limit=memory_limit, temp_dir=DATA_INT / ".duckdb_tmp")
+
+    for name, (form, level) in SQL_PLANT_LEVEL.items():
+        if name in persist and form in forms:
+            with report.step(f"write {name}", "write") as s:
+                out = DATA_INT / f"{name}.parquet"
+                s.rows_out = chain.copy_plant_level(
+                    DATA_RAW / f"EIA_{form}.csv", f"EIA_{form}", level, out
+                )
+            print(f"  persisted: {out}")
+
+    gen = None
+    if "923" in forms:
+        print("\n[923] location + FIPS + county-year generation (sql)")
+        with report.step("923 query county-year generation", "aggregate") as s:
+            gen = chain.county_year_gen(DATA_RAW / "EIA_923.csv")
+            s.join(loc_fips["Plant_Code"], rows_out=len(gen))
+        print(f"[EIA-923] county-years with generation: {len(gen)}")
+        _maybe_persist(gen, GEN, persist, report)
+
+    cty = None
+    if "860" in forms:
+        print("\n[860] location + FIPS + shale + county-year panel (sql)")
+        with report.step("860 query county-year panel", "aggregate") as s:
+            cty = s03a.add_shale_regressors(chain.county_year_860(DATA_RAW / "EIA_860.csv"))
+            s.join(loc_fips["Plant_Code"], rows_out=len(cty))
+        with report.step("860 plant-year capacity flows", "aggregate") as s:
+            plants = plant_year_panel(chain.plant_years_860(DATA_RAW / "EIA_860.csv"))
+            cty = s03a.add_flows(cty, plants)
+            s.add(rows_in=len(plants), rows_out=len(cty))
+
+    return cty, gen
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the EIA 860 / 923 stages in one process"
+    )
+    parser.add_argument(
+        "--forms",
+        nargs="+",
+        choices=["860", "923"],
+        default=["860", "923"],
+        help="which EIA forms to build (default: both)",
+    )
+    parser.add_argument(
+        "--persist",
+        nargs="*",
+        choices=INTERMEDIATES_860 + INTERMEDIATES_923,
+        default=DEFAULT_PERSIST,
+        help="intermediates to write to data_intermediate/ "
+             f"(default: {' '.join(DEFAULT_PERSIST)})",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=500_000,
+        help="rows of EIA_923.csv per chunk (default: 500000)",
+    )
+    parser.add_argument(
+        "--bootstrap",
+        type=int,
+        default=0,
+        metavar="B",
+        help="wild cluster bootstrap replications in the 03a inference table, "
+             "e.g. 9999 (default: 0, analytic SEs only)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="recompute every stage and do not touch data_intermediate/.cache",
+    )
+    parser.add_argument(
+        "--cache-budget-gb",
+        type=float,
+        default=5.0,
+        help="disk budget for data_intermediate/.cache (default: 5 GB)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["pandas", "duckdb"],
+        default="pandas",
+        help="run the location / FIPS / shale / county-year chain in pandas "
+             "(default) or as DuckDB queries over the raw files",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="DuckDB threads (default: all cores)",
+    )
+    parser.add_argument(
+        "--memory-limit",
+        default=MEMORY_LIMIT,
+        help=f"DuckDB memory before spilling to disk (default: {MEMORY_LIMIT})",
+    )
+    args = parser.parse_args()
+    if args.backend == "duckdb" and not HAVE_DUCKDB:
+        parser.error("--backend duckdb needs the duckdb package (pip install duckdb)")
+
+    persist = set(args.persist)
+    DATA_INT.mkdir(parents=True, exist_ok=True)
+    # Crosswalk CSVs are cache-key inputs, so build them (02a) up front
+    ensure_crosswalk(DATA_INT)
+
+    cache = None
+    if not args.no_cache:
+        cache = BuildCache(DATA_INT / ".cache", int(args.cache_budget_gb * 2**30))
+
+    report = RunReport("run_pipeline", OUTPUT)
+
+    @functools.lru_cache(maxsize=None)
+    def load_locations() -> pd.DataFrame:
+        with report.step("load plant locations", "load") as s:
+            loc_subset = load_stage("01_merge_location").load_locations(LOC_PATH)
+            s.rows_out = len(loc_subset)
+        print("Unique plants in location file:", loc_subset["Plant_Code"].nunique())
+        return loc_subset
+
+    if args.backend == "duckdb":
+        cty, gen = run_sql(load_locations, args.forms, persist, report,
+                           args.threads, args.memory_limit)
+        if cty is not None:
+            estimate_860(cty, persist, report, gen=gen, bootstrap=args.bootstrap)
+        report.write()
+        return
+
+    # 923 first: its county-year generation joins the 860 panel
+    gen = None
+    if "923" in args.forms:
+        gen = run_923(load_locations, persist, args.chunksize, report, cache)
+    if "860" in args.forms:
+        run_860(load_locations, persist, report, cache, gen=gen, bootstrap=args.bootstrap)
+
+    report.write()
+
+
+if __name__ == "__main__":
+    main()
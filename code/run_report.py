@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+run_report.py
+
+Lightweight instrumentation of the pipeline steps. Every load, merge,
+aggregate and write in a stage is wrapped in a step that records
+
+    seconds        wall time
+    rss_mb         resident memory of the process at the end of the step
+    peak_rss_mb    highest resident memory seen during the step (sampled)
+    rows_in / rows_out
+    join           merges only: fan-out (rows_out / rows_in), duplicate
+                   keys on the right side, unmatched left rows
+
+A step entered once per chunk accumulates into one record (calls,
+total seconds, summed rows). Each run is written as one JSON report,
+output/run_reports/<run>.json (the latest run of that stage), with a
+copy appended as one line to output/run_reports/history.jsonl so steps
+can be compared across runs.
+
+A left merge onto a table whose key is not unique multiplies rows; with
+a repeating left key (facilid over years) that is a many-to-many join.
+Such steps are flagged in the report and printed as warnings, e.g. a
+location file that lists a Plant_Code twice.
+
+Memory is sampled from /proc/self/statm by a background thread (every
+SAMPLE_SECONDS); elsewhere the process high-water mark (ru_maxrss) is
+used. Work done in pool workers is not in this process's RSS; the
+report's "children_peak_rss_mb" is the largest finished worker.
+
+Usage
+-----
+from run_report import RunReport
+
+report = RunReport("01_merge_location", out_dir)
+with report.step("load EIA_860", "load") as s:
+    e860 = read_csv(...)
+    s.rows_out = len(e860)
+with report.step("merge EIA_860 location", "merge", rows_in=len(e860)) as s:
+    e860_loc = merge_location(e860, loc)
+    s.join(loc["Plant_Code"], rows_out=len(e860_loc))
+report.write()
+"""
+
+import contextlib
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+
+SAMPLE_SECONDS = 0.05
+
+# Step kinds used by the stages
+KINDS = ("load", "merge", "aggregate", "write", "estimate")
+
+# ru_maxrss is in KiB on Linux, bytes on macOS
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_STATM = Path("/proc/self/statm")
+
+
+def _mb(n_bytes) -> float:
+    return round(n_bytes / 2**20, 1)
+
+
+def current_rss() -> int:
+    """Resident memory of this process in bytes (high-water mark off Linux)."""
+    try:
+        return int(_STATM.read_text().split()[1]) * _PAGE
+    except (OSError, IndexError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT
+
+
+class _Sampler(threading.Thread):
+    """Track the peak RSS of every open step."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.open = []
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+
+    def run(self):
+        while not self.stop.wait(SAMPLE_SECONDS):
+            rss = current_rss()
+            with self.lock:
+                for peak in self.open:
+                    peak[0] = max(peak[0], rss)
+
+
+class Step:
+    """
+    One instrumented step. Set `rows_out` (and `rows_in`) inside the
+    block; a step entered again under the same name (once per chunk)
+    accumulates its calls and time, and its rows through add().
+    """
+
+    def __init__(self, name: str, kind: str):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown step kind '{kind}' (expected one of {KINDS})")
+        self.name = name
+        self.kind = kind
+        self.rows_in = None
+        self.rows_out = None
+        self.calls = 0
+        self.seconds = 0.0
+        self.rss = 0
+        self.peak_rss = 0
+        self.info = {}
+        self.warnings = []
+
+    def add(self, rows_in: int = None, rows_out: int = None):
+        """Accumulate row counts, for steps fed chunk by chunk."""
+        if rows_in is not None:
+            self.rows_in = (self.rows_in or 0) + int(rows_in)
+        if rows_out is not None:
+            self.rows_out = (self.rows_out or 0) + int(rows_out)
+
+    def counted(self, chunks):
+        """Pass chunks through, adding their rows to rows_in."""
+        for chunk in chunks:
+            self.add(rows_in=len(chunk))
+            yield chunk
+
+    def note(self, **info):
+        """Extra diagnostics stored with the step (match rates, counts, ...)."""
+        self.info.update(info)
+
+    def join(self, right_key, rows_out: int = None, unmatched: int = None):
+        """
+        Record the cardinality of a left merge onto `right_key` (a column,
+        or a DataFrame for a composite key). Rows multiplied by the merge
+        (fan-out above 1), or duplicate right keys that could multiply
+        them, are flagged.
+        """
+        if rows_out is not None:
+            self.rows_out = int(rows_out)
+        if isinstance(right_key, pd.DataFrame):
+            key_name = "+".join(map(str, right_key.columns))
+        else:
+            key_name = str(right_key.name)
+        counts = right_key.value_counts(dropna=True)
+        dup = counts[counts > 1]
+        fanout = self.rows_out / self.rows_in if self.rows_in else None
+
+        self.info["join"] = {
+            "right_key": key_name,
+            "right_rows": int(len(right_key)),
+            "right_keys": int(len(counts)),
+            "right_duplicate_keys": int(len(dup)),
+            "right_max_rows_per_key": int(counts.max()) if len(counts) else 0,
+            "fanout": None if fanout is None else round(fanout, 6),
+            "unmatched_left": None if unmatched is None else int(unmatched),
+        }
+        warnings = []
+        if len(dup):
+            examples = ", ".join(map(str, dup.index[:5]))
+            warnings.append(
+                f"{self.name}: {len(dup)} {key_name} values repeat on the "
+                f"right side (e.g. {examples}); many-to-many join"
+            )
+        if fanout is not None and fanout > 1:
+            warnings.append(
+                f"{self.name}: merge multiplied rows {fanout:.4f}x "
+                f"({self.rows_in} -> {self.rows_out})"
+            )
+        for w in warnings:
+            print(f"[report] WARNING {w}")
+        self.warnings += warnings
+
+    def record(self) -> dict:
+        out = {
+            "step": self.name,
+            "kind": self.kind,
+            "calls": self.calls,
+            "seconds": round(self.seconds, 3),
+            "rss_mb": _mb(self.rss),
+            "peak_rss_mb": _mb(self.peak_rss),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+        }
+        if self.rows_in and self.seconds > 0:
+            out["rows_per_s"] = round(self.rows_in / self.seconds)
+        return {**out, **self.info}
+
+
+class RunReport:
+    """
+    Collects the steps of one run (one stage script, or run_pipeline.py)
+    and writes them as JSON. Steps are kept by name in `steps`, in the
+    order they were first entered.
+    """
+
+    def __init__(self, run: str, out_dir: Path):
+        self.run = run
+        self.out_dir = Path(out_dir) / "run_reports"
+        self.started = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.t0 = time.perf_counter()
+        self.steps = {}
+        self.sampler = _Sampler()
+        self.sampler.start()
+
+    @contextlib.contextmanager
+    def step(self, name: str, kind: str, rows_in: int = None):
+        s = self.steps.get(name)
+        if s is None:
+            s = self.steps[name] = Step(name, kind)
+        if rows_in is not None:
+            s.add(rows_in=rows_in)
+
+        peak = [current_rss()]
+        with self.sampler.lock:
+            self.sampler.open.append(peak)
+        start = time.perf_counter()
+        try:
+            yield s
+        finally:
+            s.seconds += time.perf_counter() - start
+            s.calls += 1
+            s.rss = current_rss()
+            with self.sampler.lock:
+                self.sampler.open = [p for p in self.sampler.open if p is not peak]
+            s.peak_rss = max(s.peak_rss, peak[0], s.rss)
+
+    def iterate(self, chunks, name: str, kind: str = "load"):
+        """Yield from `chunks`, timing each read as a call of step `name`."""
+        it = iter(chunks)
+        while True:
+            with self.step(name, kind) as s:
+                chunk = next(it, None)
+                if chunk is not None:
+                    s.add(rows_out=len(chunk))
+            if chunk is None:
+                return
+            yield chunk
+
+    def as_dict(self) -> dict:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * _RSS_UNIT
+        return {
+            "run": self.run,
+            "started": self.started,
+            "seconds": round(time.perf_counter() - self.t0, 3),
+            "peak_rss_mb": _mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT),
+            "children_peak_rss_mb": _mb(children),
+            "machine": {
+                "platform": platform.platform(),
+                "python": platform.python_version(),
+                "cpus": os.cpu_count(),
+            },
+            "steps": [s.record() for s in self.steps.values()],
+            "warnings": [w for s in self.steps.values() for w in s.warnings],
+        }
+
+    def summary(self) -> str:
+        """Steps as a fixed-width table, slowest first."""
+        lines = [f"{'step':<44} {'kind':<9} {'seconds':>8} {'peak MB':>8} "
+                 f"{'rows in':>11} {'rows out':>11}"]
+        for s in sorted(self.steps.values(), key=lambda s: -s.seconds):
+            rows = [f"{n:>11,}" if n is not None else f"{'':>11}"
+                    for n in (s.rows_in, s.rows_out)]
+            lines.append(f"{s.name[:44]:<44} {s.kind:<9} {s.seconds:>8.2f} "
+                         f"{s.peak_rss / 2**20:>8.0f} {rows[0]} {rows[1]}")
+        return "\n".join(lines)
+
+    def write(self) -> Path:
+        """output/run_reports/<run>.json, plus a line in history.jsonl."""
+        self.sampler.stop.set()
+        report = self.as_dict()
+
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        path = self.out_dir / f"{self.run}.json"
+        path.write_text(json.dumps(report, indent=1))
+        with open(self.out_dir / "history.jsonl", "a") as f:
+            f.write(json.dumps(report) + "\n")
+
+        print(f"\n[report] {self.run}: {report['seconds']:.1f}s, "
+              f"peak {report['peak_rss_mb']:.0f} MB")
+        print(self.summary())
+        print(f"Saved run report to: {path}")
+        return path
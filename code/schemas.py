@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+schemas.py
+
+Declared column types for the raw and intermediate files, and the CSV
+readers every stage goes through.
+
+Instead of letting pandas infer types (object IDs, float64 everything,
+repeated state/county strings), each column gets a compact dtype from
+COLUMN_RULES:
+
+    facilid, utilid, Plant_Code, Utility_ID     Int32 (nullable)
+    year / month                                Int16 / Int8
+    capacity source N, generation source N      float32
+    State, County, FIPS columns                 category
+
+and each raw file declares which columns it needs (RAW_SCHEMAS), so
+anything else in the file is never parsed. Files are read with the
+multithreaded pyarrow CSV reader (streamed in record batches for the
+chunked EIA-923 path). If a numeric column holds text the fast reader
+cannot convert (thousands separators, "." for missing -- the cases
+`destring ..., ignore(",") force` handles in 03a_reg_shale_860.do), the
+file falls back to the pandas C reader with the same coercion.
+
+Usage
+-----
+from schemas import read_csv, iter_csv
+
+e860 = read_csv(DATA_RAW / "EIA_860.csv", "EIA_860")
+for chunk in iter_csv(DATA_RAW / "EIA_923.csv", "EIA_923", chunksize=500_000):
+    ...
+"""
+
+import importlib.util
+import re
+from pathlib import Path
+
+import pandas as pd
+
+
+HAVE_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+# First matching rule gives a column its dtype
+COLUMN_RULES = [
+    (r"facilid|utilid|Plant_Code|Utility_ID", "Int32"),
+    (r"year", "Int16"),
+    (r"month", "Int8"),
+    (r"(capacity|generation) source \d+", "float32"),
+    (r"Latitude|Longitude|shale_.*|valScore[WM]", "float64"),
+    (
+        r"State|County|state_clean|county_clean|FIPS_state|FIPS_county"
+        r"|FIPS_state_county_5digit|fips_5",
+        "category",
+    ),
+    (r"Plant_Name|Utility_Name|FIPS_match", "str"),
+]
+
+# Low-cardinality string columns stored as categoricals
+CATEGORY_COLS = [
+    "State",
+    "County",
+    "state_clean",
+    "county_clean",
+    "FIPS_state",
+    "FIPS_county",
+    "FIPS_state_county_5digit",
+    "fips_5",
+]
+
+# Raw inputs: columns to read (names or regexes) and per-file overrides.
+# Columns not listed here are skipped; add them to read more.
+RAW_SCHEMAS = {
+    "EIA_860": {
+        "usecols": ["facilid", "utilid", "year", r"capacity source \d+"],
+    },
+    "EIA_923": {
+        "usecols": ["facilid", "utilid", "year", "month", r"generation source \d+"],
+    },
+    "EIA_power_plant_location": {
+        "usecols": [
+            "Plant_Code", "Utility_ID", "Plant_Name", "Utility_Name",
+            "County", "State", "Longitude", "Latitude",
+        ],
+    },
+    # Crosswalk codes stay strings (leading zeros) and are small
+    "fips_state_codes": {
+        "usecols": ["govs_state_code", "state_name", "fips_state_code"],
+        "dtype": {".*": "str"},
+    },
+    "fips_county_codes_2007": {
+        "usecols": [
+            "govs_state_code", "county_name", "fips_state_code",
+            "fips_county_2007", "fips_state_county_2007",
+        ],
+        "dtype": {".*": "str"},
+    },
+    "rystad_county": {
+        "usecols": ["fips", "play", "valScoreW", "valScoreM"],
+    },
+    # County -> neighbor pairs; column names differ across versions
+    "county_adjacency": {
+        "usecols": [
+            "fipscounty", "fipsneighbor", "county_fips", "neighbor_fips",
+            "fips", "adj_fips", "fips_5", "fips_5_nbr",
+        ],
+    },
+}
+
+# capacity source N / generation source N -> fuel
+FUEL_CODES = {
+    1: "coal",
+    2: "oil",
+    3: "ng",
+    4: "wind",
+    5: "solar",
+    6: "hydro",
+    7: "biomass",
+    8: "nuclear",
+    9: "other_fossil",
+    10: "other_nonfossil",
+    11: "other_gas",
+    12: "other",
+}
+
+_NUMERIC = {"Int32", "Int16", "Int8", "float32", "float64"}
+
+
+def _match(pattern: str, column: str) -> bool:
+    return re.fullmatch(pattern, column) is not None
+
+
+def dtype_for(column: str, overrides: dict = None) -> str | None:
+    """Declared dtype of `column` (None: leave to pandas)."""
+    for pattern, dtype in list((overrides or {}).items()) + COLUMN_RULES:
+        if _match(pattern, column):
+            return dtype
+    return None
+
+
+def dtypes_for(columns, overrides: dict = None) -> dict:
+    """{column: dtype} for the declared columns among `columns`."""
+    out = {}
+    for c in columns:
+        dtype = dtype_for(c, overrides)
+        if dtype is not None:
+            out[c] = dtype
+    return out
+
+
+def resolve(name: str, header, columns=None) -> tuple[list, dict]:
+    """
+    Columns to read and their dtypes for raw file `name`, given the file's
+    header. `columns` narrows the selection further (projection).
+    """
+    schema = RAW_SCHEMAS[name]
+    usecols = [
+        c for c in header
+        if any(_match(p, c) for p in schema["usecols"])
+        and (columns is None or c in columns)
+    ]
+    return usecols, dtypes_for(usecols, schema.get("dtype"))
+
+
+def as_id(s: pd.Series) -> pd.Series:
+    """Numeric ID as Int32 (non-numeric -> <NA>), as the readers produce."""
+    if s.dtype == "Int32":
+        return s
+    return pd.to_numeric(s, errors="coerce").astype("Int32")
+
+
+def coerce(df: pd.DataFrame, dtype: dict) -> pd.DataFrame:
+    """Cast `df` to `dtype`, forcing unparseable numbers to missing."""
+    for c, t in dtype.items():
+        if c not in df.columns or df[c].dtype == t:
+            continue
+        if t in _NUMERIC:
+            s = df[c]
+            if not pd.api.types.is_numeric_dtype(s):
+                s = pd.to_numeric(s.astype(str).str.replace(",", ""), errors="coerce")
+            df[c] = s.astype(t)
+        else:
+            df[c] = df[c].astype(t)
+    return df
+
+
+# ------------------------------------------------------------------
+# pyarrow fast path
+# ------------------------------------------------------------------
+def _arrow_options(usecols: list, dtype: dict):
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    arrow_types = {
+        "Int32": pa.int32(), "Int16": pa.int16(), "Int8": pa.int8(),
+        "float32": pa.float32(), "float64": pa.float64(), "str": pa.string(),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+    }
+    convert = pacsv.ConvertOptions(
+        include_columns=usecols,
+        column_types={c: arrow_types[t] for c, t in dtype.items()},
+        strings_can_be_null=True,
+    )
+    return convert
+
+
+def _to_pandas(table, release: bool = False) -> pd.DataFrame:
+    import pyarrow as pa
+
+    # Keep integer IDs integer when they have missing values
+    nullable = {pa.int32(): pd.Int32Dtype(), pa.int16(): pd.Int16Dtype(), pa.int8(): pd.Int8Dtype()}
+    # release: free the Arrow buffers column by column while converting
+    # (lower peak memory; the table is unusable afterwards)
+    return table.to_pandas(
+        types_mapper=nullable.get, split_blocks=release, self_destruct=release
+    )
+
+
+def _header(path: Path) -> list:
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+# ------------------------------------------------------------------
+# Readers
+# ------------------------------------------------------------------
+def read_csv(path: Path, name: str, columns=None) -> pd.DataFrame:
+    """Read raw CSV `path` with the declared columns and dtypes of `name`."""
+    usecols, dtype = resolve(name, _header(path), columns)
+
+    if HAVE_PYARROW:
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+        try:
+            table = pacsv.read_csv(path, convert_options=_arrow_options(usecols, dtype))
+            return _to_pandas(table, release=True)[usecols]
+        except pa.ArrowInvalid:
+            pass
+
+    df = pd.read_csv(path, usecols=usecols, dtype=_text_dtype(dtype))
+    return coerce(df, dtype)[usecols]
+
+
+def iter_csv(path: Path, name: str, chunksize: int, columns=None):
+    """Yield raw CSV `path` in chunks of `chunksize` rows, typed as `name`."""
+    usecols, dtype = resolve(name, _header(path), columns)
+
+    done = 0
+    if HAVE_PYARROW:
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+        try:
+            reader = pacsv.open_csv(
+                path,
+                read_options=pacsv.ReadOptions(block_size=16 << 20),
+                convert_options=_arrow_options(usecols, dtype),
+            )
+            pending, n_pending = [], 0
+            for batch in reader:
+                pending.append(batch)
+                n_pending += batch.num_rows
+                while n_pending >= chunksize:
+                    table = pa.Table.from_batches(pending)
+                    yield _to_pandas(table.slice(0, chunksize))[usecols]
+                    done += chunksize
+                    pending = table.slice(chunksize).to_batches()
+                    n_pending -= chunksize
+            if n_pending:
+                yield _to_pandas(pa.Table.from_batches(pending))[usecols]
+            return
+        except pa.ArrowInvalid:
+            # Resume after the rows already yielded with the lenient reader
+            pass
+
+    chunks = pd.read_csv(
+        path,
+        usecols=usecols,
+        dtype=_text_dtype(dtype),
+        chunksize=chunksize,
+        skiprows=range(1, done + 1),
+    )
+    for chunk in chunks:
+        yield coerce(chunk, dtype)[usecols]
+
+
+def _text_dtype(dtype: dict) -> dict:
+    """Lenient-reader dtypes: numerics as text (coerced after), rest as declared."""
+    return {c: ("str" if t in _NUMERIC else t) for c, t in dtype.items()}
+
+
+def read_dta(path: Path, name: str) -> pd.DataFrame:
+    """Read Stata file `path` with the declared columns of `name`."""
+    with pd.read_stata(path, iterator=True) as reader:
+        header = list(reader.variable_labels())
+    usecols, dtype = resolve(name, header)
+    df = pd.read_stata(path, columns=usecols, convert_categoricals=False)
+    return coerce(df, dtype)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+shale_exposure.py
+
+Rystad shale prospectivity as a sparse county x play matrix, for
+exposure indices beyond the two collapsed scores 02d merges onto plants
+(shale_valScoreW_sum, shale_valScoreM_max).
+
+rystad_county.dta (fips, play, valScoreW, valScoreM) is loaded once into
+two CSR matrices W and M (rows: 5-digit FIPS, columns: plays) and saved
+as data_intermediate/rystad_county_play.npz, rebuilt when the .dta
+changes. Any county exposure index is then a sparse product or a row
+reduction over it
+
+    total      W @ 1                      (= shale_valScoreW_sum)
+    play p     W[:, p]
+    weighted   W @ w                      (price-, reserve-weighted, ...)
+    top k      sum of each row's k largest scores
+
+computed once per county and attached to the county-year panel by FIPS
+position (attach), instead of being merged onto every plant row.
+
+Usage
+-----
+from shale_exposure import load_exposure
+
+expo = load_exposure(data_int, data_raw / "Rystad" / "rystad_county.dta")
+cty["shale_marcellus"] = expo.attach(cty, expo.play("Marcellus"))
+cty["shale_top2"] = expo.attach(cty, expo.top_k(2))
+cty["shale_priced"] = expo.attach(cty, expo.weighted({"Marcellus": 1.0, "Permian": 0.6}))
+"""
+
+import hashlib
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from schemas import read_dta
+from spatial import fips5
+
+
+EXPOSURE_VERSION = 1
+
+EXPOSURE_FILE = "rystad_county_play.npz"
+
+
+def play_column(play: str) -> str:
+    """Panel column name of a play's score, e.g. 'Eagle Ford' -> shale_play_eagle_ford."""
+    return "shale_play_" + re.sub(r"[^a-z0-9]+", "_", str(play).lower()).strip("_")
+
+
+class PlayExposure:
+    """County x play Rystad scores (valScoreW in W, valScoreM in M), CSR."""
+
+    def __init__(self, fips, plays, W: sp.csr_matrix, M: sp.csr_matrix,
+                 source_digest: str = ""):
+        self.fips = pd.Index(fips)
+        self.plays = pd.Index(plays)
+        self.W = W.tocsr()
+        self.M = M.tocsr()
+        self.source_digest = source_digest
+
+    @classmethod
+    def from_rystad(cls, rystad: pd.DataFrame, source_digest: str = ""):
+        """Rows of (fips, play, valScoreW, valScoreM); repeated pairs are summed (W) / maxed (M)."""
+        df = pd.DataFrame({
+            "fips": fips5(rystad["fips"]).to_numpy(),
+            "play": rystad["play"].astype(str).str.strip().to_numpy(),
+            "W": rystad["valScoreW"].to_numpy(dtype=np.float64),
+            "M": rystad["valScoreM"].to_numpy(dtype=np.float64),
+        })
+        fips = pd.Index(np.unique(df["fips"]))
+        plays = pd.Index(np.unique(df["play"]))
+        shape = (len(fips), len(plays))
+
+        def matrix(frame: pd.DataFrame, col: str) -> sp.csr_matrix:
+            frame = frame[frame[col].notna()]
+            i = fips.get_indexer(frame["fips"])
+            j = plays.get_indexer(frame["play"])
+            return sp.csr_matrix((frame[col].to_numpy(), (i, j)), shape=shape)
+
+        # COO -> CSR sums repeated (fips, play) pairs, as the W sum does;
+        # M takes their max
+        W = matrix(df, "W")
+        M = matrix(df.groupby(["fips", "play"], as_index=False)["M"].max(), "M")
+        return cls(fips, plays, W, M, source_digest)
+
+    # ------------------------------------------------------------------
+    # Persist
+    # ------------------------------------------------------------------
+    def save(self, path: Path):
+        arrays = {"version": np.array(EXPOSURE_VERSION),
+                  "fips": self.fips.to_numpy(dtype=str),
+                  "plays": self.plays.to_numpy(dtype=str),
+                  "source_digest": np.array(self.source_digest)}
+        for name, X in [("W", self.W), ("M", self.M)]:
+            arrays.update({f"{name}_data": X.data, f"{name}_indices": X.indices,
+                           f"{name}_indptr": X.indptr})
+        tmp = Path(path).with_name(Path(path).name + ".tmp.npz")
+        np.savez(tmp, **arrays)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path):
+        with np.load(path, allow_pickle=False) as z:
+            if int(z["version"]) != EXPOSURE_VERSION:
+                return None
+            shape = (len(z["fips"]), len(z["plays"]))
+            W, M = (
+                sp.csr_matrix((z[f"{n}_data"], z[f"{n}_indices"], z[f"{n}_indptr"]), shape=shape)
+                for n in ("W", "M")
+            )
+            return cls(z["fips"], z["plays"], W, M, str(z["source_digest"]))
+
+    # ------------------------------------------------------------------
+    # Exposure indices (one value per county, aligned with self.fips)
+    # ------------------------------------------------------------------
+    def _scores(self, score: str) -> sp.csr_matrix:
+        if score not in ("W", "M"):
+            raise ValueError(f"Unknown score '{score}' (expected 'W' or 'M')")
+        return self.W if score == "W" else self.M
+
+    def total(self, score: str = "W") -> np.ndarray:
+        """Sum over plays (valScoreW: shale_valScoreW_sum)."""
+        return np.asarray(self._scores(score).sum(axis=1)).ravel()
+
+    def best(self, score: str = "M") -> np.ndarray:
+        """Max over plays (valScoreM: shale_valScoreM_max)."""
+        return self._scores(score).max(axis=1).toarray().ravel()
+
+    def play(self, play: str, score: str = "W") -> np.ndarray:
+        """Score of one play."""
+        j = self.plays.get_loc(play)
+        return self._scores(score)[:, j].toarray().ravel()
+
+    def weighted(self, weights, score: str = "W") -> np.ndarray:
+        """
+        S @ w for play weights `weights` ({play: weight}, plays not
+        listed weigh 0, or a vector aligned with self.plays).
+        """
+        if isinstance(weights, dict):
+            unknown = set(weights) - set(self.plays)
+            if unknown:
+                raise KeyError(f"Unknown plays {sorted(unknown)}")
+            w = np.zeros(len(self.plays))
+            w[self.plays.get_indexer(list(weights))] = list(weights.values())
+        else:
+            w = np.asarray(weights, dtype=np.float64)
+        return self._scores(score) @ w
+
+    def top_k(self, k: int, score: str = "W") -> np.ndarray:
+        """Sum of each county's k highest play scores."""
+        S = self._scores(score)
+        counts = np.diff(S.indptr)
+        if counts.max(initial=0) <= k:
+            return self.total(score)
+        # Rows padded to a dense (n_counties x max plays per county) block
+        width = counts.max()
+        dense = np.zeros((S.shape[0], width))
+        rows = np.repeat(np.arange(S.shape[0]), counts)
+        cols = np.arange(len(S.data)) - np.repeat(S.indptr[:-1], counts)
+        dense[rows, cols] = S.data
+        return -np.sort(-dense, axis=1)[:, :k].sum(axis=1)
+
+    def by_play(self, score: str = "W") -> dict:
+        """{play_column(play): score of that play} for every play."""
+        S = self._scores(score).tocsc()
+        return {play_column(p): S[:, j].toarray().ravel() for j, p in enumerate(self.plays)}
+
+    # ------------------------------------------------------------------
+    # Panel
+    # ------------------------------------------------------------------
+    def attach(self, panel: pd.DataFrame, values: np.ndarray,
+               fips_col: str = "fips_5") -> pd.Series:
+        """County `values` (aligned with self.fips) for each panel row; 0 outside Rystad."""
+        pos = self.fips.get_indexer(panel[fips_col].astype(str))
+        out = np.zeros(len(panel))
+        out[pos >= 0] = np.asarray(values, dtype=np.float64)[pos[pos >= 0]]
+        return pd.Series(out, index=panel.index)
+
+
+def _digest(path: Path) -> str:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def load_exposure(data_int: Path, rystad_path: Path) -> PlayExposure:
+    """Load data_intermediate/rystad_county_play.npz, rebuilding it if stale."""
+    out = Path(data_int) / EXPOSURE_FILE
+    digest = _digest(rystad_path)
+
+    if out.exists():
+        expo = PlayExposure.load(out)
+        if expo is not None and expo.source_digest == digest:
+            return expo
+
+    expo = PlayExposure.from_rystad(read_dta(rystad_path, "rystad_county"), digest)
+    expo.save(out)
+    print(f"Built county x play exposure matrix: {out} "
+          f"({len(expo.fips)} counties x {len(expo.plays)} plays, {expo.W.nnz} scores)")
+    return expo
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+spatial.py
+
+County adjacency as a sparse matrix, for spillover regressors.
+
+data_raw/county_adjacency.dta (county -> neighbor FIPS pairs, e.g. the
+Census / NBER county adjacency file) is loaded once into a symmetric CSR
+matrix A indexed by 5-digit FIPS, matching `fips_5` in 03a_reg_shale_860.py.
+Neighbor averages over a county-year panel are then sparse products
+
+    mean_nbr = (A @ V) / (A @ M)
+
+with V the (county x year) value matrix and M its "observed" mask. The
+panel helpers average over every adjacent county in the file: a county
+missing from the scores, or a county-year missing from the panel (no
+plant, so no capacity), counts as 0, so the regressors follow geography
+rather than where plants happen to be. All years are handled in one
+product, instead of self-merging the panel on the neighbor list. k-hop
+exposure uses the matrix of counties reachable within k steps,
+(A + I)^k > 0 without the diagonal.
+
+Usage
+-----
+from spatial import load_adjacency, county_neighbor_mean, panel_neighbor_mean
+
+adj = load_adjacency(DATA_RAW / "county_adjacency.dta")
+expo = load_exposure(DATA_INT, DATA_RAW / "Rystad" / "rystad_county.dta")   # shale_exposure.py
+shale_index = pd.Series(np.log1p(expo.total()), index=expo.fips, name="shale_index")
+cty["nbr_shale_index"] = county_neighbor_mean(cty, shale_index, adj)
+cty["nbr_cap_coal_lag1"] = panel_neighbor_mean(cty, "cap_coal", adj, lag=1)
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from schemas import read_dta
+
+
+# (county, neighbor) column pairs used by common versions of the file
+PAIR_COLUMNS = [
+    ("fipscounty", "fipsneighbor"),
+    ("county_fips", "neighbor_fips"),
+    ("fips", "neighbor_fips"),
+    ("fips", "adj_fips"),
+    ("fips_5", "fips_5_nbr"),
+]
+
+
+def fips5(s: pd.Series) -> pd.Series:
+    """5-digit FIPS strings from numeric or string codes."""
+    if pd.api.types.is_numeric_dtype(s):
+        s = s.astype("Int64")
+    return s.astype(str).str.strip().str.zfill(5)
+
+
+class CountyAdjacency:
+    """Binary county adjacency (no self-loops) with k-hop reach matrices."""
+
+    def __init__(self, fips, A: sp.csr_matrix):
+        self.fips = pd.Index(fips)
+        self.A = A.tocsr()
+        self._within = {1: self.A}
+
+    @classmethod
+    def from_pairs(cls, county: pd.Series, neighbor: pd.Series):
+        county = fips5(county).to_numpy()
+        neighbor = fips5(neighbor).to_numpy()
+
+        fips = pd.Index(np.union1d(county, neighbor))
+        i = fips.get_indexer(county)
+        j = fips.get_indexer(neighbor)
+
+        # Symmetrize, drop self-pairs (the NBER file lists each county as
+        # its own neighbor) and duplicate pairs
+        keep = i != j
+        rows = np.concatenate([i[keep], j[keep]])
+        cols = np.concatenate([j[keep], i[keep]])
+        n = len(fips)
+        A = sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, n))
+        A.data[:] = 1.0
+        return cls(fips, A)
+
+    @property
+    def n_counties(self) -> int:
+        return len(self.fips)
+
+    def within(self, k: int = 1) -> sp.csr_matrix:
+        """Counties reachable in 1..k steps (binary, no diagonal)."""
+        if k not in self._within:
+            step = self.A + sp.identity(self.n_counties, format="csr")
+            reach = step
+            for _ in range(k - 1):
+                reach = reach @ step
+                reach.data[:] = 1.0
+            reach = reach.tolil()
+            reach.setdiag(0)
+            reach = reach.tocsr()
+            reach.eliminate_zeros()
+            reach.data[:] = 1.0
+            self._within[k] = reach
+        return self._within[k]
+
+    def positions(self, fips: pd.Series) -> np.ndarray:
+        """Row of each FIPS in the matrix (-1 if not in the file)."""
+        return self.fips.get_indexer(fips5(fips))
+
+    def neighbor_mean(self, V: np.ndarray, M: np.ndarray, k: int = 1) -> np.ndarray:
+        """
+        Average of V over each county's (k-hop) neighbors, counting only
+        entries with M true. V, M: (n_counties,) or (n_counties, n_years).
+        NaN where no neighbor is observed.
+        """
+        W = self.within(k)
+        num = W @ np.where(M, V, 0.0)
+        den = W @ M.astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(den > 0, num / den, np.nan)
+
+
+def load_adjacency(path: Path) -> CountyAdjacency:
+    """Read the county adjacency .dta into a CountyAdjacency."""
+    df = read_dta(path, "county_adjacency")
+    for county_col, neighbor_col in PAIR_COLUMNS:
+        if county_col in df.columns and neighbor_col in df.columns:
+            pairs = df[[county_col, neighbor_col]].dropna()
+            return CountyAdjacency.from_pairs(pairs[county_col], pairs[neighbor_col])
+    raise KeyError(f"No (county, neighbor) FIPS columns among {list(df.columns)}")
+
+
+# ------------------------------------------------------------------
+# Panel helpers
+# ------------------------------------------------------------------
+def county_neighbor_mean(
+    panel: pd.DataFrame,
+    values: pd.Series,
+    adj: CountyAdjacency,
+    k: int = 1,
+    fips_col: str = "fips_5",
+) -> pd.Series:
+    """
+    Neighbor (within k hops) average of a county-level variable that is
+    constant over time, `values` indexed by FIPS (e.g. shale_index of
+    every Rystad county), aligned with `panel`. Every adjacent county
+    counts; those missing from `values` count as 0.
+    """
+    vpos = adj.positions(pd.Series(values.index))
+    ok = vpos >= 0
+    V = np.zeros(adj.n_counties)
+    V[vpos[ok]] = values.fillna(0.0).to_numpy(dtype=np.float64)[ok]
+
+    mean = adj.neighbor_mean(V, np.ones(adj.n_counties, dtype=bool), k=k)
+    pos = adj.positions(panel[fips_col])
+    out = np.full(len(panel), np.nan)
+    out[pos >= 0] = mean[pos[pos >= 0]]
+    return pd.Series(out, index=panel.index, name=f"nbr_{values.name or 'value'}")
+
+
+def panel_neighbor_mean(
+    panel: pd.DataFrame,
+    col: str,
+    adj: CountyAdjacency,
+    k: int = 1,
+    lag: int = 0,
+    fips_col: str = "fips_5",
+    year_col: str = "year",
+) -> pd.Series:
+    """
+    Neighbor average of `col` in year t - `lag` for each county-year row
+    of `panel` (one row per county-year), over every adjacent county; a
+    neighbor without a row that year counts as 0 (e.g. no capacity).
+    """
+    pos = adj.positions(panel[fips_col])
+    year = panel[year_col].to_numpy(dtype=np.int64)
+    years = pd.Index(np.unique(year))
+    t = years.get_indexer(year)
+
+    values = panel[col].to_numpy(dtype=np.float64)
+    ok = (pos >= 0) & ~np.isnan(values)
+
+    V = np.zeros((adj.n_counties, len(years)))
+    V[pos[ok], t[ok]] = values[ok]
+
+    mean = adj.neighbor_mean(V, np.ones(V.shape, dtype=bool), k=k)
+
+    # Read year t - lag (NaN when that year is not in the panel)
+    src = years.get_indexer(year - lag)
+    out = np.full(len(panel), np.nan)
+    hit = (pos >= 0) & (src >= 0)
+    out[hit] = mean[pos[hit], src[hit]]
+    return pd.Series(out, index=panel.index, name=f"nbr_{col}_lag{lag}")
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+synth_data.py
+
+Synthetic stand-ins for the raw inputs, for measuring the pipeline
+without the private data (the real files are Git LFS objects).
+
+Writes the same files, columns and code formats the stages read:
+
+    data_raw/EIA_860.csv                     facilid, utilid, year, capacity source 1..12
+    data_raw/EIA_923.csv                     ... + month, generation source 1..12
+    data_raw/EIA_power_plant_location.csv    Plant_Code, Utility_ID, names, County, State, lon/lat
+    data_raw/Rystad/rystad_county.dta        fips, play, valScoreW, valScoreM
+    data_raw/county_adjacency.dta            fipscounty, fipsneighbor (NBER layout)
+    data_intermediate/fips_state_codes.csv   (what 02a_build_fips_crosswalk exports)
+    data_intermediate/fips_county_codes_2007.csv
+
+Scale 1 is about the size of the real files (20,000 plants, 250k
+plant-years in EIA 860, 3M plant-months in EIA 923); --scale 10 and 100
+multiply the plants. Counties, crosswalks and Rystad stay
+national-sized. Location names carry the kinds of noise fips_index.py
+resolves (USPS state codes, "County" suffixes, "St." for "Saint", typos,
+missing names), and some plants have no location row. Plant blocks are
+generated and appended one at a time, so memory does not grow with scale.
+
+A manifest.json with the row counts of every file is written next to
+data_raw/ (used by benchmark.py for throughput).
+
+Usage
+-----
+python code/synth_data.py --root /tmp/shale_synth --scale 1
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from fips_index import USPS_STATES
+from schemas import FUEL_CODES, HAVE_PYARROW
+
+
+GENERATOR_VERSION = 1
+
+PLANTS_PER_SCALE = 20_000
+YEARS = range(2001, 2021)
+PLAYS = ["Marcellus", "Utica", "Haynesville", "Barnett", "Eagle Ford",
+         "Bakken", "Permian", "Fayetteville", "Woodford", "Niobrara"]
+
+# Plants generated (and appended) per block
+BLOCK_PLANTS = 5_000
+
+# FIPS state code of each state (USPS_STATES order)
+STATE_FIPS = {
+    "AL": "01", "AK": "02", "AZ": "04", "AR": "05", "CA": "06", "CO": "08",
+    "CT": "09", "DE": "10", "DC": "11", "FL": "12", "GA": "13", "HI": "15",
+    "ID": "16", "IL": "17", "IN": "18", "IA": "19", "KS": "20", "KY": "21",
+    "LA": "22", "ME": "23", "MD": "24", "MA": "25", "MI": "26", "MN": "27",
+    "MS": "28", "MO": "29", "MT": "30", "NE": "31", "NV": "32", "NH": "33",
+    "NJ": "34", "NM": "35", "NY": "36", "NC": "37", "ND": "38", "OH": "39",
+    "OK": "40", "OR": "41", "PA": "42", "RI": "44", "SC": "45", "SD": "46",
+    "TN": "47", "TX": "48", "UT": "49", "VT": "50", "VA": "51", "WA": "53",
+    "WV": "54", "WI": "55", "WY": "56",
+}
+
+# Shares of location rows with each kind of name noise
+NOISE = {
+    "usps_state": 0.10,       # "TX" instead of "Texas"
+    "county_suffix": 0.08,    # "Harris County"
+    "typo": 0.01,             # one letter dropped (fuzzy tier)
+    "missing_county": 0.005,
+}
+MISSING_LOCATION = 0.02       # plants in EIA files without a location row
+
+_SYLLABLES = ["ad", "al", "an", "ar", "ber", "bur", "cal", "car", "der", "dor",
+              "el", "en", "fay", "for", "gar", "ham", "har", "jef", "ken", "lan",
+              "lin", "mad", "mar", "mon", "nor", "ol", "per", "ran", "ros", "sal",
+              "son", "ton", "van", "war", "wil", "win", "york"]
+
+
+# ------------------------------------------------------------------
+# Geography & crosswalks
+# ------------------------------------------------------------------
+def make_counties(rng: np.random.Generator) -> pd.DataFrame:
+    """~3,100 counties: state, FIPS, GOVS codes, a name and a map position."""
+    rows = []
+    states = list(USPS_STATES)
+    n_counties = rng.integers(5, 120, size=len(states))
+    for s_i, usps in enumerate(states):
+        for c in range(n_counties[s_i]):
+            parts = rng.choice(_SYLLABLES, size=rng.integers(2, 4))
+            name = "".join(parts).capitalize()
+            if rng.random() < 0.03:
+                name = "Saint " + name
+            rows.append({
+                "usps": usps,
+                "state_name": USPS_STATES[usps],
+                "fips_state_code": STATE_FIPS[usps],
+                "fips_county_2007": f"{2 * c + 1:03d}",
+                "govs_state_code": f"{s_i + 1:02d}",
+                "govs_county_code": f"{c + 1:03d}",
+                "name": name,
+                "lon": -124 + (s_i % 10) * 5.5 + rng.random() * 5,
+                "lat": 26 + (s_i // 10) * 4.5 + rng.random() * 4,
+            })
+    counties = pd.DataFrame(rows)
+    # Names must be unique within a state for the crosswalk
+    dup = counties.duplicated(["usps", "name"])
+    counties.loc[dup, "name"] = counties.loc[dup, "name"] + "ville"
+    counties = counties.drop_duplicates(["usps", "name"], ignore_index=True)
+    counties["fips_5"] = counties["fips_state_code"] + counties["fips_county_2007"]
+    return counties
+
+
+def write_crosswalks(counties: pd.DataFrame, data_int: Path) -> dict:
+    state = (
+        counties[["govs_state_code", "state_name", "fips_state_code"]]
+        .drop_duplicates(ignore_index=True)
+    )
+    state.to_csv(data_int / "fips_state_codes.csv", index=False)
+
+    county = pd.DataFrame({
+        "govs_id": counties["govs_state_code"] + counties["govs_county_code"],
+        "govs_state_code": counties["govs_state_code"],
+        "govs_county_code": counties["govs_county_code"],
+        "county_name": counties["name"].str.upper(),
+        "fips_state_code": counties["fips_state_code"],
+        "fips_county_2002": counties["fips_county_2007"],
+        "fips_county_2007": counties["fips_county_2007"],
+        "fips_state_county_2007": counties["fips_5"],
+    })
+    county.to_csv(data_int / "fips_county_codes_2007.csv", index=False)
+    return {"fips_state_codes": len(state), "fips_county_codes_2007": len(county)}
+
+
+def write_rystad(counties: pd.DataFrame, rng: np.random.Generator, path: Path) -> int:
+    """County x play prospectivity for ~20% of counties."""
+    shale = counties.sample(frac=0.2, random_state=int(rng.integers(1 << 31)))
+    rows = []
+    for fips in shale["fips_5"]:
+        for play in rng.choice(PLAYS, size=rng.integers(1, 4), replace=False):
+            rows.append((int(fips), play, rng.exponential(2.0), rng.exponential(1.0)))
+    ry = pd.DataFrame(rows, columns=["fips", "play", "valScoreW", "valScoreM"])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    ry.to_stata(path, write_index=False)
+    return len(ry)
+
+
+def write_adjacency(counties: pd.DataFrame, path: Path) -> int:
+    """NBER-style pairs: each county, itself, and its map neighbors."""
+    xy = counties[["lon", "lat"]].to_numpy()
+    fips = counties["fips_5"].to_numpy()
+    pairs = []
+    for i in range(len(counties)):
+        d = np.hypot(*(xy - xy[i]).T)
+        for j in np.argsort(d)[:7]:          # itself + 6 nearest
+            pairs.append((fips[i], fips[j]))
+    adj = pd.DataFrame(pairs, columns=["fipscounty", "fipsneighbor"])
+    adj.insert(0, "countyname", "C" + adj["fipscounty"])
+    adj.insert(2, "neighborname", "C" + adj["fipsneighbor"])
+    adj.to_stata(path, write_index=False)
+    return len(adj)
+
+
+# ------------------------------------------------------------------
+# Plants
+# ------------------------------------------------------------------
+def _noisy_names(plants: pd.DataFrame, rng: np.random.Generator) -> pd.DataFrame:
+    n = len(plants)
+    state = plants["state_name"].str.title()
+    usps = rng.random(n) < NOISE["usps_state"]
+    state = state.where(~usps, plants["usps"])
+
+    county = plants["name"].copy()
+    saint = county.str.startswith("Saint ")
+    county = county.where(~saint, county.str.replace("Saint ", "St. ", regex=False))
+    suffix = rng.random(n) < NOISE["county_suffix"]
+    county = county.where(~suffix, county + " County")
+    typo = (rng.random(n) < NOISE["typo"]) & (county.str.len() > 6)
+    county = county.where(~typo, county.str.slice_replace(3, 4, ""))
+    county = county.where(rng.random(n) >= NOISE["missing_county"])
+    return pd.DataFrame({"State": state, "County": county})
+
+
+def make_plants(counties: pd.DataFrame, n_plants: int, rng: np.random.Generator) -> pd.DataFrame:
+    """Plant attributes: county, utility, fuels, size and active years."""
+    cty = counties.sample(n_plants, replace=True, random_state=int(rng.integers(1 << 31)))
+    plants = cty.reset_index(drop=True)
+    plants["Plant_Code"] = np.arange(1, n_plants + 1)
+    plants["Utility_ID"] = rng.integers(1, max(n_plants // 4, 2), size=n_plants)
+    plants["fuel"] = rng.choice(list(FUEL_CODES), size=n_plants,
+                                p=_fuel_shares())
+    plants["fuel2"] = np.where(rng.random(n_plants) < 0.15,
+                               rng.choice(list(FUEL_CODES), size=n_plants), 0)
+    plants["mw"] = rng.lognormal(3.0, 1.5, size=n_plants).round(1)
+    first = YEARS.start - 10 + rng.integers(0, 30, size=n_plants)
+    plants["entry"] = np.clip(first, YEARS.start, YEARS.stop - 1)
+    life = rng.integers(5, 60, size=n_plants)
+    plants["exit"] = np.minimum(first + life, YEARS.stop - 1)
+    plants = plants[plants["exit"] >= plants["entry"]].reset_index(drop=True)
+    plants["lon"] += rng.normal(0, 0.2, size=len(plants))
+    plants["lat"] += rng.normal(0, 0.2, size=len(plants))
+    return plants
+
+
+def _fuel_shares() -> np.ndarray:
+    # coal, oil, ng, wind, solar, hydro, biomass, nuclear, other fossil,
+    # other non-fossil, other gas, other
+    w = np.array([8, 10, 20, 12, 25, 12, 5, 1, 2, 2, 1, 2], dtype=float)
+    return w / w.sum()
+
+
+def location_rows(plants: pd.DataFrame, rng: np.random.Generator) -> pd.DataFrame:
+    has_loc = rng.random(len(plants)) >= MISSING_LOCATION
+    p = plants.loc[has_loc]
+    names = _noisy_names(p, rng)
+    return pd.DataFrame({
+        "Plant_Code": p["Plant_Code"].to_numpy(),
+        "Utility_ID": p["Utility_ID"].to_numpy(),
+        "Plant_Name": "Plant " + p["Plant_Code"].astype(str).to_numpy(),
+        "Utility_Name": "Utility " + p["Utility_ID"].astype(str).to_numpy(),
+        "County": names["County"].to_numpy(),
+        "State": names["State"].to_numpy(),
+        "Longitude": p["lon"].round(4).to_numpy(),
+        "Latitude": p["lat"].round(4).to_numpy(),
+    })
+
+
+def plant_years(plants: pd.DataFrame) -> pd.DataFrame:
+    """One row per plant and active year with its capacity by source."""
+    n_years = (plants["exit"] - plants["entry"] + 1).to_numpy()
+    idx = np.repeat(np.arange(len(plants)), n_years)
+    start = np.repeat(np.cumsum(n_years) - n_years, n_years)
+    p = plants.iloc[idx]
+    out = pd.DataFrame({
+        "facilid": p["Plant_Code"].to_numpy(),
+        "utilid": p["Utility_ID"].to_numpy(),
+        "year": p["entry"].to_numpy() + (np.arange(len(idx)) - start),
+    })
+    fuel = p["fuel"].to_numpy()
+    fuel2 = p["fuel2"].to_numpy()
+    mw = p["mw"].to_numpy()
+    for k in FUEL_CODES:
+        out[f"capacity source {k}"] = np.where(fuel == k, mw, 0.0) + np.where(fuel2 == k, mw / 4, 0.0)
+    return out
+
+
+def plant_months(e860: pd.DataFrame, rng: np.random.Generator) -> pd.DataFrame:
+    """Monthly generation for every plant-year: capacity x capacity factor x hours."""
+    n = len(e860)
+    idx = np.repeat(np.arange(n), 12)
+    out = pd.DataFrame({
+        "facilid": e860["facilid"].to_numpy()[idx],
+        "utilid": e860["utilid"].to_numpy()[idx],
+        "year": e860["year"].to_numpy()[idx],
+        "month": np.tile(np.arange(1, 13), n),
+    })
+    cf = rng.beta(2, 5, size=len(out))
+    for k in FUEL_CODES:
+        cap = e860[f"capacity source {k}"].to_numpy()[idx]
+        out[f"generation source {k}"] = (cap * cf * 730).round(1)
+    return out
+
+
+class CsvAppender:
+    """Append DataFrames to one CSV (pyarrow writer when available)."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.writer = None
+        self.first = True
+
+    def write(self, df: pd.DataFrame):
+        if HAVE_PYARROW:
+            import pyarrow as pa
+            import pyarrow.csv as pacsv
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self.writer is None:
+                # Plain header line, as the EIA files have (Arrow quotes it)
+                self.sink = open(self.path, "wb")
+                self.sink.write((",".join(df.columns) + "\n").encode())
+                self.writer = pacsv.CSVWriter(
+                    self.sink, table.schema,
+                    write_options=pacsv.WriteOptions(include_header=False,
+                                                     quoting_style="needed"),
+                )
+            self.writer.write_table(table)
+        else:
+            df.to_csv(self.path, mode="w" if self.first else "a",
+                      header=self.first, index=False)
+        self.first = False
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.sink.close()
+
+
+# ------------------------------------------------------------------
+# Driver
+# ------------------------------------------------------------------
+def generate(root: Path, scale: float = 1.0, seed: int = 0) -> dict:
+    """Write a synthetic data_raw / data_intermediate tree under `root`."""
+    root = Path(root)
+    data_raw = root / "data_raw"
+    data_int = root / "data_intermediate"
+    for d in [data_raw, data_int, root / "output"]:
+        d.mkdir(parents=True, exist_ok=True)
+
+    rng = np.random.default_rng(seed)
+    counties = make_counties(rng)
+
+    rows = write_crosswalks(counties, data_int)
+    rows["rystad_county"] = write_rystad(counties, rng, data_raw / "Rystad" / "rystad_county.dta")
+    rows["county_adjacency"] = write_adjacency(counties, data_raw / "county_adjacency.dta")
+
+    n_plants = int(round(PLANTS_PER_SCALE * scale))
+    rows.update({"EIA_power_plant_location": 0, "EIA_860": 0, "EIA_923": 0})
+    plants_all = make_plants(counties, n_plants, rng)
+
+    out = {name: CsvAppender(data_raw / f"{name}.csv")
+           for name in ["EIA_power_plant_location", "EIA_860", "EIA_923"]}
+    for start in range(0, len(plants_all), BLOCK_PLANTS):
+        plants = plants_all.iloc[start:start + BLOCK_PLANTS]
+        loc = location_rows(plants, rng)
+        e860 = plant_years(plants)
+        e923 = plant_months(e860, rng)
+
+        for name, df in [("EIA_power_plant_location", loc), ("EIA_860", e860),
+                         ("EIA_923", e923)]:
+            out[name].write(df)
+            rows[name] += len(df)
+    for writer in out.values():
+        writer.close()
+
+    manifest = {
+        "generator_version": GENERATOR_VERSION,
+        "scale": scale,
+        "seed": seed,
+        "plants": len(plants_all),
+        "counties": len(counties),
+        "rows": rows,
+    }
+    (root / "manifest.json").write_text(json.dumps(manifest, indent=1))
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic EIA / Rystad inputs")
+    parser.add_argument("--root", type=Path, required=True,
+                        help="directory to create data_raw/ and data_intermediate/ in")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="plants relative to the real files (1, 10, 100, ...)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    manifest = generate(args.root, args.scale, args.seed)
+    print(json.dumps(manifest, indent=1))
+
+
+if __name__ == "__main__":
+    main()